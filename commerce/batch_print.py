@@ -0,0 +1,254 @@
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.template.loader import render_to_string
+from django.utils.dateparse import parse_date
+from django.views.generic import View
+from pypdf import PdfWriter
+
+from core.catalog import catalog_cache
+from .pdf_cache import pdf_cache
+from .utils import render_html_to_pdf
+
+
+def progress_key(job):
+    return f"pdf_export:{job}"
+
+
+def pdf_converter(htmls, workers=None):
+    """
+    Convierte a PDF una lista de HTML y devuelve (iterador de bytes en
+    orden, pool o None).
+
+    La conversión con pisa es la parte costosa de CPU, pero arrancar un
+    ProcessPoolExecutor cuesta más que convertir unos pocos documentos: con
+    menos de `PDF_EXPORT_POOL_MIN` documentos, o con un solo proceso
+    disponible, se convierte en serie en este proceso. El pool devuelto
+    debe cerrarse con `shutdown()` al terminar de consumir el iterador.
+    """
+    workers = workers or getattr(settings, "PDF_EXPORT_WORKERS", None) or os.cpu_count() or 1
+    workers = min(workers, len(htmls))
+    if workers < 2 or len(htmls) < getattr(settings, "PDF_EXPORT_POOL_MIN", 20):
+        return map(render_html_to_pdf, htmls), None
+    pool = ProcessPoolExecutor(max_workers=workers)
+    return pool.map(render_html_to_pdf, htmls), pool
+
+
+def render_documents(documents, label, template_src, context_name, party, workers=None,
+                     progress=None, failed=None):
+    """
+    Genera el PDF de cada documento y devuelve un iterador de (nombre, bytes)
+    en orden.
+
+    La búsqueda en el caché de impresión y el HTML de los documentos
+    pendientes (que necesita la base de datos y las plantillas) se resuelven
+    antes de devolver el iterador, así los errores de datos o plantillas
+    aparecen antes de empezar a responder. La conversión a PDF
+    (`pdf_converter`) se hace a medida que se consume: cada PDF se entrega
+    apenas está listo y `progress(hechos, total)` se llama en cada uno. Si
+    pisa no puede convertir un documento se lanza ValueError o, si se pasa
+    la lista `failed`, se agrega ahí y se omite. `party` es el tercero del
+    documento (`customer` o `supplier`), que entra en la clave del caché.
+    """
+    documents = list(documents)
+    cached = {}
+    pending = []
+    catalog = catalog_cache.version()
+    for document in documents:
+        version = pdf_cache.document_version(document, party, catalog)
+        digest = pdf_cache.digest(label, document.pk, version, template_src)
+        data = pdf_cache.get(label, document.pk, digest)
+        if data is None:
+            html = render_to_string(template_src, {context_name: document})
+            pending.append((document, digest, html))
+        else:
+            cached[document.pk] = data
+    return _emit(documents, cached, pending, label, workers, progress, failed)
+
+
+def _emit(documents, cached, pending, label, workers, progress, failed):
+    converted, pool = pdf_converter([html for _, _, html in pending], workers)
+    rendered = zip(pending, converted)
+    try:
+        for done, document in enumerate(documents, start=1):
+            data = cached.get(document.pk)
+            if data is None:
+                (_, digest, _), data = next(rendered)
+                if data is None:
+                    if failed is None:
+                        raise ValueError(f"No se pudo generar el PDF de {document}.")
+                    failed.append(document)
+                else:
+                    pdf_cache.set(label, document.pk, digest, data)
+            if progress:
+                progress(done, len(documents))
+            if data is not None:
+                yield f"{label}-{document.pk}.pdf", data
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+
+
+class ZipStream:
+    """Archivo de solo escritura que acumula lo que zipfile escribe para emitirlo por partes."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_zip(files, failed=()):
+    """
+    Emite un ZIP por partes a medida que se agrega cada archivo. Si `failed`
+    (llenada mientras se consume `files`) tiene documentos al final, se
+    agrega `errores.txt` con la lista: el archivo queda completo igual.
+    """
+    stream = ZipStream()
+    with zipfile.ZipFile(stream, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, data in files:
+            archive.writestr(name, data)
+            yield stream.pop()
+        if failed:
+            archive.writestr(
+                "errores.txt",
+                "".join(f"No se pudo generar el PDF de {document}.\n" for document in failed),
+            )
+    yield stream.pop()
+
+
+def merge_pdfs(files):
+    """Une varios PDF en uno solo con pypdf."""
+    writer = PdfWriter()
+    for _, data in files:
+        writer.append(BytesIO(data))
+    output = BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+class BatchPrintView(LoginRequiredMixin, View):
+    """
+    Exportación masiva de documentos impresos en un ZIP o en un único PDF.
+
+    Parámetros GET: `start` y `end` (fechas de emisión), `format` (`zip` o
+    `pdf`) y `job`, un identificador opcional para consultar el avance en
+    `BatchPrintProgressView`. Las subclases definen `model`, `label`,
+    `template_name`, `context_name`, `party` y pueden ampliar `filter_queryset`,
+    que lanza ValueError ante parámetros inválidos (respuesta 400), y
+    `filter_params`. Se exige al menos uno de `filter_params` y no más de
+    `max_documents` documentos: todo se genera en memoria del proceso.
+    Con `loader` (commerce.documents) los documentos se cargan con un número
+    fijo de consultas en lugar de recorrer relaciones en la plantilla.
+    Todo se valida antes de crear la respuesta en streaming: un error a
+    mitad de camino dejaría un ZIP truncado con estado 200.
+    """
+
+    model = None
+    loader = None
+    label = None
+    template_name = None
+    context_name = None
+    party = None  # Tercero impreso en el documento (ver `render_documents`)
+    formats = ("zip", "pdf")
+    filter_params = ("start", "end")
+    max_documents = 500
+
+    def get_queryset(self):
+        return self.model.objects.all()
+
+    def date_param(self, name):
+        value = self.request.GET.get(name, "")
+        if not value:
+            return None
+        day = parse_date(value)  # ValueError si la fecha no existe (2024-02-30)
+        if day is None:
+            raise ValueError(f"Fecha inválida en '{name}': {value!r}.")
+        return day
+
+    def id_param(self, name):
+        value = self.request.GET.get(name, "")
+        if not value:
+            return None
+        if not value.isdigit():
+            raise ValueError(f"Identificador inválido en '{name}': {value!r}.")
+        return int(value)
+
+    def filter_queryset(self, queryset):
+        start = self.date_param("start")
+        end = self.date_param("end")
+        if start:
+            queryset = queryset.filter(issue_date__date__gte=start)
+        if end:
+            queryset = queryset.filter(issue_date__date__lte=end)
+        return queryset
+
+    def get(self, request, *args, **kwargs):
+        output = request.GET.get("format") or "zip"
+        job = request.GET.get("job")
+
+        def progress(done, total):
+            if job:
+                cache.set(progress_key(job), {"done": done, "total": total}, 3600)
+
+        try:
+            if output not in self.formats:
+                raise ValueError(f"Formato no válido: {output!r}.")
+            if not any(request.GET.get(name) for name in self.filter_params):
+                raise ValueError(
+                    f"Indique al menos un filtro: {', '.join(self.filter_params)}."
+                )
+            queryset = self.filter_queryset(self.get_queryset())
+            if queryset.count() > self.max_documents:
+                raise ValueError(
+                    f"Se pueden exportar hasta {self.max_documents} documentos a la vez."
+                )
+            documents = self.loader.load(queryset) if self.loader else list(queryset)
+            if not documents:
+                return JsonResponse({"error": "No hay documentos para exportar."}, status=404)
+            if output == "pdf":
+                data = merge_pdfs(
+                    render_documents(
+                        documents, self.label, self.template_name, self.context_name, self.party,
+                        progress=progress,
+                    )
+                )
+                response = HttpResponse(data, content_type="application/pdf")
+                response["Content-Disposition"] = f'attachment; filename="{self.label}s.pdf"'
+                return response
+
+            failed = []
+            files = render_documents(
+                documents, self.label, self.template_name, self.context_name, self.party,
+                progress=progress, failed=failed,
+            )
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+
+        response = StreamingHttpResponse(iter_zip(files, failed), content_type="application/zip")
+        response["Content-Disposition"] = f'attachment; filename="{self.label}s.zip"'
+        return response
+
+
+class BatchPrintProgressView(LoginRequiredMixin, View):
+    def get(self, request, job, *args, **kwargs):
+        state = cache.get(progress_key(job))
+        if state is None:
+            return JsonResponse({"error": "Exportación no encontrada."}, status=404)
+        return JsonResponse(state)
@@ -1,4 +1,17 @@
+import hashlib
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
 from django.db.models import Q
+from django.http import Http404, JsonResponse
+from django.template.loader import render_to_string
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+from core.utils import custom_serializer
+from .search import get_search_backend
 
 
 class QueryFilterMixin:
@@ -7,18 +20,152 @@ class QueryFilterMixin:
     Definir `search_fields` como lista de campos para buscar.
     Ejemplo:
         search_fields = ['customer__first_name', 'customer__last_name']
+    La búsqueda la resuelve el backend de `commerce.search`; los resultados
+    quedan ordenados por relevancia (`search_rank`) salvo que la vista
+    imponga otro orden, como hace KeysetPaginationMixin.
     """
 
     search_param = "q"  # Nombre del parámetro GET
     search_fields = []   # Campos sobre los que buscar
+    search_backend = None  # Ruta del backend; None usa settings.QUERY_SEARCH_BACKEND
 
     def get_queryset(self):
         queryset = super().get_queryset()
         query = self.request.GET.get(self.search_param, "")
         if query and self.search_fields:
-            # Construir Q dinámicamente
-            q_object = Q()
-            for field in self.search_fields:
-                q_object |= Q(**{f"{field}__icontains": query})
-            queryset = queryset.filter(q_object)
-        return queryset
\ No newline at end of file
+            # El backend decide cómo buscar (icontains, pg_trgm o FTS5)
+            backend = get_search_backend(self.search_backend)
+            queryset = backend.filter(queryset, self.search_fields, query)
+        return queryset
+
+
+class KeysetPaginationMixin:
+    """
+    Paginación por cursor (keyset) para ListView.
+
+    En lugar de `COUNT(*)` + `OFFSET n`, cada página busca directamente a
+    partir de la última fila vista usando el orden `keyset_ordering`, que debe
+    terminar en un campo único (normalmente `id`) y estar respaldado por un
+    índice. El costo de una página es el mismo en la primera que en la página
+    mil. El contexto recibe `next_cursor` y `prev_cursor` (opacos) en lugar de
+    `page_obj`/`paginator`.
+    Ejemplo:
+        keyset_ordering = ("-issue_date", "id")
+    """
+
+    keyset_ordering = ("-id",)
+    cursor_param = "cursor"
+
+    def _keyset_fields(self, reverse=False):
+        fields = []
+        for name in self.keyset_ordering:
+            descending = name.startswith("-")
+            fields.append((name.lstrip("-"), descending != reverse))
+        return fields
+
+    def _encode_cursor(self, row, direction):
+        values = [getattr(row, name) for name, _ in self._keyset_fields()]
+        payload = json.dumps({"d": direction, "v": values}, default=custom_serializer)
+        return urlsafe_base64_encode(payload.encode())
+
+    def _decode_cursor(self, cursor):
+        try:
+            payload = json.loads(urlsafe_base64_decode(cursor))
+            model_fields = [
+                self.model._meta.get_field(name) for name, _ in self._keyset_fields()
+            ]
+            values = [f.to_python(v) for f, v in zip(model_fields, payload["v"])]
+            if payload["d"] not in ("n", "p") or len(values) != len(model_fields):
+                raise ValueError
+        except (ValueError, TypeError, KeyError, ValidationError):
+            return None, None
+        return payload["d"], values
+
+    def _seek(self, fields, values):
+        # (a, b) > (x, y) respetando la dirección de cada campo:
+        # a > x  OR  (a = x AND b > y)
+        condition = Q()
+        equal = Q()
+        for (name, descending), value in zip(fields, values):
+            lookup = "lt" if descending else "gt"
+            condition |= equal & Q(**{f"{name}__{lookup}": value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def paginate_queryset(self, queryset, page_size):
+        direction, values = self._decode_cursor(self.request.GET.get(self.cursor_param, ""))
+        backwards = direction == "p"
+        fields = self._keyset_fields(reverse=backwards)
+        ordering = [f"-{name}" if descending else name for name, descending in fields]
+
+        queryset = queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self._seek(fields, values))
+        rows = list(queryset[: page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if backwards:
+            rows.reverse()
+
+        self.next_cursor = self.prev_cursor = None
+        if rows:
+            if has_more or backwards:
+                self.next_cursor = self._encode_cursor(rows[-1], "n")
+            if (has_more and backwards) or direction == "n":
+                self.prev_cursor = self._encode_cursor(rows[0], "p")
+        return None, None, rows, bool(self.next_cursor or self.prev_cursor)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["next_cursor"] = getattr(self, "next_cursor", None)
+        context["prev_cursor"] = getattr(self, "prev_cursor", None)
+        return context
+
+
+class CachedFragmentMixin:
+    """
+    Caché del HTML de los modales de detalle que se devuelven como JSON.
+
+    La clave combina `fragment_label`, el id y una versión barata de obtener
+    (`get_fragment_version`, por ejemplo la fecha `updated`), así un cambio
+    en el documento genera otra clave sin tener que invalidar nada. Solo en
+    frío se cargan los datos completos con `get_fragment_context`, que debe
+    usar select_related/prefetch_related para no consultar por fila.
+
+    El manejador es `async def` (usar con core.mixins.AsyncLoginRequiredMixin).
+    Por defecto los ganchos síncronos se ejecutan en un hilo; las vistas
+    pueden redefinir `aget_fragment_version` y `arender_fragment` con el ORM
+    async para no salir del bucle de eventos.
+    """
+
+    fragment_label = None
+
+    def get_fragment_version(self, pk):
+        raise NotImplementedError
+
+    def get_fragment_context(self, pk):
+        raise NotImplementedError
+
+    async def aget_fragment_version(self, pk):
+        return await sync_to_async(self.get_fragment_version)(pk)
+
+    def render_fragment(self, pk):
+        return render_to_string(self.template_name, self.get_fragment_context(pk))
+
+    async def arender_fragment(self, pk):
+        return await sync_to_async(self.render_fragment)(pk)
+
+    def get_fragment_key(self, pk, version):
+        digest = hashlib.sha256(repr(version).encode("UTF-8")).hexdigest()[:16]
+        return f"fragment:{self.fragment_label}:{pk}:{digest}"
+
+    async def get(self, request, pk, *args, **kwargs):
+        version = await self.aget_fragment_version(pk)
+        if version is None:
+            raise Http404
+        key = self.get_fragment_key(pk, version)
+        html = await cache.aget(key)
+        if html is None:
+            html = await self.arender_fragment(pk)
+            await cache.aset(key, html, getattr(settings, "FRAGMENT_CACHE_TIMEOUT", 3600))
+        return JsonResponse({"html": html})
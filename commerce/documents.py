@@ -0,0 +1,168 @@
+from collections import defaultdict, namedtuple
+
+from django.http import Http404
+
+from core.constants import InvoicePaymentMethod
+from .models import Invoice, InvoiceDetail, format_invoice_number
+
+
+class DocumentLoader:
+    """
+    Carga documentos (cabecera, tercero y líneas con su producto) en un
+    modelo de lectura compacto de namedtuples, con un número fijo de
+    consultas sin importar cuántos documentos o líneas haya: una con
+    `values()` para las cabeceras junto con el tercero, y otra para todas
+    las líneas junto con la descripción del producto.
+
+    Las subclases definen el modelo, los campos de cabecera, el tercero
+    (`party`), el modelo de las líneas y sus campos. Las plantillas de
+    impresión, los modales de detalle y las exportaciones con detalle leen
+    estos objetos en lugar de recorrer relaciones del ORM. `aload` y `aget`
+    hacen lo mismo con el ORM async, para las vistas `async def`.
+    """
+
+    model = None
+    header_fields = ()
+    party = None
+    party_fields = ()
+    line_model = None
+    line_fk = None
+    line_fields = ()
+    chunk_size = 500
+
+    def __init__(self):
+        self.party_class = namedtuple(f"{self.party.title()}Row", self.party_fields)
+        self.line_class = namedtuple(
+            f"{self.model.__name__}Line", ["product_id", "description", *self.line_fields]
+        )
+        self.document_class = namedtuple(
+            f"{self.model.__name__}Document",
+            ["pk", *self.header_fields, *self.extra_fields(), self.party, "lines"],
+        )
+
+    def extra_fields(self):
+        """Campos calculados de la cabecera (ver `build_extra`)."""
+        return ()
+
+    def build_extra(self, row):
+        return ()
+
+    @property
+    def party_lookups(self):
+        return [f"{self.party}__{field}" for field in self.party_fields]
+
+    def headers_query(self, queryset):
+        return queryset.values("pk", *self.header_fields, *self.party_lookups)
+
+    def lines_query(self, pks):
+        return (
+            self.line_model.objects.filter(**{f"{self.line_fk}_id__in": pks})
+            .order_by(f"{self.line_fk}_id", "id")
+            .values_list(
+                f"{self.line_fk}_id", "product_id", "product__description", *self.line_fields
+            )
+        )
+
+    def load_lines(self, pks):
+        return self.group_lines(self.lines_query(pks))
+
+    def group_lines(self, rows):
+        lines = defaultdict(list)
+        for document_id, *values in rows:
+            lines[document_id].append(self.line_class(*values))
+        return lines
+
+    def load(self, queryset):
+        """Devuelve la lista de documentos de `queryset`, en su mismo orden."""
+        headers = list(self.headers_query(queryset))
+        lines = self.load_lines([row["pk"] for row in headers]) if headers else {}
+        return self.build_documents(headers, lines)
+
+    async def aload(self, queryset):
+        headers = [row async for row in self.headers_query(queryset)]
+        if not headers:
+            return []
+        pks = [row["pk"] for row in headers]
+        lines = self.group_lines([row async for row in self.lines_query(pks)])
+        return self.build_documents(headers, lines)
+
+    def build_documents(self, headers, lines):
+        party_lookups = self.party_lookups
+        return [
+            self.document_class(
+                row["pk"],
+                *(row[field] for field in self.header_fields),
+                *self.build_extra(row),
+                self.party_class(*(row[lookup] for lookup in party_lookups)),
+                lines.get(row["pk"], []),
+            )
+            for row in headers
+        ]
+
+    def get(self, pk):
+        return self._first(self.load(self.model.objects.filter(pk=pk)), pk)
+
+    async def aget(self, pk):
+        return self._first(await self.aload(self.model.objects.filter(pk=pk)), pk)
+
+    def _first(self, documents, pk):
+        if not documents:
+            raise self.model.DoesNotExist(f"{self.model._meta.verbose_name} {pk} no existe.")
+        return documents[0]
+
+    def iterate(self, queryset):
+        """Recorre un queryset grande por bloques de `chunk_size` documentos."""
+        pks = []
+        for pk in queryset.values_list("pk", flat=True).iterator(chunk_size=self.chunk_size):
+            pks.append(pk)
+            if len(pks) == self.chunk_size:
+                yield from self._load_chunk(pks)
+                pks = []
+        if pks:
+            yield from self._load_chunk(pks)
+
+    def _load_chunk(self, pks):
+        documents = {doc.pk: doc for doc in self.load(self.model.objects.filter(pk__in=pks))}
+        return [documents[pk] for pk in pks]
+
+
+def load_document_or_404(loader, pk):
+    try:
+        return loader.get(pk)
+    except loader.model.DoesNotExist:
+        raise Http404
+
+
+async def aload_document_or_404(loader, pk):
+    try:
+        return await loader.aget(pk)
+    except loader.model.DoesNotExist:
+        raise Http404
+
+
+class InvoiceLoader(DocumentLoader):
+    model = Invoice
+    header_fields = (
+        "id", "issue_date", "updated", "payment_method", "subtotal", "iva", "total",
+        "payment", "change", "state", "establishment", "emission_point", "sequence",
+    )
+    party = "customer"
+    party_fields = ("id", "dni", "first_name", "last_name", "address", "updated")
+    line_model = InvoiceDetail
+    line_fk = "invoice"
+    line_fields = ("quantity", "price", "cost", "iva", "subtotal")
+
+    def extra_fields(self):
+        return ("payment_method_display", "customer_name", "number")
+
+    def build_extra(self, row):
+        return (
+            InvoicePaymentMethod(row["payment_method"]).label,
+            f"{row['customer__last_name']} {row['customer__first_name']}",
+            format_invoice_number(
+                row["establishment"], row["emission_point"], row["sequence"]
+            ),
+        )
+
+
+invoice_loader = InvoiceLoader()
@@ -1,5 +1,6 @@
 from django import forms
 from .models import Invoice
+from .sequences import POS_CODE
 from django.utils.timezone import now
 
 
@@ -10,6 +11,8 @@ class InvoiceForm(forms.ModelForm):
             "customer",
             "payment_method",
             "issue_date",
+            "establishment",
+            "emission_point",
             "subtotal",
             "iva",
             "total",
@@ -20,6 +23,8 @@ class InvoiceForm(forms.ModelForm):
             "issue_date": forms.DateInput(
                 attrs={"type": "date"}, format="%Y-%m-%d"  # <- importante
             ),
+            "establishment": forms.TextInput(attrs={"maxlength": 3, "placeholder": "001"}),
+            "emission_point": forms.TextInput(attrs={"maxlength": 3, "placeholder": "001"}),
             "subtotal": forms.NumberInput(),
             "iva": forms.NumberInput(),
             "total": forms.NumberInput(),
@@ -30,3 +35,15 @@ class InvoiceForm(forms.ModelForm):
         # Si no hay valor, asigna la fecha actual
         if not self.instance.pk:  # Nuevo registro
             self.initial["issue_date"] = now().date()
+        # Una factura numerada no cambia de serie.
+        if self.instance.sequence:
+            for name in ("establishment", "emission_point"):
+                self.fields[name].disabled = True
+
+    def clean(self):
+        cleaned_data = super().clean()
+        for name in ("establishment", "emission_point"):
+            value = cleaned_data.get(name)
+            if value and not POS_CODE.match(value):
+                self.add_error(name, "Debe tener 3 dígitos.")
+        return cleaned_data
@@ -0,0 +1,290 @@
+import csv
+import datetime
+import json
+import re
+import time
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+from itertools import groupby, islice
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from core import ledger
+from core.constants import InvoicePaymentMethod, MovementKind
+from core.models import Customer, InventoryMovement, Product
+from core.stock import adjust_stock
+from .models import ImportCheckpoint, Invoice, InvoiceDetail
+from .pricing import price_basket
+from . import sequences
+
+# Número heredado "001-002-000000123": se conserva en establishment,
+# emission_point y sequence.
+LEGACY_NUMBER = re.compile(r"^(\d{3})-(\d{3})-(\d{1,9})$")
+
+
+def read_csv(path):
+    """
+    Lee un CSV con una fila por línea de factura y agrupa las filas
+    consecutivas con el mismo `invoice`. Columnas: invoice (número heredado,
+    ver `LEGACY_NUMBER`), issue_date, dni, payment_method, product (id del
+    producto), quantity, price.
+    """
+    with open(path, newline="", encoding="utf-8-sig") as source:
+        for key, rows in groupby(csv.DictReader(source), key=lambda row: row["invoice"]):
+            rows = list(rows)
+            yield {
+                "invoice": key,
+                "issue_date": rows[0].get("issue_date"),
+                "dni": rows[0].get("dni"),
+                "payment_method": rows[0].get("payment_method"),
+                "lines": [
+                    {"product": r["product"], "quantity": r["quantity"], "price": r["price"]}
+                    for r in rows
+                ],
+            }
+
+
+def read_jsonl(path):
+    """Lee un JSONL con una factura por línea (mismas claves, `lines` como lista)."""
+    with open(path, encoding="utf-8") as source:
+        for line in source:
+            if line.strip():
+                yield json.loads(line)
+
+
+class InvoiceImporter:
+    """
+    Importación masiva de facturas históricas.
+
+    Clientes (por `dni`) y productos (por id: el catálogo no tiene otro
+    código) se resuelven con mapas en memoria cargados una sola vez. Las
+    facturas se escriben por bloques de `chunk_size`, cada uno en su propia
+    transacción: la numeración (`number_chunk`), un `bulk_create` de
+    cabeceras, otro del detalle, un único UPDATE agregado de stock con sus
+    movimientos en el libro de inventario (`core.ledger`, fechados con la
+    emisión de cada factura) y el avance en
+    `ImportCheckpoint`, que así queda confirmado junto con los datos y
+    permite reanudar exactamente donde se quedó. Las facturas con datos
+    inválidos se descartan y se informan en `errors`.
+    """
+
+    def __init__(self, name, user, chunk_size=1000, default_customer=None, update_stock=True,
+                 point_of_sale=None):
+        self.name = name
+        self.user = user
+        self.chunk_size = chunk_size
+        self.default_customer = default_customer
+        self.update_stock = update_stock
+        # Punto de emisión de las facturas sin número heredado.
+        self.point_of_sale = point_of_sale or sequences.point_of_sale()
+        self.errors = []
+        self.invoices = 0  # importadas en esta ejecución
+        self.lines = 0
+        self.previous = 0  # importadas en ejecuciones anteriores
+        self.first_date = None
+        self.last_date = None
+
+    def load_maps(self):
+        self.customers = dict(
+            Customer.objects.exclude(dni__isnull=True).values_list("dni", "id").iterator()
+        )
+        self.products = {
+            pk: (iva, cost)
+            for pk, iva, cost in Product.objects.values_list("id", "iva", "cost").iterator()
+        }
+        if self.default_customer and self.default_customer not in self.customers:
+            raise ValueError(f"Cliente por defecto no encontrado: {self.default_customer}.")
+
+    def parse_date(self, value):
+        value = (value or "").strip()
+        moment = parse_datetime(value)
+        if moment is None:
+            day = parse_date(value)
+            if day is None:
+                raise ValueError(f"Fecha inválida: {value!r}.")
+            moment = datetime.datetime.combine(day, datetime.time.min)
+        if timezone.is_naive(moment):
+            moment = timezone.make_aware(moment)
+        return moment
+
+    def legacy_number(self, record):
+        """
+        (establecimiento, punto de emisión, secuencial) del número heredado
+        `invoice`; sin uno válido, el punto de emisión del importador y None.
+        """
+        match = LEGACY_NUMBER.match((record.get("invoice") or "").strip())
+        if match and int(match[3]):
+            return match[1], match[2], int(match[3])
+        return (*self.point_of_sale, None)
+
+    def build(self, record):
+        """Convierte un registro en (factura, detalles) sin guardar; ValueError si es inválido."""
+        dni = (record.get("dni") or "").strip() or self.default_customer
+        customer_id = self.customers.get(dni) or self.customers.get(self.default_customer)
+        if customer_id is None:
+            raise ValueError(f"Cliente no encontrado: {dni!r}.")
+        payment_method = record.get("payment_method") or InvoicePaymentMethod.CASH
+        if payment_method not in InvoicePaymentMethod.values:
+            raise ValueError(f"Método de pago no válido: {payment_method!r}.")
+        if not record.get("lines"):
+            raise ValueError("La factura no tiene líneas.")
+
+        basket = []
+        for line in record["lines"]:
+            try:
+                pk = int(line["product"])
+                price = Decimal(str(line["price"]))
+            except (KeyError, TypeError, ValueError, InvalidOperation):
+                raise ValueError(f"Línea inválida: {line!r}.")
+            if pk not in self.products:
+                raise ValueError(f"Producto no encontrado: {pk}.")
+            basket.append((pk, price, line.get("quantity"), self.products[pk][0]))
+        try:
+            totals = price_basket(basket)
+        except InvalidOperation:
+            raise ValueError("Cantidad inválida.")
+
+        establishment, emission_point, sequence = self.legacy_number(record)
+        invoice = Invoice(
+            establishment=establishment,
+            emission_point=emission_point,
+            sequence=sequence,
+            customer_id=customer_id,
+            payment_method=payment_method,
+            issue_date=self.parse_date(record.get("issue_date")),
+            subtotal=totals["subtotal"],
+            iva=totals["iva"],
+            total=totals["total"],
+            user=self.user,
+        )
+        details = [
+            InvoiceDetail(
+                product_id=line["product"],
+                quantity=line["quantity"],
+                price=line["price"],
+                cost=self.products[line["product"]][1],
+                subtotal=line["subtotal"],
+                iva=line["iva"],
+            )
+            for line in totals["lines"]
+        ]
+        return invoice, details
+
+    def number_chunk(self, built):
+        """
+        Numera las facturas del bloque y devuelve las que se pueden guardar.
+
+        Las que traen número heredado lo conservan y el contador de su punto
+        de emisión se adelanta hasta el mayor (`advance_number`), para que
+        las ventas nuevas no lo repitan; si el número ya está registrado, la
+        factura se descarta a `errors`. Las demás reciben un bloque de
+        secuenciales consecutivos por punto de emisión (`reserve_numbers`),
+        en el orden del archivo y sin huecos: la reserva se confirma junto
+        con el bloque.
+        """
+        legacy = defaultdict(set)
+        pending = defaultdict(list)
+        for invoice, _ in built:
+            key = (invoice.establishment, invoice.emission_point)
+            if invoice.sequence is None:
+                pending[key].append(invoice)
+            else:
+                legacy[key].add(invoice.sequence)
+
+        taken = set()
+        for (establishment, emission_point), numbers in legacy.items():
+            taken.update(
+                Invoice.objects.filter(
+                    establishment=establishment,
+                    emission_point=emission_point,
+                    sequence__in=numbers,
+                ).values_list("establishment", "emission_point", "sequence")
+            )
+            sequences.advance_number(establishment, emission_point, max(numbers))
+        kept = []
+        for invoice, lines in built:
+            if invoice.sequence is not None:
+                number = (invoice.establishment, invoice.emission_point, invoice.sequence)
+                if number in taken:
+                    self.errors.append(f"Factura {invoice.number}: el número ya está registrado.")
+                    continue
+                taken.add(number)
+            kept.append((invoice, lines))
+
+        for (establishment, emission_point), invoices in pending.items():
+            first = sequences.reserve_numbers(establishment, emission_point, len(invoices))
+            for offset, invoice in enumerate(invoices):
+                invoice.sequence = first + offset
+        return kept
+
+    def write_chunk(self, built, position):
+        with transaction.atomic():
+            built = self.number_chunk(built)
+            invoices = [invoice for invoice, _ in built]
+            Invoice.objects.bulk_create(invoices, batch_size=self.chunk_size)
+            details = []
+            movements = []
+            sold = defaultdict(Decimal)
+            for invoice, lines in built:
+                for detail in lines:
+                    detail.invoice_id = invoice.pk
+                    sold[detail.product_id] -= detail.quantity
+                details.extend(lines)
+                # Cada venta histórica se fecha con su emisión, no con la importación.
+                movements.extend(
+                    ledger.movements(
+                        MovementKind.SALE,
+                        "invoice",
+                        ((invoice.pk, d.product_id, d.quantity) for d in lines),
+                        sign=-1,
+                        moved_at=invoice.issue_date,
+                    )
+                )
+            InvoiceDetail.objects.bulk_create(details, batch_size=5000)
+            if self.update_stock:
+                adjust_stock(sold)
+                InventoryMovement.objects.bulk_create(movements, batch_size=ledger.BATCH_SIZE)
+            ImportCheckpoint.objects.update_or_create(
+                name=self.name,
+                defaults={
+                    "position": position,
+                    "invoices": self.previous + self.invoices + len(invoices),
+                },
+            )
+        self.invoices += len(invoices)
+        self.lines += len(details)
+        for invoice in invoices:
+            day = timezone.localdate(invoice.issue_date)
+            self.first_date = min(self.first_date or day, day)
+            self.last_date = max(self.last_date or day, day)
+
+    def run(self, records, progress=None):
+        """
+        Importa `records` (iterable de dicts) desde el último punto de control.
+        `progress(facturas, líneas, segundos)` se llama tras cada bloque con
+        los totales de esta ejecución. Devuelve la posición final.
+        """
+        self.load_maps()
+        checkpoint = ImportCheckpoint.objects.filter(name=self.name).first()
+        position = checkpoint.position if checkpoint else 0
+        self.previous = checkpoint.invoices if checkpoint else 0
+        records = islice(records, position, None)
+        started = time.perf_counter()
+
+        while True:
+            chunk = list(islice(records, self.chunk_size))
+            if not chunk:
+                break
+            built = []
+            for offset, record in enumerate(chunk, start=position + 1):
+                try:
+                    built.append(self.build(record))
+                except ValueError as e:
+                    self.errors.append(f"Registro {offset} ({record.get('invoice', '')}): {e}")
+            position += len(chunk)
+            self.write_chunk(built, position)
+            if progress:
+                progress(self.invoices, self.lines, time.perf_counter() - started)
+        return position
@@ -0,0 +1,80 @@
+from collections import defaultdict, deque
+from decimal import Decimal
+
+
+class LineDiff:
+    """
+    Diferencia entre las líneas guardadas de un documento y las enviadas.
+
+    - created: valores (dicts) de las líneas nuevas.
+    - updated: instancias guardadas con los campos ya modificados.
+    - removed: ids de las líneas que ya no están.
+    - stock: variación neta de stock por producto (sin ceros).
+    """
+
+    def __init__(self):
+        self.created = []
+        self.updated = []
+        self.removed = []
+        self.stock = {}
+
+    def __bool__(self):
+        return bool(self.created or self.updated or self.removed)
+
+
+def diff_lines(stored, posted, fields, sign=1):
+    """
+    Compara por producto las líneas guardadas (`stored`, instancias del
+    detalle) con las enviadas (`posted`, dicts con `product_id` y los
+    `fields`), emparejándolas en orden si un producto se repite.
+
+    `sign` indica cómo mueve el stock la cantidad: +1 en compras (ingresa)
+    y -1 en ventas (sale). Solo se marcan como actualizadas las líneas con
+    algún campo distinto, así editar una línea de cien solo toca esa fila.
+    """
+    pending = defaultdict(deque)
+    for line in stored:
+        pending[line.product_id].append(line)
+
+    diff = LineDiff()
+    stock = defaultdict(Decimal)
+    for values in posted:
+        product_id = values["product_id"]
+        stock[product_id] += sign * values["quantity"]
+        if pending[product_id]:
+            line = pending[product_id].popleft()
+            stock[product_id] -= sign * line.quantity
+            changed = False
+            for field in fields:
+                if getattr(line, field) != values[field]:
+                    setattr(line, field, values[field])
+                    changed = True
+            if changed:
+                diff.updated.append(line)
+        else:
+            diff.created.append(values)
+
+    for lines in pending.values():
+        for line in lines:
+            diff.removed.append(line.pk)
+            stock[line.product_id] -= sign * line.quantity
+
+    diff.stock = {pk: delta for pk, delta in stock.items() if delta}
+    return diff
+
+
+def apply_line_diff(model, parent_field, parent, diff, fields):
+    """
+    Aplica las filas de `diff` al detalle `model` de `parent` con a lo sumo
+    tres consultas: un DELETE, un `bulk_update` y un `bulk_create`. El stock
+    (`diff.stock`) lo aplica quien llama, según el tipo de documento.
+    """
+    if diff.removed:
+        model.objects.filter(pk__in=diff.removed).delete()
+    if diff.updated:
+        model.objects.bulk_update(diff.updated, fields, batch_size=1000)
+    if diff.created:
+        model.objects.bulk_create(
+            [model(**{parent_field: parent}, **values) for values in diff.created],
+            batch_size=1000,
+        )
@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from commerce.models import Invoice, InvoiceDetail
+from core import ledger
+from core.constants import MovementKind
+from purchase.models import Purchase, PurchaseDetail
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruye el libro de inventario desde el detalle de facturas y compras "
+        "existentes, por bloques, y cuadra cada producto con su stock actual."
+    )
+
+    sources = {
+        "invoice": (
+            Invoice, InvoiceDetail, "invoice", MovementKind.SALE, MovementKind.SALE_ANNUL,
+            -1, None,
+        ),
+        # Las compras guardan su valor al costo para el costo promedio.
+        "purchase": (
+            Purchase, PurchaseDetail, "purchase", MovementKind.PURCHASE,
+            MovementKind.PURCHASE_ANNUL, 1, "cost",
+        ),
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--source", choices=sorted(self.sources), action="append",
+            help="Documentos a reconstruir (por defecto, facturas y compras).",
+        )
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Documentos por bloque.")
+
+    def handle(self, *args, **options):
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size debe ser mayor que cero.")
+
+        for source in options["source"] or sorted(self.sources):
+            model, detail, parent_field, kind, annul_kind, sign, cost_field = self.sources[source]
+
+            def progress(documents, movements, seconds):
+                rate = documents / seconds if seconds else 0
+                self.stdout.write(
+                    f"{source}: {documents} documentos, {movements} movimientos "
+                    f"({rate:.0f} documentos/s)"
+                )
+
+            documents, movements = ledger.backfill(
+                source, model.objects.all(), detail.objects.all(), parent_field,
+                kind, annul_kind, sign, cost_field=cost_field,
+                chunk_size=options["chunk_size"], progress=progress,
+            )
+            self.stdout.write(
+                self.style.SUCCESS(f"{source}: {documents} documentos, {movements} movimientos.")
+            )
+
+        balances = ledger.open_balances()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{balances} saldos iniciales. Las fotos de stock se descartaron: "
+                "vuelva a tomarlas con snapshot_stock."
+            )
+        )
@@ -0,0 +1,100 @@
+import os
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from commerce.importer import InvoiceImporter, read_csv, read_jsonl
+from commerce.sequences import POS_CODE
+from commerce.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa facturas históricas desde CSV o JSONL por bloques, con mapas de "
+        "clientes (por dni) y productos (por id; el catálogo no tiene un campo de "
+        "código aparte) en memoria y puntos de control para reanudar. Los números "
+        "heredados 001-001-000000123 se conservan; las demás facturas se numeran "
+        "con el secuencial del punto de emisión."
+    )
+
+    readers = {"csv": read_csv, "jsonl": read_jsonl}
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Archivo a importar.")
+        parser.add_argument(
+            "--format", choices=sorted(self.readers),
+            help="Formato del archivo (por defecto, según la extensión).",
+        )
+        parser.add_argument("--user", required=True, help="Usuario al que se asignan las facturas.")
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Facturas por bloque.")
+        parser.add_argument(
+            "--default-customer", help="DNI del cliente para registros sin cliente conocido."
+        )
+        parser.add_argument(
+            "--point-of-sale",
+            help="Punto de emisión (001-001) de las facturas sin número heredado; "
+            "por defecto, el de la configuración.",
+        )
+        parser.add_argument(
+            "--no-stock", action="store_true", help="No descontar el stock de los productos."
+        )
+        parser.add_argument(
+            "--name", help="Nombre del punto de control (por defecto, el nombre del archivo)."
+        )
+        parser.add_argument(
+            "--skip-rollups", action="store_true",
+            help="No recalcular los resúmenes diarios del rango importado.",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        if not os.path.exists(path):
+            raise CommandError(f"No existe el archivo: {path}")
+        fmt = options["format"] or os.path.splitext(path)[1].lstrip(".").lower()
+        if fmt not in self.readers:
+            raise CommandError(f"Formato no soportado: {fmt}. Use --format csv|jsonl.")
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size debe ser mayor que cero.")
+        pos = None
+        if options["point_of_sale"]:
+            pos = tuple(options["point_of_sale"].split("-"))
+            if len(pos) != 2 or not all(POS_CODE.match(part) for part in pos):
+                raise CommandError("--point-of-sale debe tener la forma 001-001.")
+        try:
+            user = get_user_model().objects.get(username=options["user"])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"Usuario no encontrado: {options['user']}")
+
+        importer = InvoiceImporter(
+            name=options["name"] or os.path.basename(path),
+            user=user,
+            chunk_size=options["chunk_size"],
+            default_customer=options["default_customer"],
+            update_stock=not options["no_stock"],
+            point_of_sale=pos,
+        )
+
+        def progress(invoices, lines, seconds):
+            rate = invoices / seconds if seconds else 0
+            self.stdout.write(f"{invoices} facturas, {lines} líneas ({rate:.0f} facturas/s)")
+
+        try:
+            position = importer.run(self.readers[fmt](path), progress=progress)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        for error in importer.errors:
+            self.stderr.write(error)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Importación hasta el registro {position}: {importer.invoices} facturas y "
+                f"{importer.lines} líneas, {len(importer.errors)} registros con errores."
+            )
+        )
+
+        if importer.first_date and not options["skip_rollups"]:
+            summaries, products = rebuild(importer.first_date, importer.last_date)
+            self.stdout.write(
+                f"Resúmenes del {importer.first_date} al {importer.last_date}: "
+                f"{summaries} resúmenes y {products} filas por producto."
+            )
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('commerce', '0005_remove_purchasedetail_purchase_and_more'),
+        ('core', '0007_alter_brand_supplier'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['-issue_date', 'id'], name='commerce_in_issue_d_117dd1_idx'),
+        ),
+    ]
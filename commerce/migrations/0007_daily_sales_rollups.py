@@ -0,0 +1,56 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('commerce', '0006_invoice_commerce_in_issue_d_117dd1_idx'),
+        ('core', '0008_search_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Fecha')),
+                ('line', models.CharField(choices=[('RS', 'Rio Store'), ('FS', 'Ferrisariato'), ('CS', 'Comisariato')], max_length=2, verbose_name='Linea')),
+                ('quantity', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('subtotal', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('iva', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('cost', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='core.product', verbose_name='Producto')),
+            ],
+            options={
+                'verbose_name': 'Venta Diaria por Producto',
+                'verbose_name_plural': 'Ventas Diarias por Producto',
+                'ordering': ('-date', 'product'),
+                'indexes': [models.Index(fields=['date', 'line'], name='commerce_da_date_874883_idx')],
+                'constraints': [models.UniqueConstraint(fields=('date', 'product'), name='unique_daily_product_sales')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailySalesSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Fecha')),
+                ('payment_method', models.CharField(choices=[('EF', 'Efectivo'), ('CH', 'Cheque'), ('TJ', 'Tarjeta'), ('CR', 'Crédito')], max_length=2, verbose_name='Metodo de Pago')),
+                ('invoices', models.IntegerField(default=0, verbose_name='Facturas')),
+                ('subtotal', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('iva', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Resumen Diario de Ventas',
+                'verbose_name_plural': 'Resumenes Diarios de Ventas',
+                'ordering': ('-date', 'payment_method'),
+                'constraints': [models.UniqueConstraint(fields=('date', 'user', 'payment_method'), name='unique_daily_sales_summary')],
+            },
+        ),
+    ]
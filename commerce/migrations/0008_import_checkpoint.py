@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('commerce', '0007_daily_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, unique=True, verbose_name='Importacion')),
+                ('position', models.PositiveBigIntegerField(default=0, verbose_name='Registros procesados')),
+                ('invoices', models.PositiveBigIntegerField(default=0, verbose_name='Facturas importadas')),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Punto de Control de Importacion',
+                'verbose_name_plural': 'Puntos de Control de Importacion',
+            },
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:16
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def number_existing_invoices(apps, schema_editor):
+    """Numera las facturas existentes en orden de emisión en el punto por defecto."""
+    Invoice = apps.get_model("commerce", "Invoice")
+    InvoiceSequence = apps.get_model("commerce", "InvoiceSequence")
+    establishment = getattr(settings, "INVOICE_ESTABLISHMENT", "001")
+    emission_point = getattr(settings, "INVOICE_EMISSION_POINT", "001")
+    batch, number = [], 0
+    for invoice in Invoice.objects.order_by("issue_date", "id").only("id").iterator(chunk_size=2000):
+        number += 1
+        invoice.establishment, invoice.emission_point = establishment, emission_point
+        invoice.sequence = number
+        batch.append(invoice)
+        if len(batch) == 2000:
+            Invoice.objects.bulk_update(batch, ["establishment", "emission_point", "sequence"])
+            batch = []
+    if batch:
+        Invoice.objects.bulk_update(batch, ["establishment", "emission_point", "sequence"])
+    if number:
+        InvoiceSequence.objects.create(
+            establishment=establishment, emission_point=emission_point, last_number=number
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('commerce', '0008_import_checkpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('establishment', models.CharField(max_length=3, verbose_name='Establecimiento')),
+                ('emission_point', models.CharField(max_length=3, verbose_name='Punto de Emision')),
+                ('last_number', models.PositiveBigIntegerField(default=0, verbose_name='Ultimo Secuencial')),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Secuencia de Facturacion',
+                'verbose_name_plural': 'Secuencias de Facturacion',
+            },
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='emission_point',
+            field=models.CharField(blank=True, max_length=3, verbose_name='Punto de Emision'),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='establishment',
+            field=models.CharField(blank=True, max_length=3, verbose_name='Establecimiento'),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='sequence',
+            field=models.PositiveBigIntegerField(blank=True, editable=False, null=True, verbose_name='Secuencial'),
+        ),
+        migrations.AddConstraint(
+            model_name='invoice',
+            constraint=models.UniqueConstraint(fields=('establishment', 'emission_point', 'sequence'), name='unique_invoice_number'),
+        ),
+        migrations.AddConstraint(
+            model_name='invoicesequence',
+            constraint=models.UniqueConstraint(fields=('establishment', 'emission_point'), name='unique_invoice_sequence'),
+        ),
+        migrations.RunPython(number_existing_invoices, migrations.RunPython.noop),
+    ]
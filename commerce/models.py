@@ -2,7 +2,14 @@ from django.db import models
 from core.models import Customer, Product, Supplier
 from django.utils import timezone
 from django.contrib.auth.models import User
-from core.constants import InvoicePaymentMethod
+from core.constants import InvoicePaymentMethod, ProductLine
+
+
+def format_invoice_number(establishment, emission_point, sequence):
+    """001-001-000000123; cadena vacía si la factura aún no tiene secuencial."""
+    if sequence is None:
+        return ""
+    return f"{establishment}-{emission_point}-{sequence:09d}"
 
 
 class Invoice(models.Model):
@@ -40,6 +47,13 @@ class Invoice(models.Model):
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
     state = models.BooleanField("Activo", default=True)
+    # Numeración fiscal 001-001-000000123: establecimiento, punto de emisión
+    # y secuencial asignado por commerce.sequences al confirmar la factura.
+    establishment = models.CharField(verbose_name="Establecimiento", max_length=3, blank=True)
+    emission_point = models.CharField(verbose_name="Punto de Emision", max_length=3, blank=True)
+    sequence = models.PositiveBigIntegerField(
+        verbose_name="Secuencial", null=True, blank=True, editable=False
+    )
 
     class Meta:
         verbose_name = "Factura"
@@ -51,10 +65,22 @@ class Invoice(models.Model):
         indexes = [
             models.Index(fields=["issue_date"]),
             models.Index(fields=["customer"]),
+            # Soporta la paginación por cursor (-issue_date, id)
+            models.Index(fields=["-issue_date", "id"]),
         ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["establishment", "emission_point", "sequence"],
+                name="unique_invoice_number",
+            ),
+        ]
+
+    @property
+    def number(self):
+        return format_invoice_number(self.establishment, self.emission_point, self.sequence)
 
     def __str__(self):
-        return f"{self.PK} - {self.customer}"
+        return f"{self.number or self.pk} - {self.customer}"
 
 
 class InvoiceDetail(models.Model):
@@ -85,3 +111,95 @@ class InvoiceDetail(models.Model):
 
     def __str__(self):
         return f"{self.product}"
+
+
+class DailySalesSummary(models.Model):
+    """Ventas activas agregadas por día, método de pago y usuario (commerce.rollups)."""
+
+    date = models.DateField(verbose_name="Fecha")
+    payment_method = models.CharField(
+        verbose_name="Metodo de Pago", max_length=2, choices=InvoicePaymentMethod.choices
+    )
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    invoices = models.IntegerField(verbose_name="Facturas", default=0)
+    subtotal = models.DecimalField(default=0, max_digits=16, decimal_places=2)
+    iva = models.DecimalField(default=0, max_digits=16, decimal_places=2)
+    total = models.DecimalField(default=0, max_digits=16, decimal_places=2)
+
+    class Meta:
+        verbose_name = "Resumen Diario de Ventas"
+        verbose_name_plural = "Resumenes Diarios de Ventas"
+        ordering = ("-date", "payment_method")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["date", "user", "payment_method"], name="unique_daily_sales_summary"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.date} - {self.payment_method} - {self.user}"
+
+
+class DailyProductSales(models.Model):
+    """Unidades e importes vendidos por día y producto (commerce.rollups)."""
+
+    date = models.DateField(verbose_name="Fecha")
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="daily_sales", verbose_name="Producto"
+    )
+    line = models.CharField(verbose_name="Linea", max_length=2, choices=ProductLine.choices)
+    quantity = models.DecimalField(default=0, max_digits=16, decimal_places=2)
+    subtotal = models.DecimalField(default=0, max_digits=16, decimal_places=2)
+    iva = models.DecimalField(default=0, max_digits=16, decimal_places=2)
+    cost = models.DecimalField(default=0, max_digits=16, decimal_places=2)
+
+    class Meta:
+        verbose_name = "Venta Diaria por Producto"
+        verbose_name_plural = "Ventas Diarias por Producto"
+        ordering = ("-date", "product")
+        constraints = [
+            models.UniqueConstraint(fields=["date", "product"], name="unique_daily_product_sales"),
+        ]
+        indexes = [
+            models.Index(fields=["date", "line"]),
+        ]
+
+    def __str__(self):
+        return f"{self.date} - {self.product}"
+
+
+class ImportCheckpoint(models.Model):
+    """Avance de una importación masiva (commerce.importer), para poder reanudarla."""
+
+    name = models.CharField(verbose_name="Importacion", max_length=200, unique=True)
+    position = models.PositiveBigIntegerField(verbose_name="Registros procesados", default=0)
+    invoices = models.PositiveBigIntegerField(verbose_name="Facturas importadas", default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Punto de Control de Importacion"
+        verbose_name_plural = "Puntos de Control de Importacion"
+
+    def __str__(self):
+        return f"{self.name} ({self.position})"
+
+
+class InvoiceSequence(models.Model):
+    """Último secuencial emitido por cada punto de emisión (commerce.sequences)."""
+
+    establishment = models.CharField(verbose_name="Establecimiento", max_length=3)
+    emission_point = models.CharField(verbose_name="Punto de Emision", max_length=3)
+    last_number = models.PositiveBigIntegerField(verbose_name="Ultimo Secuencial", default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Secuencia de Facturacion"
+        verbose_name_plural = "Secuencias de Facturacion"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["establishment", "emission_point"], name="unique_invoice_sequence"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.establishment}-{self.emission_point}: {self.last_number}"
@@ -0,0 +1,151 @@
+import hashlib
+import os
+import threading
+from pathlib import Path
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.template.loader import get_template
+from django.utils.http import http_date
+
+from core.catalog import catalog_cache
+from .utils import render_to_pdf_bytes
+
+
+class PdfCache:
+    """
+    Caché en disco de PDFs de impresión, direccionado por contenido.
+
+    La clave combina tipo de documento, id, versión (`document_version`: el
+    `updated` del documento y de su cliente o proveedor y la versión del
+    catálogo) y una huella de la plantilla, así cualquier cambio en lo
+    impreso o en el diseño genera una clave nueva. Los archivos se nombran
+    `<tipo>-<id>-<huella>.pdf` para poder invalidar todas las versiones de
+    un documento. El tamaño total se limita con desalojo LRU usando la fecha
+    de modificación del archivo, que se actualiza en cada acierto.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def root(self):
+        return Path(getattr(settings, "PDF_CACHE_DIR", Path(settings.BASE_DIR) / "cache" / "pdf"))
+
+    @property
+    def max_bytes(self):
+        return getattr(settings, "PDF_CACHE_MAX_BYTES", 200 * 1024 * 1024)
+
+    def template_version(self, template_src):
+        source = get_template(template_src).template.source
+        return hashlib.sha256(source.encode("UTF-8")).hexdigest()[:12]
+
+    def document_version(self, document, party, catalog=None):
+        """
+        Versión de lo que imprime `document` (de un DocumentLoader): su
+        `updated`, el de su tercero `party` (`customer` o `supplier`), por el
+        nombre, y la del catálogo, por las descripciones de los productos.
+        `catalog` evita releerla en cada documento de un lote.
+        """
+        catalog = catalog_cache.version() if catalog is None else catalog
+        return (document.updated, getattr(document, party).updated, catalog)
+
+    def digest(self, label, pk, version, template_src):
+        raw = f"{label}|{pk}|{version!r}|{self.template_version(template_src)}"
+        return hashlib.sha256(raw.encode("UTF-8")).hexdigest()[:32]
+
+    def path(self, label, pk, digest):
+        return self.root / f"{label}-{pk}-{digest}.pdf"
+
+    def get(self, label, pk, digest):
+        path = self.path(label, pk, digest)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        try:
+            os.utime(path)  # marca de uso reciente para el LRU
+        except OSError:
+            pass  # desalojado o invalidado tras la lectura: lo leído sigue sirviendo
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def set(self, label, pk, digest, data):
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.invalidate(label, pk)
+        path = self.path(label, pk, digest)
+        tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        self.evict()
+
+    def invalidate(self, label, pk):
+        for path in self.root.glob(f"{label}-{pk}-*.pdf"):
+            path.unlink(missing_ok=True)
+
+    def evict(self):
+        files = []
+        total = 0
+        for path in self.root.glob("*.pdf"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        files.sort()
+        for _, size, path in files:
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            with self._lock:
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / requests, 4) if requests else 0.0,
+            }
+
+
+pdf_cache = PdfCache()
+
+
+def cached_pdf_response(request, document, label, template_src, context, party):
+    """
+    Devuelve el PDF de `document` desde el caché o lo genera y lo guarda.
+    Responde 304 si el cliente ya tiene la versión vigente (ETag).
+    """
+    version = pdf_cache.document_version(document, party)
+    digest = pdf_cache.digest(label, document.pk, version, template_src)
+    etag = f'"{digest}"'
+    if etag in request.headers.get("If-None-Match", ""):
+        response = HttpResponseNotModified()
+        response["ETag"] = etag
+        return response
+
+    data = pdf_cache.get(label, document.pk, digest)
+    status = "HIT"
+    if data is None:
+        status = "MISS"
+        data = render_to_pdf_bytes(template_src, context)
+        if data is None:
+            return HttpResponse("Error al generar el PDF.", status=500)
+        pdf_cache.set(label, document.pk, digest, data)
+
+    response = HttpResponse(data, content_type="application/pdf")
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(document.updated.timestamp())
+    response["X-PDF-Cache"] = status
+    return response
@@ -0,0 +1,69 @@
+from decimal import ROUND_HALF_UP, Decimal
+
+from core.constants import ProductIva
+
+CENT = Decimal("0.01")
+HUNDRED = Decimal("100")
+IVA_RATES = tuple(ProductIva.values)
+
+
+def to_money(value):
+    """Redondea a centavos con ROUND_HALF_UP (el redondeo usado en facturación)."""
+    return Decimal(str(value)).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def price_basket(lines):
+    """
+    Calcula en una sola pasada los valores de una canasta de productos.
+
+    `lines` es un iterable de tuplas `(producto_id, precio, cantidad, tasa_iva)`.
+    Devuelve un dict con:
+        - lines: por línea `product`, `price`, `quantity`, `base` (precio x
+          cantidad), `iva` y `subtotal` (base + iva, igual que en el detalle).
+        - buckets: base e iva acumulados por tasa de `ProductIva` (0/5/15).
+        - subtotal, iva y total de la cabecera.
+    El IVA se redondea por línea y los totales son la suma de las líneas, así
+    la cabecera siempre cuadra con el detalle.
+    """
+    buckets = {rate: {"base": Decimal("0.00"), "iva": Decimal("0.00")} for rate in IVA_RATES}
+    priced = []
+    for product, price, quantity, rate in lines:
+        rate = int(rate)
+        if rate not in buckets:
+            raise ValueError(f"Tasa de IVA no válida: {rate}.")
+        price = to_money(price)
+        quantity = Decimal(str(quantity))
+        if quantity <= 0:
+            raise ValueError("La cantidad debe ser mayor a cero.")
+        base = to_money(price * quantity)
+        iva = to_money(base * rate / HUNDRED)
+        bucket = buckets[rate]
+        bucket["base"] += base
+        bucket["iva"] += iva
+        priced.append(
+            {
+                "product": product,
+                "price": price,
+                "quantity": quantity,
+                "base": base,
+                "iva": iva,
+                "subtotal": base + iva,
+            }
+        )
+
+    subtotal = sum((b["base"] for b in buckets.values()), Decimal("0.00"))
+    iva = sum((b["iva"] for b in buckets.values()), Decimal("0.00"))
+    return {
+        "lines": priced,
+        "buckets": buckets,
+        "subtotal": subtotal,
+        "iva": iva,
+        "total": subtotal + iva,
+    }
+
+
+def apply_totals(document, totals):
+    """Copia subtotal, iva y total calculados en el servidor a la cabecera."""
+    document.subtotal = totals["subtotal"]
+    document.iva = totals["iva"]
+    document.total = totals["total"]
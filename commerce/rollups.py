@@ -0,0 +1,228 @@
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+from django.db import connections, transaction
+from django.db.models import Case, Count, DecimalField, F, IntegerField, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import DailyProductSales, DailySalesSummary, Invoice, InvoiceDetail
+
+MONEY = DecimalField(max_digits=16, decimal_places=2)
+ZERO = Value(0, output_field=MONEY)
+
+
+def _increment(model, filters, key_field, deltas, defaults=None):
+    """
+    Suma `deltas` ({clave: {campo: valor}}) a las filas de `model` que
+    coinciden con `filters` y `key_field`=clave, creándolas si no existen.
+
+    Son dos consultas sin importar la cantidad de claves: un INSERT que ignora
+    las filas ya existentes y un UPDATE con `F() + CASE` por campo. Así dos
+    transacciones que tocan la misma fila no pierden incrementos.
+    """
+    if not deltas:
+        return
+    defaults = defaults or {}
+    model.objects.bulk_create(
+        [model(**filters, **{key_field: key}, **defaults.get(key, {})) for key in deltas],
+        ignore_conflicts=True,
+    )
+    fields = next(iter(deltas.values())).keys()
+    changes = {}
+    for field in fields:
+        output_field = IntegerField() if field == "invoices" else MONEY
+        changes[field] = F(field) + Case(
+            *[When(**{key_field: key}, then=Value(delta[field])) for key, delta in deltas.items()],
+            output_field=output_field,
+        )
+    model.objects.filter(**filters, **{f"{key_field}__in": list(deltas)}).update(**changes)
+
+
+def apply_invoice(invoice, sign=1):
+    """
+    Suma (`sign=1`) o resta (`sign=-1`) una factura a los resúmenes diarios.
+    Se llama al registrar, anular, editar o eliminar una factura activa,
+    dentro de la misma transacción que el cambio.
+    """
+    day = timezone.localdate(invoice.issue_date)
+    _increment(
+        DailySalesSummary,
+        {"date": day, "user_id": invoice.user_id},
+        "payment_method",
+        {
+            invoice.payment_method: {
+                "invoices": sign,
+                "subtotal": sign * invoice.subtotal,
+                "iva": sign * invoice.iva,
+                "total": sign * invoice.total,
+            }
+        },
+    )
+
+    lines = (
+        InvoiceDetail.objects.filter(invoice=invoice)
+        .values("product_id", "product__line")
+        .annotate(
+            total_quantity=Sum("quantity"),
+            total_subtotal=Sum("subtotal"),
+            total_iva=Sum("iva"),
+            total_cost=Coalesce(Sum(F("cost") * F("quantity"), output_field=MONEY), ZERO),
+        )
+        .order_by()
+    )
+    deltas = {}
+    defaults = {}
+    for line in lines:
+        deltas[line["product_id"]] = {
+            "quantity": sign * line["total_quantity"],
+            "subtotal": sign * line["total_subtotal"],
+            "iva": sign * line["total_iva"],
+            "cost": sign * line["total_cost"],
+        }
+        defaults[line["product_id"]] = {"line": line["product__line"]}
+    _increment(DailyProductSales, {"date": day}, "product_id", deltas, defaults)
+
+
+def apply_invoices(invoice_ids, sign=1):
+    """
+    Versión en bloque de `apply_invoice` para muchas facturas a la vez: dos
+    consultas agrupadas por día y un par de `_increment` por cada
+    combinación (día, usuario) y por cada día, sin importar cuántas facturas
+    o líneas haya.
+    """
+    tz = timezone.get_current_timezone()
+    summaries, products, defaults = {}, {}, {}
+    for row in (
+        Invoice.objects.filter(pk__in=invoice_ids)
+        .annotate(day=TruncDate("issue_date", tzinfo=tz))
+        .values("day", "user_id", "payment_method")
+        .annotate(
+            count=Count("id"), sum_subtotal=Sum("subtotal"), sum_iva=Sum("iva"),
+            sum_total=Sum("total"),
+        )
+        .order_by()
+    ):
+        summaries.setdefault((row["day"], row["user_id"]), {})[row["payment_method"]] = {
+            "invoices": sign * row["count"],
+            "subtotal": sign * row["sum_subtotal"],
+            "iva": sign * row["sum_iva"],
+            "total": sign * row["sum_total"],
+        }
+    for row in (
+        InvoiceDetail.objects.filter(invoice_id__in=invoice_ids)
+        .annotate(day=TruncDate("invoice__issue_date", tzinfo=tz))
+        .values("day", "product_id", "product__line")
+        .annotate(
+            sum_quantity=Sum("quantity"), sum_subtotal=Sum("subtotal"), sum_iva=Sum("iva"),
+            sum_cost=Coalesce(Sum(F("cost") * F("quantity"), output_field=MONEY), ZERO),
+        )
+        .order_by()
+    ):
+        products.setdefault(row["day"], {})[row["product_id"]] = {
+            "quantity": sign * row["sum_quantity"],
+            "subtotal": sign * row["sum_subtotal"],
+            "iva": sign * row["sum_iva"],
+            "cost": sign * row["sum_cost"],
+        }
+        defaults[row["product_id"]] = {"line": row["product__line"]}
+
+    for (day, user_id), deltas in summaries.items():
+        _increment(DailySalesSummary, {"date": day, "user_id": user_id}, "payment_method", deltas)
+    for day, deltas in products.items():
+        _increment(DailyProductSales, {"date": day}, "product_id", deltas, defaults)
+
+
+def _day_bounds(start, end):
+    """Rango [inicio de `start`, inicio del día siguiente a `end`) en hora local."""
+    tz = timezone.get_current_timezone()
+    lower = datetime.datetime.combine(start, datetime.time.min, tzinfo=tz)
+    upper = datetime.datetime.combine(
+        end + datetime.timedelta(days=1), datetime.time.min, tzinfo=tz
+    )
+    return lower, upper
+
+
+def rebuild_range(start, end):
+    """
+    Recalcula desde cero los resúmenes de `start` a `end` (inclusive) con dos
+    consultas agrupadas sobre las facturas activas y reemplaza las filas.
+    Devuelve (filas de resumen, filas por producto).
+    """
+    lower, upper = _day_bounds(start, end)
+    tz = timezone.get_current_timezone()
+    invoices = Invoice.objects.filter(state=True, issue_date__gte=lower, issue_date__lt=upper)
+    details = InvoiceDetail.objects.filter(
+        invoice__state=True, invoice__issue_date__gte=lower, invoice__issue_date__lt=upper
+    )
+
+    summaries = [
+        DailySalesSummary(
+            date=row["day"], payment_method=row["payment_method"], user_id=row["user_id"],
+            invoices=row["count"], subtotal=row["sum_subtotal"], iva=row["sum_iva"],
+            total=row["sum_total"],
+        )
+        for row in invoices.annotate(day=TruncDate("issue_date", tzinfo=tz))
+        .values("day", "payment_method", "user_id")
+        .annotate(
+            count=Count("id"), sum_subtotal=Sum("subtotal"), sum_iva=Sum("iva"),
+            sum_total=Sum("total"),
+        )
+        .order_by()
+    ]
+    products = [
+        DailyProductSales(
+            date=row["day"], product_id=row["product_id"], line=row["product__line"],
+            quantity=row["sum_quantity"], subtotal=row["sum_subtotal"], iva=row["sum_iva"],
+            cost=row["sum_cost"],
+        )
+        for row in details.annotate(day=TruncDate("invoice__issue_date", tzinfo=tz))
+        .values("day", "product_id", "product__line")
+        .annotate(
+            sum_quantity=Sum("quantity"), sum_subtotal=Sum("subtotal"), sum_iva=Sum("iva"),
+            sum_cost=Coalesce(Sum(F("cost") * F("quantity"), output_field=MONEY), ZERO),
+        )
+        .order_by()
+    ]
+
+    with transaction.atomic():
+        DailySalesSummary.objects.filter(date__range=(start, end)).delete()
+        DailyProductSales.objects.filter(date__range=(start, end)).delete()
+        DailySalesSummary.objects.bulk_create(summaries, batch_size=1000)
+        DailyProductSales.objects.bulk_create(products, batch_size=1000)
+    return len(summaries), len(products)
+
+
+def date_chunks(start, end, days):
+    """Parte [start, end] en tramos consecutivos de `days` días."""
+    while start <= end:
+        chunk_end = min(start + datetime.timedelta(days=days - 1), end)
+        yield start, chunk_end
+        start = chunk_end + datetime.timedelta(days=1)
+
+
+def rebuild(start, end, chunk_days=7, workers=1, progress=None):
+    """
+    Reconstruye el rango por tramos de `chunk_days` días. Con `workers > 1`
+    los tramos se procesan en paralelo, cada hilo con su propia conexión.
+    Devuelve los totales (filas de resumen, filas por producto).
+    """
+    chunks = list(date_chunks(start, end, chunk_days))
+
+    def run(chunk):
+        try:
+            return chunk, rebuild_range(*chunk)
+        finally:
+            if workers > 1:
+                connections.close_all()  # solo las conexiones de este hilo
+
+    totals = [0, 0]
+    with ThreadPoolExecutor(max_workers=workers) if workers > 1 else nullcontext() as pool:
+        results = pool.map(run, chunks) if pool else map(run, chunks)
+        for chunk, (summaries, products) in results:
+            totals[0] += summaries
+            totals[1] += products
+            if progress:
+                progress(chunk, summaries, products)
+    return tuple(totals)
@@ -0,0 +1,161 @@
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, FloatField, Q
+from django.db.models.expressions import Expression, RawSQL
+from django.db.models.functions import Greatest
+from django.utils.module_loading import import_string
+
+# Tablas FTS5 creadas por core/migrations/0008_search_indexes.py (solo SQLite):
+# tabla base -> (tabla fts, columnas indexadas)
+SQLITE_FTS_TABLES = {
+    "core_customer": ("core_customer_fts", ("first_name", "last_name", "dni")),
+    "core_supplier": ("core_supplier_fts", ("name", "ruc")),
+    "core_product": ("core_product_fts", ("description",)),
+}
+
+
+def _split_field(model, path):
+    """
+    Resuelve 'customer__first_name' a (prefijo, modelo, campo) siguiendo las
+    relaciones: ('customer__', Customer, field).
+    """
+    parts = path.split("__")
+    for name in parts[:-1]:
+        model = model._meta.get_field(name).related_model
+    prefix = "__".join(parts[:-1])
+    return (f"{prefix}__" if prefix else ""), model, model._meta.get_field(parts[-1])
+
+
+class IcontainsSearchBackend:
+    """Búsqueda original: OR de `icontains` sobre cada campo (sin ranking)."""
+
+    def filter(self, queryset, fields, query):
+        q_object = Q()
+        for field in fields:
+            q_object |= Q(**{f"{field}__icontains": query})
+        return queryset.filter(q_object)
+
+
+class TrigramSearchBackend(IcontainsSearchBackend):
+    """
+    PostgreSQL + pg_trgm. El filtro sigue siendo `icontains` (Django genera
+    `UPPER(col) LIKE UPPER('%x%')`), que queda cubierto por los índices GIN
+    `gin_trgm_ops` sobre `UPPER(col)`; además se ordena por la mayor
+    similitud trigram entre los campos (`search_rank`).
+    """
+
+    def filter(self, queryset, fields, query):
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        queryset = super().filter(queryset, fields, query)
+        scores = [TrigramSimilarity(field, query) for field in fields]
+        rank = Greatest(*scores) if len(scores) > 1 else scores[0]
+        return queryset.annotate(search_rank=rank).order_by(
+            "-search_rank", *queryset.query.order_by or queryset.model._meta.ordering
+        )
+
+
+class FtsRank(Expression):
+    """
+    `bm25` de la fila en la tabla FTS (0 si no coincide), como subconsulta
+    sobre un CTE `MATERIALIZED` que ejecuta el MATCH una sola vez por
+    consulta y se busca por `rowid`; un MATCH correlacionado por fila
+    repetiría la búsqueda completa en cada fila. Se compila junto con el
+    queryset: no ejecuta nada hasta que el queryset se evalúa. Requiere
+    SQLite 3.35+ (`supported`).
+    """
+
+    output_field = FloatField()
+
+    def __init__(self, fts_table, match, pk):
+        super().__init__()
+        self.fts_table = fts_table
+        self.match = match
+        self.pk = F(pk) if isinstance(pk, str) else pk
+
+    @staticmethod
+    def supported(connection):
+        return connection.Database.sqlite_version_info >= (3, 35)
+
+    def get_source_expressions(self):
+        return [self.pk]
+
+    def set_source_expressions(self, exprs):
+        (self.pk,) = exprs
+
+    def as_sql(self, compiler, connection):
+        pk_sql, pk_params = compiler.compile(self.pk)
+        table = self.fts_table
+        return (
+            f"COALESCE((WITH {table}_rank AS MATERIALIZED ("
+            f"SELECT rowid, -rank AS score FROM {table} WHERE {table} MATCH %s) "
+            f"SELECT score FROM {table}_rank WHERE rowid = {pk_sql}), 0.0)",
+            [self.match, *pk_params],
+        )
+
+
+class FtsSearchBackend(IcontainsSearchBackend):
+    """
+    SQLite + FTS5. Los campos de tablas con índice FTS se buscan con MATCH
+    por prefijo de palabra (`"ana"* "per"*`), no por subcadena: "per"
+    encuentra "PERALTA" pero no "ESPERANZA". El resto de campos cae a
+    `icontains`. Se ordena por `bm25` (`search_rank`, ver `FtsRank`).
+    """
+
+    @staticmethod
+    def match_expression(query):
+        tokens = re.findall(r"\w+", query, flags=re.UNICODE)
+        return " ".join(f'"{token}"*' for token in tokens)
+
+    def filter(self, queryset, fields, query):
+        match = self.match_expression(query)
+        if not match:
+            return queryset.none()
+
+        q_object = Q()
+        fts_prefixes = {}
+        for path in fields:
+            prefix, model, field = _split_field(queryset.model, path)
+            fts = SQLITE_FTS_TABLES.get(model._meta.db_table)
+            if fts and field.column in fts[1]:
+                fts_prefixes.setdefault(prefix, fts[0])
+            else:
+                q_object |= Q(**{f"{path}__icontains": query})
+
+        ranks = []
+        for prefix, fts_table in fts_prefixes.items():
+            subquery = RawSQL(f"SELECT rowid FROM {fts_table} WHERE {fts_table} MATCH %s", [match])
+            q_object |= Q(**{f"{prefix}pk__in": subquery})
+            if FtsRank.supported(connection):
+                ranks.append(FtsRank(fts_table, match, f"{prefix}pk"))
+
+        queryset = queryset.filter(q_object)
+        if not ranks:
+            return queryset
+        ordering = queryset.query.order_by or queryset.model._meta.ordering
+        rank = ranks[0] if len(ranks) == 1 else Greatest(*ranks)
+        return queryset.annotate(search_rank=rank).order_by("-search_rank", *ordering)
+
+
+class AutoSearchBackend:
+    """Elige el backend según el motor de la base de datos activa."""
+
+    backends = {
+        "postgresql": TrigramSearchBackend,
+        "sqlite": FtsSearchBackend,
+    }
+
+    def filter(self, queryset, fields, query):
+        backend = self.backends.get(connection.vendor, IcontainsSearchBackend)
+        return backend().filter(queryset, fields, query)
+
+
+def get_search_backend(path=None):
+    """
+    Devuelve una instancia del backend configurado en `QUERY_SEARCH_BACKEND`
+    (ruta con puntos); por defecto `AutoSearchBackend`.
+    """
+    path = path or getattr(settings, "QUERY_SEARCH_BACKEND", "commerce.search.AutoSearchBackend")
+    return import_string(path)()
@@ -0,0 +1,114 @@
+import re
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.db.transaction import TransactionManagementError
+
+from .models import Invoice, InvoiceSequence
+
+
+# Cookie con el punto de emisión de la terminal ("001-002"): cada navegador
+# de caja conserva su propia serie aunque compartan usuario y despliegue.
+POS_COOKIE = "invoice_pos"
+POS_COOKIE_MAX_AGE = 365 * 24 * 3600
+POS_CODE = re.compile(r"^\d{3}$")
+
+
+def terminal_point_of_sale(request):
+    """(establecimiento, punto de emisión) guardados por la terminal, o None."""
+    parts = tuple(request.COOKIES.get(POS_COOKIE, "").split("-"))
+    if len(parts) == 2 and all(POS_CODE.match(part) for part in parts):
+        return parts
+    return None
+
+
+def point_of_sale(invoice=None, request=None):
+    """
+    (establecimiento, punto de emisión) de la factura; si no los tiene, los
+    de la terminal que hace el pedido (`terminal_point_of_sale`) y, por
+    último, los de la configuración.
+    """
+    default = (request and terminal_point_of_sale(request)) or (
+        getattr(settings, "INVOICE_ESTABLISHMENT", "001"),
+        getattr(settings, "INVOICE_EMISSION_POINT", "001"),
+    )
+    establishment = getattr(invoice, "establishment", "") or default[0]
+    emission_point = getattr(invoice, "emission_point", "") or default[1]
+    return establishment, emission_point
+
+
+def remember_point_of_sale(response, invoice):
+    """Guarda en la terminal el punto de emisión de la factura para las siguientes."""
+    response.set_cookie(
+        POS_COOKIE,
+        f"{invoice.establishment}-{invoice.emission_point}",
+        max_age=POS_COOKIE_MAX_AGE,
+        samesite="Lax",
+    )
+    return response
+
+
+def next_number(establishment, emission_point):
+    """
+    Reserva el siguiente secuencial del punto de emisión.
+
+    El contador es una fila por punto de emisión que se incrementa con un
+    UPDATE atómico; el bloqueo de esa fila dura hasta que termina la
+    transacción que lo llamó, así que un rollback devuelve el número y no
+    quedan huecos. Por eso debe llamarse dentro de `transaction.atomic()` y
+    lo más tarde posible: las facturas de distintos puntos de emisión no se
+    esperan entre sí, y las del mismo punto solo mientras dura el commit.
+    """
+    return reserve_numbers(establishment, emission_point, 1)
+
+
+def reserve_numbers(establishment, emission_point, count):
+    """
+    Reserva `count` secuenciales consecutivos del punto de emisión con un
+    solo UPDATE (ver `next_number`) y devuelve el primero.
+    """
+    _counter_update(establishment, emission_point, last_number=F("last_number") + count)
+    return InvoiceSequence.objects.filter(
+        establishment=establishment, emission_point=emission_point
+    ).values_list("last_number", flat=True).get() - count + 1
+
+
+def advance_number(establishment, emission_point, number):
+    """
+    Lleva el contador del punto de emisión al menos hasta `number`, para que
+    los secuenciales ya usados (p. ej. importados de otro sistema) no se
+    vuelvan a emitir. Mismas condiciones de transacción que `next_number`.
+    """
+    _counter_update(
+        establishment, emission_point, last_number=Greatest(F("last_number"), Value(number))
+    )
+
+
+def _counter_update(establishment, emission_point, **values):
+    if not transaction.get_connection().in_atomic_block:
+        raise TransactionManagementError(
+            "Los secuenciales deben reservarse dentro de transaction.atomic()."
+        )
+    counter = InvoiceSequence.objects.filter(
+        establishment=establishment, emission_point=emission_point
+    )
+    if not counter.update(**values):
+        # Primer uso del punto de emisión; get_or_create tolera la carrera.
+        InvoiceSequence.objects.get_or_create(
+            establishment=establishment, emission_point=emission_point
+        )
+        counter.update(**values)
+
+
+def assign_number(invoice):
+    """Numera una factura ya guardada con el siguiente secuencial de su punto de emisión."""
+    invoice.establishment, invoice.emission_point = point_of_sale(invoice)
+    invoice.sequence = next_number(invoice.establishment, invoice.emission_point)
+    Invoice.objects.filter(pk=invoice.pk).update(
+        establishment=invoice.establishment,
+        emission_point=invoice.emission_point,
+        sequence=invoice.sequence,
+    )
+    return invoice.number
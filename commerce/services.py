@@ -0,0 +1,229 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from core import ledger
+from core.catalog import catalog_cache
+from core.constants import MovementKind
+from core.models import Product
+from core.stock import reserve_stock, restore_stock
+from .line_diff import apply_line_diff, diff_lines
+from .models import Invoice, InvoiceDetail
+from .pdf_cache import pdf_cache
+from .pricing import apply_totals, price_basket
+from .rollups import apply_invoice, apply_invoices
+from .sequences import assign_number
+
+
+def post_invoice(invoice, detail_data):
+    """
+    Guarda la factura con su detalle y descuenta el stock en bloque.
+
+    Precios, IVA y totales se recalculan en el servidor con `price_basket`
+    a partir del catálogo; los valores enviados por el cliente se ignoran.
+    Precio, costo e IVA se leen del caché del catálogo (`core.catalog`), y la
+    base de datos solo se toca para la reserva atómica de stock de
+    `core.stock.reserve_stock`, el INSERT de la cabecera y un `bulk_create`
+    para el detalle y otro para el libro de inventario (`core.ledger`), sin
+    importar la cantidad de líneas.
+
+    El número fiscal (`commerce.sequences`) se asigna al final, dentro de la
+    misma transacción: el contador del punto de emisión queda bloqueado
+    solo hasta el commit y un rollback no deja huecos en la numeración.
+    """
+    quantities = defaultdict(Decimal)
+    for item in detail_data:
+        quantities[int(item["id"])] += Decimal(str(item["quantify"]))
+
+    products = catalog_cache.products(quantities)
+    missing = set(quantities) - set(products)
+    if missing:
+        raise ValueError(f"Productos no encontrados o inactivos: {sorted(missing)}")
+
+    totals = price_basket(
+        (pk, products[pk].price, quantity, products[pk].iva)
+        for pk, quantity in quantities.items()
+    )
+    with transaction.atomic():
+        reserve_stock(quantities)
+
+        apply_totals(invoice, totals)
+        invoice.save()
+
+        details = [
+            InvoiceDetail(
+                invoice=invoice,
+                product_id=line["product"],
+                quantity=line["quantity"],
+                price=line["price"],
+                cost=products[line["product"]].cost,
+                subtotal=line["subtotal"],
+                iva=line["iva"],
+            )
+            for line in totals["lines"]
+        ]
+        InvoiceDetail.objects.bulk_create(details)
+        ledger.record(
+            MovementKind.SALE, "invoice", ledger.document_rows(invoice.pk, quantities), sign=-1
+        )
+        apply_invoice(invoice)
+        assign_number(invoice)
+    return details
+
+
+INVOICE_LINE_FIELDS = ("quantity", "price", "cost", "subtotal", "iva")
+
+
+def update_invoice(invoice, detail_data):
+    """
+    Guarda los cambios de una factura activa y de su detalle.
+
+    Las líneas se concilian por producto con `commerce.line_diff`: solo se
+    insertan, actualizan o borran las filas que cambiaron, y el stock se
+    mueve por la diferencia neta de cada producto (reserva atómica si se
+    vende más, devolución si se vende menos). Los productos que ya estaban
+    en la factura conservan el precio y el costo con que se vendieron; los
+    nuevos toman los del catálogo. El número de consultas no depende de la
+    cantidad de líneas.
+    """
+    quantities = defaultdict(Decimal)
+    for item in detail_data:
+        quantities[int(item["id"])] += Decimal(str(item["quantify"]))
+    if not quantities:
+        raise ValueError("La factura debe tener al menos un producto.")
+
+    with transaction.atomic():
+        previous = Invoice.objects.select_for_update().get(pk=invoice.pk)
+        if not previous.state:
+            raise ValueError("No se puede editar una factura anulada.")
+        stored = list(
+            InvoiceDetail.objects.filter(invoice_id=invoice.pk).only(
+                "id", "product_id", *INVOICE_LINE_FIELDS
+            )
+        )
+        # (precio, costo) de venta de las líneas guardadas y
+        # (precio, costo, iva, activo) del catálogo.
+        sold_at = {line.product_id: (line.price, line.cost) for line in stored}
+        products = {
+            pk: (price, cost, iva, state)
+            for pk, price, cost, iva, state in Product.objects.filter(
+                pk__in=list(quantities)
+            ).values_list("id", "price", "cost", "iva", "state")
+        }
+        # Un producto desactivado puede seguir en la factura, pero no agregarse.
+        missing = [
+            pk for pk in quantities
+            if pk not in products or (pk not in sold_at and not products[pk][3])
+        ]
+        if missing:
+            raise ValueError(f"Productos no encontrados o inactivos: {sorted(missing)}")
+
+        totals = price_basket(
+            (pk, sold_at.get(pk, products[pk])[0], quantity, products[pk][2])
+            for pk, quantity in quantities.items()
+        )
+        diff = diff_lines(
+            stored,
+            [
+                {
+                    "product_id": line["product"],
+                    "quantity": line["quantity"],
+                    "price": line["price"],
+                    "cost": sold_at.get(line["product"], products[line["product"]])[1],
+                    "subtotal": line["subtotal"],
+                    "iva": line["iva"],
+                }
+                for line in totals["lines"]
+            ],
+            INVOICE_LINE_FIELDS,
+            sign=-1,
+        )
+
+        # Los resúmenes leen el detalle: se resta la versión anterior antes
+        # de tocar las líneas y se suma la nueva al final.
+        apply_invoice(previous, sign=-1)
+        reserve_stock({pk: -delta for pk, delta in diff.stock.items() if delta < 0})
+        restore_stock({pk: delta for pk, delta in diff.stock.items() if delta > 0})
+        ledger.record(MovementKind.SALE, "invoice", ledger.document_rows(invoice.pk, diff.stock))
+        apply_line_diff(InvoiceDetail, "invoice", invoice, diff, INVOICE_LINE_FIELDS)
+        apply_totals(invoice, totals)
+        invoice.save()
+        apply_invoice(invoice)
+    return diff
+
+
+def sold_lines(invoice_ids):
+    """(factura, producto, cantidad) vendidos en las facturas dadas (una consulta agrupada)."""
+    return list(
+        InvoiceDetail.objects.filter(invoice_id__in=invoice_ids)
+        .values_list("invoice_id", "product_id")
+        .annotate(total=Sum("quantity"))
+        .order_by()
+    )
+
+
+def return_stock(invoice_ids):
+    """Devuelve al inventario lo vendido en las facturas dadas y lo registra en el libro."""
+    lines = sold_lines(invoice_ids)
+    restore_stock((pk, quantity) for _, pk, quantity in lines)
+    ledger.record(MovementKind.SALE_ANNUL, "invoice", lines)
+
+
+def annul_invoice(invoice):
+    """
+    Anula una factura activa: devuelve su stock con un UPDATE agregado por
+    producto y la descuenta de los resúmenes diarios. La factura queda
+    bloqueada mientras tanto, así que devuelve False si ya estaba anulada
+    y la operación no se repite.
+    """
+    with transaction.atomic():
+        invoice = Invoice.objects.select_for_update().get(pk=invoice.pk)
+        if not invoice.state:
+            return False
+        invoice.state = False
+        invoice.save(update_fields=["state", "updated"])
+        return_stock([invoice.pk])
+        apply_invoice(invoice, sign=-1)
+    return True
+
+
+def annul_invoices(pks):
+    """
+    Anula en bloque las facturas activas de `pks` con un número fijo de
+    consultas: bloqueo de las cabeceras, un UPDATE de estado, una consulta
+    agrupada, un UPDATE de stock y el INSERT de los movimientos de
+    inventario, más los resúmenes diarios agrupados por día
+    (`apply_invoices`). Las facturas ya anuladas o inexistentes se omiten.
+    Devuelve la lista de ids anulados.
+    """
+    with transaction.atomic():
+        ids = list(
+            Invoice.objects.select_for_update()
+            .filter(pk__in=pks, state=True)
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+        if not ids:
+            return []
+        Invoice.objects.filter(pk__in=ids).update(state=False, updated=timezone.now())
+        return_stock(ids)
+        apply_invoices(ids, sign=-1)
+        # El UPDATE en bloque no emite post_save: se limpian los PDF a mano.
+        transaction.on_commit(lambda: [pdf_cache.invalidate("invoice", pk) for pk in ids])
+    return ids
+
+
+def delete_invoice(invoice):
+    """
+    Elimina la factura; si estaba activa devuelve su stock y se descuenta de
+    los resúmenes (si ya estaba anulada, eso ocurrió al anularla).
+    """
+    with transaction.atomic():
+        invoice = Invoice.objects.select_for_update().get(pk=invoice.pk)
+        if invoice.state:
+            return_stock([invoice.pk])
+            apply_invoice(invoice, sign=-1)
+        invoice.delete()
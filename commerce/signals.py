@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Invoice
+from .pdf_cache import pdf_cache
+
+
+@receiver([post_save, post_delete], sender=Invoice)
+def invalidate_invoice_pdf(sender, instance, **kwargs):
+    # Guardar o anular la factura cambia `updated`; se borran las versiones viejas.
+    pdf_cache.invalidate("invoice", instance.pk)
@@ -1,3 +1,1270 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import tracemalloc
+import zipfile
+from datetime import date, timedelta
+from io import BytesIO, StringIO
+from decimal import Decimal
+from unittest.mock import patch
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, close_old_connections, connection, transaction
+from django.db.transaction import TransactionManagementError
+from django.db.models import Sum
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+from django.template.loader import render_to_string
+from django.urls import reverse
+
+from core import ledger
+from core.catalog import catalog_cache
+from core.constants import InvoicePaymentMethod, MovementKind
+from core.models import Customer, IdempotencyKey, InventoryMovement, Product, StockSnapshot
+from core.testing import (
+    benchmark, create_catalog, create_customer, postgresql_only, report, sqlite_only,
+)
+from .batch_print import pdf_converter
+from .documents import InvoiceLoader, invoice_loader
+from .models import (
+    DailyProductSales, DailySalesSummary, ImportCheckpoint, Invoice, InvoiceDetail,
+    InvoiceSequence,
+)
+from .pdf_cache import pdf_cache
+from .pricing import price_basket
+from .search import FtsSearchBackend, IcontainsSearchBackend, get_search_backend
+from .utils import render_html_to_pdf
+from .sequences import POS_COOKIE, next_number
+from .services import (
+    annul_invoice, annul_invoices, delete_invoice, post_invoice, update_invoice,
+)
+from .views import InvoiceBatchPrintView
+
+
+def ledger_free(ctx):
+    """Consultas capturadas sin los INSERT del libro de inventario, que se parten en lotes."""
+    return sum("core_inventorymovement" not in query["sql"] for query in ctx.captured_queries)
+
+
+def basket(products, quantity=1):
+    return [
+        {
+            "id": p.pk,
+            "quantify": quantity,
+            "price": str(p.price),
+            "sub": str(p.price * quantity),
+            "iva": "0",
+        }
+        for p in products
+    ]
+
+
+class CommerceTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("cajero", password="secret")
+        cls.customer = create_customer()
+        cls.products = create_catalog(cls.user, 60)
+
+    def setUp(self):
+        # El catálogo se creó con bulk_create (sin señales) y cada prueba
+        # revierte la base de datos: se descarta la instantánea anterior.
+        catalog_cache.clear()
+
+    def new_invoice(self):
+        return Invoice(customer=self.customer, user=self.user)
+
+
+class PostInvoiceTests(CommerceTestCase):
+    def test_creates_details_and_reduces_stock(self):
+        invoice = self.new_invoice()
+        post_invoice(invoice, basket(self.products[:3], quantity=2))
+
+        self.assertEqual(invoice.detail.count(), 3)
+        self.assertEqual(invoice.subtotal, Decimal("6.00"))
+        self.assertEqual(invoice.total, Decimal("6.90"))
+        for product in self.products[:3]:
+            product.refresh_from_db()
+            self.assertEqual(product.stock, 98)
+
+    def test_insufficient_stock_raises(self):
+        invoice = self.new_invoice()
+        with self.assertRaises(ValueError):
+            post_invoice(invoice, basket(self.products[:1], quantity=101))
+        self.assertFalse(InvoiceDetail.objects.exists())
+
+    def test_ignores_client_totals(self):
+        invoice = self.new_invoice()
+        data = basket(self.products[:1])
+        data[0].update(price="0.01", sub="0.01", iva="0")
+        post_invoice(invoice, data)
+
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.subtotal, Decimal("1.00"))
+        self.assertEqual(invoice.detail.get().price, Decimal("1.00"))
+
+    def test_query_count_is_flat(self):
+        catalog_cache.snapshot()
+        InvoiceSequence.objects.create(establishment="001", emission_point="001")
+        counts = {}
+        for size in (1, 10, 60):
+            invoice = self.new_invoice()
+            with CaptureQueriesContext(connection) as ctx:
+                post_invoice(invoice, basket(self.products[:size]))
+            counts[size] = len(ctx.captured_queries)
+        self.assertEqual(len(set(counts.values())), 1, counts)
+
+
+class PriceBasketTests(TestCase):
+    def test_iva_buckets_and_totals(self):
+        totals = price_basket(
+            [
+                (1, "1.10", 3, 15),
+                (2, "2.00", "1.5", 5),
+                (3, "0.99", 1, 0),
+            ]
+        )
+        self.assertEqual(totals["buckets"][15], {"base": Decimal("3.30"), "iva": Decimal("0.50")})
+        self.assertEqual(totals["buckets"][5], {"base": Decimal("3.00"), "iva": Decimal("0.15")})
+        self.assertEqual(totals["buckets"][0], {"base": Decimal("0.99"), "iva": Decimal("0.00")})
+        self.assertEqual(totals["subtotal"], Decimal("7.29"))
+        self.assertEqual(totals["iva"], Decimal("0.65"))
+        self.assertEqual(totals["total"], Decimal("7.94"))
+        self.assertEqual(totals["lines"][0]["subtotal"], Decimal("3.80"))
+
+    def test_rejects_unknown_rate(self):
+        with self.assertRaises(ValueError):
+            price_basket([(1, "1.00", 1, 12)])
+
+    def test_throughput(self):
+        results = {}
+        for size in (1, 10, 100, 500):
+            lines = [(i, "1.37", i % 7 + 1, (0, 5, 15)[i % 3]) for i in range(size)]
+            rounds = max(1, 2000 // size)
+            start = time.perf_counter()
+            for _ in range(rounds):
+                totals = price_basket(lines)
+            elapsed = (time.perf_counter() - start) / rounds
+            results[size] = f"{elapsed * 1000:.3f}ms"
+            self.assertEqual(len(totals["lines"]), size)
+        report(f"price_basket por canasta (lineas -> tiempo): {results}")
+
+
+class InvoicePdfCacheTests(CommerceTestCase):
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        settings = override_settings(PDF_CACHE_DIR=tmp.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client.force_login(self.user)
+        self.invoice = self.new_invoice()
+        post_invoice(self.invoice, basket(self.products[:2]))
+        self.url = reverse("commerce:invoice_print", args=[self.invoice.pk])
+
+    def test_reprint_is_served_from_cache(self):
+        first = self.client.get(self.url)
+        second = self.client.get(self.url)
+        self.assertEqual(first["X-PDF-Cache"], "MISS")
+        self.assertEqual(second["X-PDF-Cache"], "HIT")
+        self.assertEqual(first.content, second.content)
+        self.assertIn("Last-Modified", second)
+
+    def test_etag_returns_not_modified(self):
+        first = self.client.get(self.url)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_annul_invalidates_cached_pdf(self):
+        self.client.get(self.url)
+        self.client.post(reverse("commerce:invoice_annul", args=[self.invoice.pk]))
+        self.assertFalse(list(pdf_cache.root.glob(f"invoice-{self.invoice.pk}-*")))
+        self.assertEqual(self.client.get(self.url)["X-PDF-Cache"], "MISS")
+
+    def test_customer_and_catalog_changes_refresh_the_pdf(self):
+        self.client.get(self.url)
+        self.customer.first_name = "Andrea"
+        self.customer.save()
+        self.assertEqual(self.client.get(self.url)["X-PDF-Cache"], "MISS")
+        self.products[0].description = "Arroz integral"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products[0].save()
+        self.assertEqual(self.client.get(self.url)["X-PDF-Cache"], "MISS")
+        self.assertEqual(self.client.get(self.url)["X-PDF-Cache"], "HIT")
+
+    def test_file_removed_while_reading_is_still_served(self):
+        self.client.get(self.url)
+        with patch("commerce.pdf_cache.os.utime", side_effect=FileNotFoundError):
+            response = self.client.get(self.url)
+        self.assertEqual(response["X-PDF-Cache"], "HIT")
+        self.assertTrue(response.content.startswith(b"%PDF"))
+
+    def test_eviction_keeps_cache_bounded(self):
+        with override_settings(PDF_CACHE_MAX_BYTES=1):
+            self.client.get(self.url)
+        self.assertFalse(list(pdf_cache.root.glob("*.pdf")))
+
+
+class InvoiceBatchPrintTests(CommerceTestCase):
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        settings = override_settings(PDF_CACHE_DIR=tmp.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client.force_login(self.user)
+        for i in range(6):
+            post_invoice(self.new_invoice(), basket(self.products[i * 5:(i + 1) * 5]))
+        self.url = reverse("commerce:invoice_batch_print")
+        self.today = timezone.localdate().isoformat()
+
+    def test_zip_export_with_progress(self):
+        response = self.client.get(self.url, {"job": "cierre", "start": self.today})
+        archive = zipfile.ZipFile(BytesIO(b"".join(response.streaming_content)))
+        self.assertEqual(len(archive.namelist()), 6)
+        progress = self.client.get(
+            reverse("commerce:batch_print_progress", args=["cierre"])
+        ).json()
+        self.assertEqual(progress, {"done": 6, "total": 6})
+
+    def test_merged_pdf_export_by_customer(self):
+        response = self.client.get(
+            self.url, {"format": "pdf", "customer": self.customer.pk}
+        )
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        self.assertTrue(response.content.startswith(b"%PDF"))
+
+    def test_invalid_parameters_return_400(self):
+        for params in (
+            {"customer": "abc"}, {"start": "ayer"}, {"end": "2024-02-30"}, {"format": "docx"},
+        ):
+            with self.subTest(params=params):
+                response = self.client.get(self.url, params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("error", response.json())
+
+    def test_export_needs_a_filter_and_is_capped(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("filtro", response.json()["error"])
+        with patch.object(InvoiceBatchPrintView, "max_documents", 5):
+            response = self.client.get(self.url, {"start": self.today})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("hasta 5", response.json()["error"])
+
+    def test_failed_document_is_listed_and_zip_is_complete(self):
+        calls = []
+
+        def flaky(html):
+            calls.append(html)
+            return None if len(calls) == 1 else render_html_to_pdf(html)
+
+        with patch("commerce.batch_print.render_html_to_pdf", flaky):
+            response = self.client.get(self.url, {"end": self.today})
+            content = b"".join(response.streaming_content)
+        self.assertEqual(response.status_code, 200)
+        archive = zipfile.ZipFile(BytesIO(content))
+        self.assertEqual(len(archive.namelist()), 6)  # 5 PDF + errores.txt
+        self.assertIn(b"No se pudo generar", archive.read("errores.txt"))
+
+    def test_pool_only_for_large_batches(self):
+        invoices = invoice_loader.load(Invoice.objects.all())
+        htmls = [render_to_string("invoice/print.html", {"invoice": i}) for i in invoices]
+        converted, pool = pdf_converter(htmls, workers=2)
+        self.assertIsNone(pool)
+        serial = list(converted)
+        with self.settings(PDF_EXPORT_POOL_MIN=len(htmls)):
+            converted, pool = pdf_converter(htmls, workers=2)
+            try:
+                self.assertIsNotNone(pool)
+                self.assertEqual([len(data) > 0 for data in converted], [True] * len(serial))
+            finally:
+                pool.shutdown()
+        converted, pool = pdf_converter(htmls, workers=1)
+        self.assertIsNone(pool)
+
+    def test_pool_throughput_against_serial(self):
+        invoices = invoice_loader.load(Invoice.objects.all())
+        htmls = [render_to_string("invoice/print.html", {"invoice": i}) for i in invoices]
+        start = time.perf_counter()
+        serial = list(pdf_converter(htmls, workers=1)[0])
+        serial_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with self.settings(PDF_EXPORT_POOL_MIN=0):
+            converted, pool = pdf_converter(htmls, workers=2)
+            try:
+                pooled = list(converted)
+            finally:
+                pool.shutdown()
+        pool_time = time.perf_counter() - start
+
+        report(
+            f"Exportación de {len(htmls)} facturas: serial {serial_time:.3f}s, "
+            f"pool {pool_time:.3f}s"
+        )
+        self.assertEqual(len(pooled), len(serial))
+
+
+class InvoiceExportTests(CommerceTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+        self.url = reverse("commerce:invoice_export")
+
+    def create_invoices(self, count):
+        Invoice.objects.bulk_create(
+            [Invoice(customer=self.customer, user=self.user, total=i) for i in range(count)]
+        )
+
+    def consume(self, params=None):
+        tracemalloc.start()
+        start = time.perf_counter()
+        response = self.client.get(self.url, params or {})
+        chunks = iter(response.streaming_content)
+        first = next(chunks)
+        ttfb = time.perf_counter() - start
+        size = len(first) + sum(len(chunk) for chunk in chunks)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return {"ttfb": ttfb, "elapsed": elapsed, "peak": peak, "first": len(first), "size": size}
+
+    def test_csv_honors_query_filter(self):
+        other = create_customer("0923456789", "Luis", "Mora")
+        Invoice.objects.create(customer=other, user=self.user)
+        self.create_invoices(3)
+        response = self.client.get(self.url, {"q": "mora"})
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn("MORA", lines[1])
+
+    def test_xlsx_is_a_valid_workbook(self):
+        self.create_invoices(5)
+        response = self.client.get(self.url, {"format": "xlsx"})
+        archive = zipfile.ZipFile(BytesIO(b"".join(response.streaming_content)))
+        sheet = archive.read("xl/worksheets/sheet1.xml").decode()
+        self.assertEqual(sheet.count("<row>"), 6)
+
+    def test_memory_stays_flat(self):
+        self.create_invoices(3000)
+        small = self.consume()
+        self.create_invoices(27000)
+        large = self.consume()
+        self.assertGreater(large["size"], small["size"] * 10)
+        self.assertLess(large["peak"], small["peak"] * 2)
+
+    def test_first_chunk_arrives_before_the_body(self):
+        self.create_invoices(30000)
+        result = self.consume()
+        # El primer bloque es una parte pequeña del cuerpo y llega mucho antes
+        # de que termine la exportación, con una cota absoluta holgada.
+        self.assertLess(result["first"], result["size"] / 10)
+        self.assertLess(result["ttfb"], result["elapsed"] / 5)
+        self.assertLess(result["ttfb"], 1.0)
+
+
+class KeysetPaginationTests(CommerceTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+        now = timezone.now()
+        # Fechas repetidas para probar el desempate por id
+        Invoice.objects.bulk_create(
+            [
+                Invoice(
+                    customer=self.customer, user=self.user,
+                    issue_date=now - timezone.timedelta(minutes=i // 3),
+                )
+                for i in range(95)
+            ]
+        )
+        self.expected = list(
+            Invoice.objects.order_by("-issue_date", "id").values_list("id", flat=True)
+        )
+        self.url = reverse("commerce:invoice_list")
+
+    def get_page(self, cursor=None):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url, {"cursor": cursor} if cursor else {})
+        invoice_queries = [
+            q["sql"] for q in ctx.captured_queries if "commerce_invoice" in q["sql"]
+        ]
+        return response, invoice_queries
+
+    def test_walks_every_row_forward_and_back(self):
+        seen, cursors = [], []
+        response, _ = self.get_page()
+        while True:
+            seen.extend(i.pk for i in response.context["invoices"])
+            cursor = response.context["next_cursor"]
+            if not cursor:
+                break
+            cursors.append(response.context["prev_cursor"])
+            response, queries = self.get_page(cursor)
+            self.assertEqual(len(queries), 1)
+            self.assertNotIn("COUNT", queries[0].upper())
+        self.assertEqual(seen, self.expected)
+
+        previous, _ = self.get_page(response.context["prev_cursor"])
+        self.assertEqual([i.pk for i in previous.context["invoices"]], self.expected[80:90])
+
+    def test_invalid_cursor_shows_first_page(self):
+        response, _ = self.get_page("no-es-un-cursor")
+        self.assertEqual([i.pk for i in response.context["invoices"]], self.expected[:10])
+
+    def test_page_latency_is_flat(self):
+        response, _ = self.get_page()
+        cursor, timings = response.context["next_cursor"], []
+        while cursor:
+            start = time.perf_counter()
+            response, _ = self.get_page(cursor)
+            timings.append(time.perf_counter() - start)
+            cursor = response.context["next_cursor"]
+        report(
+            f"Paginación por cursor: página 2 {timings[0] * 1000:.1f}ms, "
+            f"última página {timings[-1] * 1000:.1f}ms"
+        )
+        self.assertEqual(len(timings), 9)
+
+
+class SearchBackendTests(CommerceTestCase):
+    customers = 20000
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Customer.objects.bulk_create(
+            [
+                Customer(
+                    dni=f"{1000000000 + i}", first_name=f"NOMBRE{i}",
+                    last_name=f"APELLIDO{i % 997}", phone="0991234567",
+                )
+                for i in range(cls.customers)
+            ]
+        )
+        cls.other = create_customer("0923456789", "LUIS ANTONIO", "PERALTA")
+
+    @sqlite_only
+    def test_fts_matches_word_prefixes_and_ranks(self):
+        fields = ["first_name", "last_name", "dni"]
+        results = list(FtsSearchBackend().filter(Customer.objects.all(), fields, "per"))
+        self.assertEqual(results[0], self.customer)
+        self.assertIn(self.other, results)
+        self.assertTrue(all(hasattr(c, "search_rank") for c in results))
+
+    @sqlite_only
+    def test_fts_follows_foreign_keys(self):
+        Invoice.objects.create(customer=self.other, user=self.user)
+        fields = ["customer__first_name", "customer__last_name"]
+        results = FtsSearchBackend().filter(Invoice.objects.all(), fields, "antonio")
+        self.assertEqual([i.customer for i in results], [self.other])
+
+    def test_invoice_list_uses_backend(self):
+        self.client.force_login(self.user)
+        Invoice.objects.create(customer=self.other, user=self.user)
+        Invoice.objects.create(customer=self.customer, user=self.user)
+        response = self.client.get(reverse("commerce:invoice_list"), {"q": "peralta"})
+        self.assertEqual([i.customer for i in response.context["invoices"]], [self.other])
+
+    @sqlite_only
+    def test_fts_matches_word_prefixes_not_substrings(self):
+        # "ERALTA" está dentro de PERALTA pero ninguna palabra empieza así.
+        fields = ["first_name", "last_name", "dni"]
+        queryset = Customer.objects.all()
+        self.assertEqual(
+            list(IcontainsSearchBackend().filter(queryset, fields, "eralta")), [self.other]
+        )
+        self.assertEqual(list(FtsSearchBackend().filter(queryset, fields, "eralta")), [])
+
+    @sqlite_only
+    def test_building_the_queryset_runs_no_queries(self):
+        with self.assertNumQueries(0):
+            FtsSearchBackend().filter(Customer.objects.all(), ["first_name"], "per")
+
+    def plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        explain = "EXPLAIN QUERY PLAN" if connection.vendor == "sqlite" else "EXPLAIN"
+        with connection.cursor() as cursor:
+            cursor.execute(f"{explain} {sql}", params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    @sqlite_only
+    def test_fts_avoids_full_table_scan(self):
+        # icontains recorre toda la tabla con términos raros; FTS llega a las
+        # filas por el índice y solo ordena las que coinciden.
+        fields = ["first_name", "last_name", "dni"]
+        full_scan = re.compile(r"^SCAN core_customer\b")
+        for backend, scans in ((IcontainsSearchBackend(), True), (FtsSearchBackend(), False)):
+            with self.subTest(backend=type(backend).__name__):
+                plan = self.plan(backend.filter(Customer.objects.all(), fields, "NOMBRE12345")[:10])
+                self.assertEqual(any(full_scan.match(step) for step in plan), scans, plan)
+
+    @postgresql_only
+    def test_trigram_uses_gin_index_and_ranks(self):
+        fields = ["first_name", "last_name", "dni"]
+        backend = get_search_backend("commerce.search.TrigramSearchBackend")
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE core_customer")
+        queryset = backend.filter(Customer.objects.all(), fields, "NOMBRE12345")[:10]
+        plan = "\n".join(self.plan(queryset))
+        self.assertIn("core_customer_first_name_trgm", plan)
+        self.assertNotIn("Seq Scan on core_customer", plan)
+
+        results = list(backend.filter(Customer.objects.all(), fields, "per"))
+        self.assertEqual(results, [self.customer, self.other])
+        self.assertGreater(results[0].search_rank, results[1].search_rank)
+
+
+@benchmark
+class SearchBenchmarkTests(TestCase):
+    """Latencia del backend configurado frente a `icontains` con 1M de clientes."""
+
+    customers = 1_000_000
+
+    @classmethod
+    def setUpTestData(cls):
+        Customer.objects.bulk_create(
+            (
+                Customer(
+                    dni=f"{1000000000 + i}", first_name=f"NOMBRE{i}",
+                    last_name=f"APELLIDO{i % 997}", phone="0991234567",
+                )
+                for i in range(cls.customers)
+            ),
+            batch_size=10000,
+        )
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE core_customer")
+
+    def latency(self, backend, query, runs=3):
+        fields = ["first_name", "last_name", "dni"]
+        timings, results = [], None
+        for _ in range(runs):
+            start = time.perf_counter()
+            results = list(backend.filter(Customer.objects.all(), fields, query)[:20])
+            timings.append(time.perf_counter() - start)
+        return min(timings), results
+
+    def test_indexed_search_beats_icontains(self):
+        backend = get_search_backend()
+        for query in ("NOMBRE654321", "APELLIDO12"):
+            plain, plain_results = self.latency(IcontainsSearchBackend(), query)
+            indexed, indexed_results = self.latency(backend, query)
+            report(
+                f"Búsqueda '{query}' en {self.customers} clientes: icontains "
+                f"{plain * 1000:.1f}ms, {type(backend).__name__} {indexed * 1000:.1f}ms"
+            )
+            self.assertTrue(indexed_results)
+            self.assertTrue(plain_results)
+            if query == "NOMBRE654321":
+                # Término raro: icontains recorre toda la tabla.
+                self.assertEqual(indexed_results, plain_results)
+                self.assertLess(indexed, plain)
+
+
+class SalesRollupTests(CommerceTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def post(self, products, quantity=1, **kwargs):
+        invoice = self.new_invoice()
+        for name, value in kwargs.items():
+            setattr(invoice, name, value)
+        post_invoice(invoice, basket(products, quantity))
+        return invoice
+
+    def snapshot(self):
+        summaries = list(
+            DailySalesSummary.objects.exclude(invoices=0)
+            .order_by("date", "payment_method")
+            .values_list(
+                "date", "payment_method", "user_id", "invoices", "subtotal", "iva", "total"
+            )
+        )
+        products = list(
+            DailyProductSales.objects.exclude(quantity=0)
+            .order_by("date", "product_id")
+            .values_list("date", "product_id", "line", "quantity", "subtotal", "iva", "cost")
+        )
+        return summaries, products
+
+    def test_invoices_are_added_incrementally(self):
+        self.post(self.products[:2], quantity=2)
+        self.post(self.products[1:3], payment_method=InvoicePaymentMethod.CARD)
+        cash = DailySalesSummary.objects.get(payment_method=InvoicePaymentMethod.CASH)
+        self.assertEqual(
+            (cash.invoices, cash.subtotal, cash.total), (1, Decimal("4.00"), Decimal("4.60"))
+        )
+        shared = DailyProductSales.objects.get(product=self.products[1])
+        self.assertEqual(shared.quantity, Decimal("3.00"))
+        self.assertEqual(shared.cost, Decimal("3.00"))
+
+    def test_annul_and_delete_subtract(self):
+        first = self.post(self.products[:2])
+        second = self.post(self.products[:1])
+        self.client.post(reverse("commerce:invoice_annul", args=[first.pk]))
+        self.client.post(reverse("commerce:invoice_annul", args=[first.pk]))  # no se repite
+        summary = DailySalesSummary.objects.get()
+        self.assertEqual((summary.invoices, summary.subtotal), (1, Decimal("1.00")))
+
+        self.client.post(reverse("commerce:invoice_delete", args=[second.pk]))
+        self.client.post(reverse("commerce:invoice_delete", args=[first.pk]))  # ya anulada
+        summary.refresh_from_db()
+        self.assertEqual((summary.invoices, summary.total), (0, Decimal("0.00")))
+        self.assertEqual(self.snapshot()[1], [])
+
+    def test_rebuild_matches_incremental(self):
+        yesterday = timezone.now() - timedelta(days=1)
+        self.post(self.products[:5], quantity=2, issue_date=yesterday)
+        self.post(self.products[3:8], payment_method=InvoicePaymentMethod.CARD)
+        annulled = self.post(self.products[:1])
+        self.client.post(reverse("commerce:invoice_annul", args=[annulled.pk]))
+        incremental = self.snapshot()
+
+        DailySalesSummary.objects.all().update(total=0)
+        DailyProductSales.objects.all().delete()
+        call_command("rebuild_sales_rollups", workers=1, chunk_days=1, stdout=StringIO())
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_report_reads_rollups(self):
+        timings = {}
+        for i in range(200):
+            self.post(self.products[i % 6 * 10:][:10])
+        start = time.perf_counter()
+        scanned = InvoiceDetail.objects.filter(invoice__state=True).aggregate(total=Sum("subtotal"))
+        timings["detalle"] = f"{(time.perf_counter() - start) * 1000:.2f}ms"
+        start = time.perf_counter()
+        rolled = DailyProductSales.objects.aggregate(total=Sum("subtotal"))
+        timings["resumen"] = f"{(time.perf_counter() - start) * 1000:.2f}ms"
+        self.assertEqual(round(scanned["total"], 2), round(rolled["total"], 2))
+        report(
+            f"Ventas del día: {InvoiceDetail.objects.count()} líneas de detalle vs "
+            f"{DailyProductSales.objects.count()} filas de resumen: {timings}"
+        )
+
+
+class InvoiceDetailModalTests(CommerceTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_cold_query_count_is_bounded(self):
+        counts = {}
+        for size in (1, 60):
+            invoice = self.new_invoice()
+            post_invoice(invoice, basket(self.products[:size]))
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(reverse("commerce:invoice_detail", args=[invoice.pk]))
+            self.assertContains(response, self.products[size - 1].description)
+            counts[size] = len(ctx.captured_queries)
+        self.assertEqual(counts[1], counts[60], counts)
+
+    def test_warm_cache_and_invalidation(self):
+        invoice = self.new_invoice()
+        post_invoice(invoice, basket(self.products[:30]))
+        url = reverse("commerce:invoice_detail", args=[invoice.pk])
+
+        start = time.perf_counter()
+        self.client.get(url)
+        cold = time.perf_counter() - start
+        with self.assertNumQueries(4):  # sesión, usuario, documento y catálogo
+            self.client.get(url)
+        start = time.perf_counter()
+        for _ in range(20):
+            self.client.get(url)
+        warm = (time.perf_counter() - start) / 20
+        report(
+            f"Modal de factura (30 líneas): frío {cold * 1000:.2f}ms, "
+            f"caliente {warm * 1000:.2f}ms"
+        )
+
+        annul_invoice(invoice)
+        self.assertContains(self.client.get(url), "Anulado")
+        self.customer.last_name = "RENOMBRADO"
+        self.customer.save()
+        self.assertContains(self.client.get(url), "RENOMBRADO")
+        missing = self.client.get(reverse("commerce:invoice_detail", args=[0]))
+        self.assertEqual(missing.status_code, 404)
+
+
+class DocumentLoaderTests(CommerceTestCase):
+    def test_fixed_queries_per_document(self):
+        for lines in (1, 10, 60):
+            with self.subTest(lines=lines):
+                invoice = self.new_invoice()
+                post_invoice(invoice, basket(self.products[:lines]))
+                with self.assertNumQueries(2):  # cabecera + cliente, líneas + productos
+                    document = invoice_loader.get(invoice.pk)
+                self.assertEqual(len(document.lines), lines)
+                self.assertEqual(document.customer_name, "PEREZ ANA")
+                with self.assertNumQueries(0):
+                    html = render_to_string("invoice/print.html", {"invoice": document})
+                self.assertIn(self.products[lines - 1].description, html)
+
+    def test_batch_and_chunked_loading(self):
+        for size in (1, 10, 60):
+            post_invoice(self.new_invoice(), basket(self.products[:size]))
+        with self.assertNumQueries(2):
+            documents = invoice_loader.load(Invoice.objects.order_by("id"))
+        self.assertEqual([len(d.lines) for d in documents], [1, 10, 60])
+
+        loader = InvoiceLoader()
+        loader.chunk_size = 2
+        with self.assertNumQueries(5):  # ids + 2 bloques de (cabeceras, líneas)
+            ids = [d.pk for d in loader.iterate(Invoice.objects.order_by("-id"))]
+        self.assertEqual(ids, [d.pk for d in reversed(documents)])
+
+    def test_detail_export(self):
+        post_invoice(self.new_invoice(), basket(self.products[:3]))
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("commerce:invoice_export"), {"detail": 1})
+        rows = list(csv.reader(b"".join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(rows[0][:3], ["Factura", "Numero", "Fecha Emision"])
+        self.assertEqual([row[6] for row in rows[1:]], ["Producto 0", "Producto 1", "Producto 2"])
+
+
+
+class InvoiceNumberTests(CommerceTestCase):
+    def post(self, **kwargs):
+        invoice = self.new_invoice()
+        for name, value in kwargs.items():
+            setattr(invoice, name, value)
+        post_invoice(invoice, basket(self.products[:1]))
+        return invoice
+
+    def test_numbers_are_sequential_per_point_of_sale(self):
+        first, second = self.post(), self.post()
+        other = self.post(establishment="002", emission_point="001")
+        self.assertEqual(first.number, "001-001-000000001")
+        self.assertEqual(second.number, "001-001-000000002")
+        self.assertEqual(other.number, "002-001-000000001")
+        second.refresh_from_db()
+        self.assertEqual(str(second), f"001-001-000000002 - {self.customer}")
+
+    def test_rollback_returns_the_number(self):
+        self.post()
+        with self.assertRaises(ValueError):
+            with transaction.atomic():
+                self.post()
+                raise ValueError("falla después de numerar")
+        with self.assertRaises(ValueError):  # sin stock: falla antes de numerar
+            post_invoice(self.new_invoice(), basket(self.products[:1], quantity=1000))
+        self.assertEqual(self.post().number, "001-001-000000002")
+        self.assertEqual(
+            list(Invoice.objects.order_by("sequence").values_list("sequence", flat=True)), [1, 2]
+        )
+
+    def test_terminal_keeps_its_own_point_of_sale(self):
+        self.client.force_login(self.user)
+        url = reverse("commerce:invoice_create")
+        data = invoice_form_data(self.customer, self.products[:1])
+        response = self.client.post(url, {**data, "establishment": "002", "emission_point": "003"})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.cookies[POS_COOKIE].value, "002-003")
+
+        # La misma terminal sigue en su serie; otra (sin cookie) usa la configuración.
+        initial = self.client.get(url).context["form"].initial
+        self.assertEqual((initial["establishment"], initial["emission_point"]), ("002", "003"))
+        self.client.post(url, data)
+        other = Client()
+        other.force_login(self.user)
+        other.post(url, data)
+        self.assertEqual(
+            sorted(invoice.number for invoice in Invoice.objects.all()),
+            ["001-001-000000001", "002-003-000000001", "002-003-000000002"],
+        )
+
+        response = self.client.post(url, {**data, "emission_point": "3a"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("emission_point", response.json()["error"])
+
+    def test_number_is_shown_in_documents(self):
+        invoice = self.post()
+        self.assertEqual(invoice_loader.get(invoice.pk).number, "001-001-000000001")
+
+
+class ConcurrentInvoiceNumberTests(TransactionTestCase):
+    threads = 4
+    invoices = 10
+
+    def test_parallel_invoices_get_gap_free_numbers(self):
+        catalog_cache.clear()
+        with self.assertRaises(TransactionManagementError):
+            next_number("001", "001")  # fuera de una transacción habría huecos
+        user = User.objects.create_user("cajero", password="secret")
+        customer = create_customer()
+        products = create_catalog(user, 5, stock=10000)
+        points = ("001", "002")
+        retries = []
+        lock = threading.Lock()
+
+        def sell(point):
+            try:
+                for n in range(self.invoices):
+                    while True:
+                        try:
+                            with transaction.atomic():
+                                invoice = Invoice(
+                                    customer=customer, user=user, emission_point=point
+                                )
+                                post_invoice(invoice, basket(products[n % 5 :][:2]))
+                                if n % 5 == 4:
+                                    # Cada quinta venta se revierte tras numerarse.
+                                    raise ValueError("rollback")
+                        except ValueError:
+                            pass
+                        except OperationalError:
+                            # SQLite responde "database is locked" bajo
+                            # escritura concurrente; se reintenta.
+                            with lock:
+                                retries.append(1)
+                            time.sleep(0.001)
+                            continue
+                        break
+            finally:
+                close_old_connections()
+                connection.close()
+
+        workers = [
+            threading.Thread(target=sell, args=(points[i % 2],)) for i in range(self.threads)
+        ]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+
+        committed = self.threads * self.invoices * 4 // 5
+        for point in points:
+            numbers = list(
+                Invoice.objects.filter(emission_point=point)
+                .order_by("sequence")
+                .values_list("sequence", flat=True)
+            )
+            self.assertEqual(numbers, list(range(1, committed // 2 + 1)))
+            self.assertEqual(
+                InvoiceSequence.objects.get(emission_point=point).last_number, committed // 2
+            )
+        report(
+            f"Numeración concurrente: {committed} facturas en {elapsed:.3f}s "
+            f"({committed / elapsed:.0f} facturas/s, {self.threads} hilos, "
+            f"{len(points)} puntos de emisión, {len(retries)} reintentos)"
+        )
+
+
+
+class InvoiceStockRestoreTests(CommerceTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def post(self, products, quantity=1):
+        invoice = self.new_invoice()
+        post_invoice(invoice, basket(products, quantity))
+        return invoice
+
+    def stock(self, product):
+        product.refresh_from_db()
+        return product.stock
+
+    def test_annul_restores_stock_once(self):
+        invoice = self.post(self.products[:2], quantity=3)
+        self.assertEqual(self.stock(self.products[0]), 97)
+        with self.assertNumQueries(15):  # fijo: bloqueo, estado, stock, libro, resúmenes...
+            self.assertTrue(annul_invoice(invoice))
+        self.assertFalse(annul_invoice(invoice))
+        response = self.client.post(reverse("commerce:invoice_annul", args=[invoice.pk]))
+        self.assertEqual(response.json()["msg"], "La factura ya estaba anulada.")
+        self.assertEqual([self.stock(p) for p in self.products[:2]], [100, 100])
+
+        delete_invoice(invoice)  # ya anulada: el stock no se devuelve otra vez
+        self.assertEqual(self.stock(self.products[0]), 100)
+
+    def test_delete_active_invoice_restores_stock(self):
+        invoice = self.post(self.products[:1], quantity=5)
+        self.client.post(reverse("commerce:invoice_delete", args=[invoice.pk]))
+        self.assertFalse(Invoice.objects.filter(pk=invoice.pk).exists())
+        self.assertEqual(self.stock(self.products[0]), 100)
+
+    def test_bulk_annul_has_bounded_queries(self):
+        counts = {}
+        for size in (5, 100):
+            invoices = [self.post(self.products[i % 60 : i % 60 + 3]) for i in range(size)]
+            ids = [invoice.pk for invoice in invoices]
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(annul_invoices(ids), ids)
+            counts[size] = ledger_free(ctx)
+        self.assertEqual(counts[5], counts[100])
+        self.assertEqual({self.stock(p) for p in self.products}, {Decimal("100.00")})
+        summary = DailySalesSummary.objects.get()
+        self.assertEqual((summary.invoices, summary.total), (0, Decimal("0.00")))
+        self.assertFalse(DailyProductSales.objects.exclude(quantity=0).exists())
+
+    def test_bulk_annul_view_skips_annulled(self):
+        first, second = self.post(self.products[:1]), self.post(self.products[:1])
+        annul_invoice(first)
+        response = self.client.post(
+            reverse("commerce:invoice_bulk_annul"), {"ids": [first.pk, second.pk, 999999]}
+        )
+        data = response.json()
+        self.assertEqual(data["annulled"], [second.pk])
+        self.assertEqual(data["skipped"], sorted([first.pk, 999999]))
+        self.assertEqual(self.stock(self.products[0]), 100)
+
+        response = self.client.post(reverse("commerce:invoice_bulk_annul"), {"ids": ["x"]})
+        self.assertEqual(response.status_code, 400)
+
+
+
+class InvoiceUpdateTests(CommerceTestCase):
+    def post(self, products, quantity=1):
+        invoice = self.new_invoice()
+        post_invoice(invoice, basket(products, quantity))
+        return invoice
+
+    def stock(self, product):
+        product.refresh_from_db()
+        return product.stock
+
+    def test_moves_only_the_net_stock_difference(self):
+        invoice = self.post(self.products[:3], quantity=2)
+        kept = invoice.detail.get(product=self.products[2]).pk
+        data = basket(self.products[:1], 5) + basket(self.products[2:4], 2)
+        data[-1]["quantify"] = 1
+        update_invoice(invoice, data)
+
+        self.assertEqual(
+            [self.stock(p) for p in self.products[:4]], [95, 100, 98, 99]
+        )
+        self.assertEqual(invoice.detail.count(), 3)
+        self.assertTrue(invoice.detail.filter(pk=kept).exists())
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.subtotal, Decimal("8.00"))
+        summary = DailySalesSummary.objects.get()
+        self.assertEqual((summary.invoices, summary.subtotal), (1, Decimal("8.00")))
+        sold = dict(
+            DailyProductSales.objects.exclude(quantity=0).values_list("product_id", "quantity")
+        )
+        self.assertEqual(
+            sold,
+            {self.products[0].pk: 5, self.products[2].pk: 2, self.products[3].pk: 1},
+        )
+
+    def test_insufficient_stock_changes_nothing(self):
+        invoice = self.post(self.products[:1], quantity=2)
+        with self.assertRaises(ValueError):
+            update_invoice(invoice, basket(self.products[:1], 103))
+        self.assertEqual(self.stock(self.products[0]), 98)
+        self.assertEqual(invoice.detail.get().quantity, 2)
+
+    def test_editing_one_line_has_flat_query_count(self):
+        counts = {}
+        for lines in (3, 50):
+            invoice = self.post(self.products[:lines])
+            data = basket(self.products[:lines])
+            data[0]["quantify"] = 2
+            with CaptureQueriesContext(connection) as ctx:
+                diff = update_invoice(invoice, data)
+            counts[lines] = len(ctx.captured_queries)
+            self.assertEqual((len(diff.updated), diff.created, diff.removed), (1, [], []))
+        self.assertEqual(counts[3], counts[50])
+
+    def test_update_view(self):
+        self.client.force_login(self.user)
+        invoice = self.post(self.products[:2])
+        data = invoice_form_data(self.customer, self.products[:1])
+        response = self.client.post(reverse("commerce:invoice_update", args=[invoice.pk]), data)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual([self.stock(p) for p in self.products[:2]], [99, 100])
+
+        annul_invoice(invoice)
+        response = self.client.post(reverse("commerce:invoice_update", args=[invoice.pk]), data)
+        self.assertEqual(response.status_code, 400)
+
+
+class InventoryLedgerTests(CommerceTestCase):
+    def post(self, products, quantity=1):
+        invoice = self.new_invoice()
+        post_invoice(invoice, basket(products, quantity))
+        return invoice
+
+    def assertLedgerMatchesStock(self, products, base=100):
+        # El catálogo de prueba se creó sin saldo inicial en el libro.
+        ledger = dict(
+            InventoryMovement.objects.values_list("product_id")
+            .annotate(total=Sum("quantity"))
+            .order_by()
+        )
+        for product in products:
+            product.refresh_from_db()
+            self.assertEqual(base + ledger.get(product.pk, 0), product.stock, product)
+
+    def test_sales_edits_and_annulments_are_recorded(self):
+        first = self.post(self.products[:2], quantity=3)
+        second = self.post(self.products[1:3])
+        update_invoice(first, basket(self.products[:1], 1) + basket(self.products[3:4], 2))
+        annul_invoices([second.pk])
+        delete_invoice(first)
+
+        self.assertLedgerMatchesStock(self.products[:4])
+        kinds = dict(
+            InventoryMovement.objects.values_list("kind")
+            .annotate(total=Sum("quantity"))
+            .order_by()
+        )
+        self.assertEqual(kinds, {MovementKind.SALE: -5, MovementKind.SALE_ANNUL: 5})
+        self.assertEqual(
+            set(InventoryMovement.objects.values_list("document_id", flat=True)),
+            {first.pk, second.pk},
+        )
+
+    def test_backfill_command_is_chunked_and_resumable(self):
+        self.post(self.products[:2], quantity=2)
+        annul_invoice(self.post(self.products[1:3]))
+        self.post(self.products[4:5])
+        InventoryMovement.objects.all().delete()  # datos anteriores al libro
+        StockSnapshot.objects.create(product=self.products[0], date=timezone.localdate(), stock=1)
+
+        out = StringIO()
+        call_command("backfill_inventory", "--source", "invoice", "--chunk-size", "2", stdout=out)
+        self.assertIn("invoice: 2 documentos", out.getvalue())
+        self.assertIn("invoice: 3 documentos, 7 movimientos.", out.getvalue())
+        self.assertEqual(
+            InventoryMovement.objects.filter(kind=MovementKind.SALE_ANNUL).count(), 2
+        )
+        # Saldos iniciales: todo el stock actual queda en el libro.
+        self.assertLedgerMatchesStock(self.products[:5], base=0)
+        self.assertFalse(StockSnapshot.objects.exists())
+
+        total = InventoryMovement.objects.count()
+        call_command("backfill_inventory", "--source", "invoice", stdout=StringIO())
+        self.assertEqual(InventoryMovement.objects.count(), total)
+
+
+def invoice_form_data(customer, products):
+    return {
+        "customer": customer.pk,
+        "payment_method": InvoicePaymentMethod.CASH,
+        "issue_date": timezone.localdate().isoformat(),
+        "subtotal": "0",
+        "iva": "0",
+        "total": "0",
+        "detail": json.dumps(basket(products)),
+    }
+
+
+class IdempotentInvoiceTests(CommerceTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+        self.url = reverse("commerce:invoice_create")
+        self.data = invoice_form_data(self.customer, self.products[:2])
+
+    def test_replay_returns_stored_response_with_one_lookup(self):
+        first = self.client.post(self.url, self.data, HTTP_IDEMPOTENCY_KEY="venta-1").json()
+        with CaptureQueriesContext(connection) as ctx:
+            replay = self.client.post(self.url, self.data, HTTP_IDEMPOTENCY_KEY="venta-1").json()
+        self.assertEqual(replay, first)
+        self.assertEqual(Invoice.objects.count(), 1)
+        self.products[0].refresh_from_db()
+        self.assertEqual(self.products[0].stock, 99)
+        tables = [q["sql"] for q in ctx.captured_queries if "auth_user" not in q["sql"]
+                  and "django_session" not in q["sql"]]
+        self.assertEqual(len(tables), 1)
+        self.assertIn("core_idempotencykey", tables[0])
+
+        self.client.post(self.url, self.data, HTTP_IDEMPOTENCY_KEY="venta-2")
+        self.client.post(self.url, self.data)  # sin clave: se registra siempre
+        self.assertEqual(Invoice.objects.count(), 3)
+
+    def test_failed_attempt_does_not_consume_the_key(self):
+        data = dict(self.data, detail=json.dumps(basket(self.products[:1], quantity=1000)))
+        response = self.client.post(self.url, data, HTTP_IDEMPOTENCY_KEY="venta-1")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        response = self.client.post(self.url, self.data, HTTP_IDEMPOTENCY_KEY="venta-1")
+        self.assertEqual(response.json()["id"], Invoice.objects.get().pk)
+
+    def test_expired_keys_are_purged_and_reusable(self):
+        self.client.post(self.url, self.data, HTTP_IDEMPOTENCY_KEY="venta-1")
+        IdempotencyKey.objects.update(created=timezone.now() - timedelta(days=2))
+        self.client.post(self.url, self.data, HTTP_IDEMPOTENCY_KEY="venta-1")
+        self.assertEqual(Invoice.objects.count(), 2)
+        IdempotencyKey.objects.update(created=timezone.now() - timedelta(days=2))
+        out = StringIO()
+        call_command("purge_idempotency_keys", stdout=out)
+        self.assertIn("1 claves", out.getvalue())
+
+
+class ConcurrentIdempotentInvoiceTests(TransactionTestCase):
+    threads = 6
+
+    def test_concurrent_duplicates_create_one_invoice(self):
+        catalog_cache.clear()
+        user = User.objects.create_user("cajero", password="secret")
+        customer = create_customer()
+        products = create_catalog(user, 2)
+        data = invoice_form_data(customer, products)
+        url = reverse("commerce:invoice_create")
+        responses = []
+        lock = threading.Lock()
+        barrier = threading.Barrier(self.threads)
+
+        clients = []
+        for _ in range(self.threads):
+            clients.append(self.client_class())
+            clients[-1].force_login(user)
+
+        def submit(client):
+            try:
+                barrier.wait(timeout=10)
+                for _ in range(1000):
+                    # SQLite responde "database is locked" bajo escritura
+                    # concurrente; el POS reintentaría con la misma clave.
+                    try:
+                        response = client.post(url, data, HTTP_IDEMPOTENCY_KEY="venta-1")
+                    except OperationalError:
+                        response = None
+                    if response is None or "locked" in response.json().get("error", ""):
+                        time.sleep(0.005)
+                        continue
+                    break
+                with lock:
+                    responses.append(response.json())
+            finally:
+                close_old_connections()
+                connection.close()
+
+        workers = [threading.Thread(target=submit, args=(client,)) for client in clients]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        invoice = Invoice.objects.get()
+        self.assertEqual([r.get("id") for r in responses], [invoice.pk] * self.threads)
+        self.assertEqual(
+            Product.objects.get(pk=products[0].pk).stock, Decimal("99.00")
+        )
+
+
+class ImportInvoicesTests(CommerceTestCase):
+    def write_csv(self, rows):
+        handle = tempfile.NamedTemporaryFile(
+            "w", suffix=".csv", newline="", delete=False, encoding="utf-8"
+        )
+        with handle:
+            writer = csv.writer(handle)
+            writer.writerow(
+                ["invoice", "issue_date", "dni", "payment_method", "product", "quantity", "price"]
+            )
+            writer.writerows(rows)
+        self.addCleanup(os.remove, handle.name)
+        return handle.name
+
+    def rows(self, count, lines=2, start=0):
+        return [
+            [f"F{n}", "2024-03-05", self.customer.dni, "EF", self.products[i].pk, "1", "1.00"]
+            for n in range(start, start + count)
+            for i in range(lines)
+        ]
+
+    def call(self, path, **options):
+        out, err = StringIO(), StringIO()
+        call_command(
+            "import_invoices", path, user=self.user.username, stdout=out, stderr=err, **options
+        )
+        return out.getvalue(), err.getvalue()
+
+    def test_import_creates_invoices_stock_and_rollups(self):
+        self.call(self.write_csv(self.rows(5)), chunk_size=2)
+        self.assertEqual(Invoice.objects.count(), 5)
+        self.assertEqual(InvoiceDetail.objects.count(), 10)
+        invoice = Invoice.objects.first()
+        self.assertEqual((invoice.subtotal, invoice.total), (Decimal("2.00"), Decimal("2.30")))
+        self.products[0].refresh_from_db()
+        self.assertEqual(self.products[0].stock, 95)
+        summary = DailySalesSummary.objects.get()
+        self.assertEqual((summary.invoices, summary.total), (5, Decimal("11.50")))
+        self.assertEqual(ImportCheckpoint.objects.get().position, 5)
+
+    def test_resume_skips_imported_records(self):
+        path = self.write_csv(self.rows(3))
+        ImportCheckpoint.objects.create(name=os.path.basename(path), position=2, invoices=2)
+        self.call(path, skip_rollups=True)
+        self.assertEqual(Invoice.objects.count(), 1)
+        checkpoint = ImportCheckpoint.objects.get()
+        self.assertEqual((checkpoint.position, checkpoint.invoices), (3, 3))
+
+        self.call(path, skip_rollups=True)  # ya terminado: no se repite
+        self.assertEqual(Invoice.objects.count(), 1)
+
+    def test_ledger_uses_issue_dates(self):
+        rows = [
+            [f"F{n}", day, self.customer.dni, "EF", self.products[0].pk, "1", "1.00"]
+            for n, day in enumerate(["2024-03-05", "2024-03-10"])
+        ]
+        self.call(self.write_csv(rows), skip_rollups=True)
+        pk = self.products[0].pk
+        self.assertEqual(
+            [ledger.stock_at(date(2024, 3, day), [pk])[pk] for day in (4, 7, 10)],
+            [0, -1, -2],
+        )
+
+    def test_legacy_numbers_are_kept_and_the_rest_are_numbered(self):
+        post_invoice(self.new_invoice(), basket(self.products[:1]))  # 001-001-000000001
+        numbers = ("002-001-000000120", "F1", "F2", "001-001-000000001", "002-001-000000007")
+        rows = [
+            [number, "2024-03-05", self.customer.dni, "EF", self.products[0].pk, "1", "1.00"]
+            for number in numbers
+        ]
+        _, err = self.call(self.write_csv(rows), skip_rollups=True, chunk_size=2)
+        self.assertEqual(
+            sorted(invoice.number for invoice in Invoice.objects.all()),
+            [
+                "001-001-000000001", "001-001-000000002", "001-001-000000003",
+                "002-001-000000007", "002-001-000000120",
+            ],
+        )
+        self.assertIn("001-001-000000001: el número ya está registrado", err)
+        with transaction.atomic():
+            # Las ventas nuevas siguen después de los números importados.
+            self.assertEqual(next_number("002", "001"), 121)
+            self.assertEqual(next_number("001", "001"), 4)
+
+    def test_invalid_records_are_reported(self):
+        rows = self.rows(1) + [
+            ["F1", "2024-03-05", "0000000000", "EF", self.products[0].pk, "1", "1.00"],
+            ["F2", "2024-03-05", self.customer.dni, "EF", 999999, "1", "1.00"],
+            ["F3", "ayer", self.customer.dni, "EF", self.products[0].pk, "1", "1.00"],
+        ]
+        _, err = self.call(self.write_csv(rows), skip_rollups=True)
+        self.assertEqual(Invoice.objects.count(), 1)
+        self.assertIn("Cliente no encontrado", err)
+        self.assertIn("Producto no encontrado: 999999", err)
+        self.assertIn("Fecha inválida", err)
+
+    def test_import_throughput(self):
+        path = self.write_csv(self.rows(2000, lines=5))
+        started = time.perf_counter()
+        self.call(path, chunk_size=500, skip_rollups=True)
+        elapsed = time.perf_counter() - started
+        self.assertEqual(InvoiceDetail.objects.count(), 10000)
+        report(
+            f"import_invoices: 2000 facturas / 10000 líneas en {elapsed:.2f}s "
+            f"({10000 / elapsed:.0f} filas/s)"
+        )
@@ -1,5 +1,6 @@
 from django.urls import path
 from . import views
+from .batch_print import BatchPrintProgressView
 
 app_name = "commerce"
 
@@ -7,6 +8,7 @@ app_name = "commerce"
 urlpatterns = [
     # URLs para Facturas (Invoices)
     path("invoice/list/", views.InvoiceListView.as_view(), name="invoice_list"),
+    path("invoice/export/", views.InvoiceExportView.as_view(), name="invoice_export"),
     path("invoice/create/", views.InvoiceCreateView.as_view(), name="invoice_create"),
     path(
         "invoice/update/<int:pk>/",
@@ -23,6 +25,11 @@ urlpatterns = [
         views.InvoiceAnnulView.as_view(),
         name="invoice_annul",
     ),
+    path(
+        "invoice/annul/bulk/",
+        views.InvoiceBulkAnnulView.as_view(),
+        name="invoice_bulk_annul",
+    ),
     path(
         "invoice/detail/<int:pk>/",
         views.InvoiceDetailView.as_view(),
@@ -33,4 +40,19 @@ urlpatterns = [
         views.InvoicePrintView.as_view(),
         name="invoice_print",
     ),
+    path(
+        "invoice/print/batch/",
+        views.InvoiceBatchPrintView.as_view(),
+        name="invoice_batch_print",
+    ),
+    path(
+        "print/batch/progress/<str:job>/",
+        BatchPrintProgressView.as_view(),
+        name="batch_print_progress",
+    ),
+    path(
+        "invoice/print/stats/",
+        views.PdfCacheStatsView.as_view(),
+        name="pdf_cache_stats",
+    ),
 ]
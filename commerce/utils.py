@@ -4,17 +4,30 @@ from django.template.loader import get_template
 from xhtml2pdf import pisa
 
 
-def render_to_pdf(template_src, context_dict={}):
+def render_html_to_pdf(html):
     """
-    Renderiza una plantilla de Django a un objeto HttpResponse con el tipo de contenido PDF.
+    Convierte HTML ya renderizado a bytes PDF. Devuelve None si pisa falla.
     """
-    template = get_template(template_src)
-    html = template.render(context_dict)
     result = BytesIO()
-
-    # Crear el PDF
     pdf = pisa.pisaDocument(BytesIO(html.encode("UTF-8")), result)
+    if pdf.err:
+        return None
+    return result.getvalue()
+
+
+def render_to_pdf_bytes(template_src, context_dict={}):
+    """
+    Renderiza una plantilla de Django y devuelve los bytes del PDF (o None).
+    """
+    template = get_template(template_src)
+    return render_html_to_pdf(template.render(context_dict))
 
-    if not pdf.err:
-        return HttpResponse(result.getvalue(), content_type="application/pdf")
+
+def render_to_pdf(template_src, context_dict={}):
+    """
+    Renderiza una plantilla de Django a un objeto HttpResponse con el tipo de contenido PDF.
+    """
+    pdf = render_to_pdf_bytes(template_src, context_dict)
+    if pdf is not None:
+        return HttpResponse(pdf, content_type="application/pdf")
     return None
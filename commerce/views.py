@@ -1,10 +1,9 @@
 import json
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db import transaction
 from django.urls import reverse_lazy
 from django.db.models import Q
-from django.template.loader import render_to_string
 from django.http import JsonResponse
+from django.template.loader import render_to_string
 from django.views.generic import (
     ListView,
     CreateView,
@@ -13,68 +12,115 @@ from django.views.generic import (
     DetailView,
 )
 
-from core.mixins import TitleContextMixin
-from .models import Invoice, InvoiceDetail
-from core.models import Product
-from .forms import InvoiceForm
-from .utils import render_to_pdf
-
-from core.mixins import TitleContextMixin
+from core.mixins import AsyncLoginRequiredMixin, IdempotentCreateMixin, TitleContextMixin
 from .models import Invoice, InvoiceDetail
-from core.models import Product
 from .forms import InvoiceForm
-from .utils import render_to_pdf
+from .batch_print import BatchPrintView
+from .documents import aload_document_or_404, invoice_loader, load_document_or_404
+from .exports import ExportView
+from .pdf_cache import cached_pdf_response, pdf_cache
+from .sequences import point_of_sale, remember_point_of_sale
+from .services import (
+    annul_invoice, annul_invoices, delete_invoice, post_invoice, update_invoice,
+)
 
-from commerce.commerce_mixins import QueryFilterMixin
+from commerce.commerce_mixins import (
+    CachedFragmentMixin,
+    KeysetPaginationMixin,
+    QueryFilterMixin,
+)
+from core.catalog import catalog_cache
 
-class InvoiceListView(LoginRequiredMixin, TitleContextMixin, QueryFilterMixin, ListView):
+class InvoiceListView(
+    LoginRequiredMixin, TitleContextMixin, QueryFilterMixin, KeysetPaginationMixin, ListView
+):
     model = Invoice
     template_name = "invoice/list.html"
     context_object_name = "invoices"
     paginate_by = 10
     title2 = "Listado de Facturas"
     search_fields = ["customer__first_name", "customer__last_name"]
+    keyset_ordering = ("-issue_date", "id")
+
+
 
+class InvoiceExportView(ExportView):
+    model = Invoice
+    search_fields = InvoiceListView.search_fields
+    filename = "facturas"
+    export_fields = [
+        ("ID", "id"),
+        ("Establecimiento", "establishment"),
+        ("Punto de Emision", "emission_point"),
+        ("Secuencial", "sequence"),
+        ("Fecha Emision", "issue_date"),
+        ("Apellidos", "customer__last_name"),
+        ("Nombres", "customer__first_name"),
+        ("Dni", "customer__dni"),
+        ("Metodo de Pago", "payment_method"),
+        ("Subtotal", "subtotal"),
+        ("Iva", "iva"),
+        ("Total", "total"),
+        ("Activo", "state"),
+    ]
+    loader = invoice_loader
+    detail_export_fields = [
+        ("Factura", "id"),
+        ("Numero", "number"),
+        ("Fecha Emision", "issue_date"),
+        ("Cliente", "customer_name"),
+        ("Dni", "customer.dni"),
+        ("Codigo", "line.product_id"),
+        ("Producto", "line.description"),
+        ("Cantidad", "line.quantity"),
+        ("Precio", "line.price"),
+        ("Iva", "line.iva"),
+        ("Subtotal", "line.subtotal"),
+    ]
 
 
-class InvoiceCreateView(LoginRequiredMixin, TitleContextMixin, CreateView):
+class InvoiceCreateView(
+    LoginRequiredMixin, IdempotentCreateMixin, TitleContextMixin, CreateView
+):
     model = Invoice
     form_class = InvoiceForm
     template_name = "invoice/form.html"
     success_url = reverse_lazy("commerce:invoice_list")
     title2 = "Nueva Factura"
+    idempotency_scope = "invoice"
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context["products"] = Product.active_products.all()
-        return context
+    def get_initial(self):
+        # El punto de emisión por defecto es el último usado en esta terminal.
+        initial = super().get_initial()
+        initial["establishment"], initial["emission_point"] = point_of_sale(
+            request=self.request
+        )
+        return initial
 
     def form_valid(self, form):
+        invoice = form.save(commit=False)
+        invoice.establishment, invoice.emission_point = point_of_sale(invoice, self.request)
+
+        def register():
+            invoice.user = self.request.user
+
+            detail_data = json.loads(self.request.POST.get("detail", "[]"))
+            post_invoice(invoice, detail_data)
+
+            return invoice.pk, {
+                "msg": "Factura guardada con éxito.",
+                "url": str(self.success_url),
+                "id": invoice.pk,
+            }
+
         try:
-            with transaction.atomic():
-                invoice = form.save(commit=False)
-                invoice.user = self.request.user
-                invoice.save()
-
-                detail_data = json.loads(self.request.POST.get("detail", "[]"))
-                for item in detail_data:
-                    product = Product.objects.get(pk=item["id"])
-                    InvoiceDetail.objects.create(
-                        invoice=invoice,
-                        product=product,
-                        quantity=item["quantify"],
-                        price=item["price"],
-                        cost=product.cost,
-                        subtotal=item["sub"],
-                        iva=item["iva"],
-                    )
-                    product.reduce_stock(item["quantify"])
-
-                return JsonResponse(
-                    {"msg": "Factura guardada con éxito.", "url": self.success_url}
-                )
+            response = self.register_once(register)
         except Exception as e:
             return JsonResponse({"error": str(e)}, status=400)
+        return remember_point_of_sale(response, invoice)
+
+    def form_invalid(self, form):
+        return JsonResponse({"error": form.errors}, status=400)
 
 
 class InvoiceUpdateView(LoginRequiredMixin, TitleContextMixin, UpdateView):
@@ -86,7 +132,6 @@ class InvoiceUpdateView(LoginRequiredMixin, TitleContextMixin, UpdateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context["products"] = Product.active_products.all()
         details = InvoiceDetail.objects.filter(invoice=self.object)
         context["detail_sales"] = json.dumps(
             [
@@ -104,13 +149,15 @@ class InvoiceUpdateView(LoginRequiredMixin, TitleContextMixin, UpdateView):
         return context
 
     def form_valid(self, form):
-        self.object = form.save()
-        # Aquí podrías procesar el detalle enviado desde JS
-        import json
-        detail_data = json.loads(self.request.POST.get("detail", "[]"))
-        # Guardar detalle_data en InvoiceDetail...
-        # Luego devolver JSON
-        return JsonResponse({"msg": "Factura actualizada con éxito"})
+        try:
+            detail_data = json.loads(self.request.POST.get("detail", "[]"))
+            self.object = form.save(commit=False)
+            update_invoice(self.object, detail_data)
+            return JsonResponse(
+                {"msg": "Factura actualizada con éxito", "url": str(self.success_url)}
+            )
+        except Exception as e:
+            return JsonResponse({"error": str(e)}, status=400)
 
     def form_invalid(self, form):
         return JsonResponse({"error": form.errors}, status=400)
@@ -120,7 +167,7 @@ class InvoiceDeleteView(LoginRequiredMixin, View):
     def post(self, request, pk, *args, **kwargs):
         try:
             invoice = Invoice.objects.get(pk=pk)
-            invoice.delete()
+            delete_invoice(invoice)
             return JsonResponse({"msg": "Factura eliminada correctamente."})
         except Invoice.DoesNotExist:
             return JsonResponse({"error": "Factura no encontrada."}, status=404)
@@ -128,28 +175,89 @@ class InvoiceDeleteView(LoginRequiredMixin, View):
 
 class InvoiceAnnulView(LoginRequiredMixin, View):
     def post(self, request, pk, *args, **kwargs):
-        invoice = Invoice.objects.get(pk=pk)
-        invoice.state = False
-        invoice.save()
+        try:
+            invoice = Invoice.objects.get(pk=pk)
+        except Invoice.DoesNotExist:
+            return JsonResponse({"error": "Factura no encontrada."}, status=404)
+        if not annul_invoice(invoice):
+            return JsonResponse({"msg": "La factura ya estaba anulada."})
         return JsonResponse({"msg": "Factura anulada correctamente."})
 
 
-class InvoiceDetailView(LoginRequiredMixin, DetailView):
+class InvoiceBulkAnnulView(LoginRequiredMixin, View):
+    """Anula varias facturas en una sola petición (`ids` repetido en el POST)."""
+
+    max_invoices = 500
+
+    def post(self, request, *args, **kwargs):
+        try:
+            pks = {int(pk) for pk in request.POST.getlist("ids")}
+        except ValueError:
+            return JsonResponse({"error": "Identificadores de factura inválidos."}, status=400)
+        if not pks:
+            return JsonResponse({"error": "No se seleccionaron facturas."}, status=400)
+        if len(pks) > self.max_invoices:
+            return JsonResponse(
+                {"error": f"Se pueden anular hasta {self.max_invoices} facturas a la vez."},
+                status=400,
+            )
+        annulled = annul_invoices(pks)
+        return JsonResponse(
+            {
+                "msg": f"{len(annulled)} facturas anuladas.",
+                "annulled": annulled,
+                "skipped": sorted(pks - set(annulled)),
+            }
+        )
+
+
+class InvoiceDetailView(AsyncLoginRequiredMixin, CachedFragmentMixin, DetailView):
     model = Invoice
     template_name = "invoice/detail_modal.html"
+    fragment_label = "invoice"
 
-    def get(self, request, *args, **kwargs):
-        invoice = self.get_object()
-        context = {
-            "invoice": invoice,
-            "details": invoice.detail.all()  # Pasamos los detalles a la plantilla
-        }
-        html = render_to_string(self.template_name, context)
-        return JsonResponse({"html": html})
+    async def aget_fragment_version(self, pk):
+        # El nombre del cliente y la descripción de los productos (catálogo)
+        # también se muestran: sus versiones entran en la clave.
+        updated = await (
+            Invoice.objects.filter(pk=pk).order_by()
+            .values_list("updated", "customer__updated").afirst()
+        )
+        return updated and (*updated, await catalog_cache.aversion())
+
+    async def arender_fragment(self, pk):
+        invoice = await aload_document_or_404(invoice_loader, pk)
+        return render_to_string(self.template_name, {"invoice": invoice})
 
 
 class InvoicePrintView(LoginRequiredMixin, View):
     def get(self, request, pk, *args, **kwargs):
-        invoice = Invoice.objects.get(pk=pk)
-        pdf = render_to_pdf("invoice/print.html", {"invoice": invoice})
-        return pdf
+        invoice = load_document_or_404(invoice_loader, pk)
+        return cached_pdf_response(
+            request, invoice, "invoice", "invoice/print.html", {"invoice": invoice},
+            invoice_loader.party,
+        )
+
+
+class InvoiceBatchPrintView(BatchPrintView):
+    """Exporta las facturas de un rango de fechas y/o de un cliente (`customer`)."""
+
+    model = Invoice
+    loader = invoice_loader
+    label = "invoice"
+    template_name = "invoice/print.html"
+    context_name = "invoice"
+    party = "customer"
+    filter_params = BatchPrintView.filter_params + ("customer",)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        customer = self.id_param("customer")
+        if customer:
+            queryset = queryset.filter(customer_id=customer)
+        return queryset
+
+
+class PdfCacheStatsView(LoginRequiredMixin, View):
+    def get(self, request, *args, **kwargs):
+        return JsonResponse(pdf_cache.stats())
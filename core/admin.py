@@ -1,5 +1,8 @@
 from django.contrib import admin
+from django.db import transaction
 
+from core import ledger
+from core.constants import MovementKind
 from core.models import *
 
 
@@ -20,4 +23,48 @@ class SupplierAdmin(admin.ModelAdmin):
 admin.site.register(Customer)
 admin.site.register(Brand)
 admin.site.register(Category)
-admin.site.register(Product)
+
+
+@admin.register(Product)
+class ProductAdmin(admin.ModelAdmin):
+    def save_model(self, request, obj, form, change):
+        # Los cambios de stock hechos a mano quedan en el libro de inventario,
+        # medidos contra el stock guardado (que pudo cambiar desde que se abrió
+        # el formulario).
+        with transaction.atomic():
+            previous = 0
+            if change:
+                previous = (
+                    Product.objects.select_for_update()
+                    .values_list("stock", flat=True)
+                    .get(pk=obj.pk)
+                )
+            super().save_model(request, obj, form, change)
+            if change and obj.stock != previous:
+                ledger.record(
+                    MovementKind.ADJUSTMENT, "", [(None, obj.pk, obj.stock - previous)]
+                )
+            elif not change and obj.stock:
+                # El stock con que se crea el producto entra valorado a su costo.
+                ledger.record(
+                    MovementKind.OPENING, "", [(None, obj.pk, obj.stock, obj.stock * obj.cost)]
+                )
+
+
+@admin.register(InventoryMovement)
+class InventoryMovementAdmin(admin.ModelAdmin):
+    list_display = ("moved_at", "product", "kind", "quantity", "source", "document_id")
+    list_filter = ("kind", "source")
+    search_fields = ("product__description",)
+    list_select_related = ("product",)
+    date_hierarchy = "moved_at"
+
+    # El libro es de solo inserción.
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,181 @@
+import threading
+import time
+from bisect import bisect_left, insort
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+SEPARATOR = "\x00"
+
+
+class CustomerPrefixIndex:
+    """
+    Índice de prefijos en memoria (por proceso) para el autocompletado de clientes.
+
+    Guarda una sola lista ordenada de claves `TEXTO\\x00pk` con tres entradas
+    por cliente activo: "APELLIDOS NOMBRES", "NOMBRES APELLIDOS" y el DNI.
+    Buscar un prefijo es un `bisect` más un recorrido corto, sin tocar la base
+    de datos. Se mantiene al día con señales de `Customer` y se reconstruye
+    por completo cuando supera `CUSTOMER_INDEX_MAX_AGE` segundos, para
+    recoger cambios hechos por otros procesos. Los cambios que llegan
+    mientras se carga en segundo plano se encolan y se vuelven a aplicar
+    sobre el índice nuevo apenas reemplaza al anterior, así no se pierden
+    aunque la lectura de la base haya empezado antes.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._keys = []
+        self._entries = {}  # pk -> (nombre a mostrar, claves)
+        self._pending = []  # cambios recibidos durante la carga: (pk, datos o None)
+        self.loaded_at = None
+        self._loading = False
+
+    @property
+    def max_age(self):
+        return getattr(settings, "CUSTOMER_INDEX_MAX_AGE", 900)
+
+    @staticmethod
+    def _make_keys(pk, first_name, last_name, dni):
+        first_name, last_name = first_name.upper(), last_name.upper()
+        full_name = f"{last_name} {first_name}"
+        texts = {full_name, f"{first_name} {last_name}"}
+        if dni:
+            texts.add(dni.upper())
+        return full_name, sorted(f"{text}{SEPARATOR}{pk}" for text in texts)
+
+    def build(self, rows):
+        """Carga el índice desde filas (pk, first_name, last_name, dni)."""
+        keys = []
+        entries = {}
+        for pk, first_name, last_name, dni in rows:
+            name, customer_keys = self._make_keys(pk, first_name, last_name, dni)
+            entries[pk] = (name, customer_keys)
+            keys.extend(customer_keys)
+        keys.sort()
+        with self._lock:
+            self._keys = keys
+            self._entries = entries
+            self.loaded_at = time.monotonic()
+            pending, self._pending = self._pending, []
+            for pk, data in pending:
+                self._apply(pk, data)
+
+    def load(self):
+        from core.models import Customer
+
+        rows = Customer.objects.filter(state=True).values_list(
+            "pk", "first_name", "last_name", "dni"
+        )
+        self.build(rows.iterator(chunk_size=5000))
+
+    def load_async(self):
+        with self._lock:
+            if self._loading:
+                return
+            self._loading = True
+            self._pending = []
+
+        def run():
+            try:
+                self.load()
+            finally:
+                close_old_connections()
+                with self._lock:
+                    self._loading = False
+                    self._pending = []
+
+        threading.Thread(target=run, daemon=True).start()
+
+    @property
+    def is_ready(self):
+        return self.loaded_at is not None
+
+    def is_stale(self):
+        return self.is_ready and time.monotonic() - self.loaded_at > self.max_age
+
+    @property
+    def is_tracking(self):
+        """Si hay que avisarle los cambios: índice cargado o cargándose."""
+        return self.is_ready or self._loading
+
+    def _apply(self, pk, data):
+        """Quita la entrada de `pk` y, si `data` no es None, agrega la nueva."""
+        entry = self._entries.pop(pk, None)
+        if entry is not None:
+            for key in entry[1]:
+                index = bisect_left(self._keys, key)
+                if index < len(self._keys) and self._keys[index] == key:
+                    del self._keys[index]
+        if data is not None:
+            name, customer_keys = self._make_keys(pk, *data)
+            self._entries[pk] = (name, customer_keys)
+            for key in customer_keys:
+                insort(self._keys, key)
+
+    def _change(self, pk, data):
+        with self._lock:
+            if self._loading:
+                self._pending.append((pk, data))
+            if self.is_ready:
+                self._apply(pk, data)
+
+    def remove(self, pk):
+        self._change(pk, None)
+
+    def update(self, pk, first_name, last_name, dni, active=True):
+        self._change(pk, (first_name, last_name, dni) if active else None)
+
+    def search(self, term, limit=10):
+        """Devuelve hasta `limit` pares (pk, nombre) cuyo texto empieza por `term`."""
+        prefix = " ".join(term.upper().split())
+        results = []
+        seen = set()
+        with self._lock:
+            index = bisect_left(self._keys, prefix)
+            keys = self._keys
+            while index < len(keys) and len(results) < limit:
+                key = keys[index]
+                if not key.startswith(prefix):
+                    break
+                pk = int(key.rsplit(SEPARATOR, 1)[1])
+                if pk not in seen:
+                    seen.add(pk)
+                    results.append((pk, self._entries[pk][0]))
+                index += 1
+        return results
+
+
+customer_index = CustomerPrefixIndex()
+
+
+def search_customers(term, limit=10):
+    """
+    Autocompletado de clientes activos. Usa el índice en memoria; en frío
+    (o si está vencido) dispara la carga en segundo plano y, mientras tanto,
+    responde desde la base de datos con el backend de búsqueda configurado.
+    """
+    if not customer_index.is_ready or customer_index.is_stale():
+        customer_index.load_async()
+    if customer_index.is_ready:
+        return customer_index.search(term, limit)
+
+    from commerce.search import get_search_backend
+    from core.models import Customer
+
+    queryset = get_search_backend().filter(
+        Customer.objects.filter(state=True), ["first_name", "last_name", "dni"], term
+    )
+    return [(c.pk, c.get_full_name) for c in queryset[:limit]]
+
+
+async def asearch_customers(term, limit=10):
+    """
+    Versión async de `search_customers`. Con el índice cargado responde desde
+    memoria sin salir del bucle de eventos; en frío usa la búsqueda síncrona
+    en un hilo, porque el backend FTS consulta con un cursor propio.
+    """
+    if customer_index.is_ready and not customer_index.is_stale():
+        return customer_index.search(term, limit)
+    return await sync_to_async(search_customers)(term, limit)
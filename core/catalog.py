@@ -0,0 +1,150 @@
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+
+from core.constants import ProductIva, ProductLine
+
+# Entrada compacta de un producto activo. El stock no se guarda: cambia con
+# cada venta y se lee siempre de la base de datos (core.stock).
+CatalogProduct = namedtuple(
+    "CatalogProduct", ["id", "description", "price", "cost", "iva", "line", "brand_id"]
+)
+
+
+class CatalogCache:
+    """
+    Caché versionado del catálogo activo (productos, marcas y categorías).
+
+    La versión global vive en la base de datos (`CatalogVersion`, una sola
+    fila) para que todos los procesos la compartan; las señales de
+    `Product`, `Brand` y `Category` la incrementan al confirmarse la
+    transacción. Cada lectura consulta la versión, así un cambio guardado en
+    un worker se ve en el siguiente pedido de cualquier otro. La
+    instantánea se guarda en el caché de Django bajo
+    `catalog:snapshot:<versión>` y cada proceso conserva además la última
+    leída: una consulta al catálogo cuesta la lectura de la versión. Como la
+    versión decide qué instantánea es válida, el caché puede ser local al
+    proceso (memoria local) o compartido (archivos, Redis); la vigencia solo
+    limita cuánto tardan en expirar las instantáneas viejas. Los cambios
+    masivos (`update()`, `bulk_create()`) no disparan señales: llamar a
+    `bump()` después.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = None
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, "CATALOG_CACHE_ALIAS", "default")]
+
+    @property
+    def timeout(self):
+        return getattr(settings, "CATALOG_CACHE_TIMEOUT", 24 * 3600)
+
+    def snapshot_key(self, version):
+        return f"catalog:snapshot:{version}"
+
+    @staticmethod
+    def _model():
+        from core.models import CatalogVersion
+
+        return CatalogVersion
+
+    @staticmethod
+    def _initial():
+        # Un valor inicial basado en el reloj evita reutilizar instantáneas
+        # de una versión anterior si la fila se perdió (base restaurada).
+        return {"version": time.time_ns()}
+
+    def version(self):
+        model = self._model()
+        version = model.objects.filter(pk=1).values_list("version", flat=True).first()
+        if version is None:
+            version = model.objects.get_or_create(pk=1, defaults=self._initial())[0].version
+        return version
+
+    async def aversion(self):
+        """`version()` para vistas asíncronas: usa el ORM asíncrono y no bloquea el event loop."""
+        model = self._model()
+        version = await model.objects.filter(pk=1).values_list("version", flat=True).afirst()
+        if version is None:
+            version = (await model.objects.aget_or_create(pk=1, defaults=self._initial()))[
+                0
+            ].version
+        return version
+
+    def bump(self):
+        model = self._model()
+        if not model.objects.filter(pk=1).update(version=F("version") + 1):
+            model.objects.get_or_create(pk=1, defaults=self._initial())
+
+    def clear(self):
+        with self._lock:
+            self._local = None
+        self.bump()
+
+    def build(self, version):
+        from core.models import Brand, Category, Product
+
+        products = Product.active_products.order_by().values_list(
+            "id", "description", "price", "cost", "iva", "line", "brand_id"
+        )
+        return {
+            "version": version,
+            "products": {
+                row[0]: CatalogProduct(*row) for row in products.iterator(chunk_size=5000)
+            },
+            "brands": dict(Brand.active_brands.values_list("id", "description")),
+            "categories": dict(
+                Category.objects.filter(state=True).values_list("id", "description")
+            ),
+            "lines": dict(ProductLine.choices),
+            "ivas": dict(ProductIva.choices),
+        }
+
+    def snapshot(self):
+        version = self.version()
+        local = self._local
+        if local is not None and local["version"] == version:
+            with self._lock:
+                self.hits += 1
+            return local
+
+        key = self.snapshot_key(version)
+        data = self.cache.get(key)
+        with self._lock:
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if data is None:
+            data = self.build(version)
+            self.cache.set(key, data, self.timeout)
+        self._local = data
+        return data
+
+    def products(self, pks):
+        """Devuelve {pk: CatalogProduct} de los productos activos pedidos."""
+        products = self.snapshot()["products"]
+        return {pk: products[pk] for pk in pks if pk in products}
+
+    def stats(self):
+        version = self.version()
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "version": version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / requests, 4) if requests else 0.0,
+            }
+
+
+catalog_cache = CatalogCache()
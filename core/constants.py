@@ -23,3 +23,12 @@ class InvoicePaymentMethod(models.TextChoices):
 class CustomerGender(models.TextChoices):
     MALE = "M", "Masculino"
     FEMALE = "F", "Femenino"
+
+
+class MovementKind(models.TextChoices):
+    OPENING = "SI", "Saldo inicial"
+    SALE = "VE", "Venta"
+    SALE_ANNUL = "AV", "Anulación de venta"
+    PURCHASE = "CO", "Compra"
+    PURCHASE_ANNUL = "AC", "Anulación de compra"
+    ADJUSTMENT = "AJ", "Ajuste"
@@ -0,0 +1,134 @@
+import time
+from collections import defaultdict
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, Value, When
+
+from .catalog import catalog_cache
+from .constants import MovementKind
+from .models import InventoryMovement, Product
+
+CENT = Decimal("0.01")
+ZERO = Decimal("0.00")
+# Movimientos que cambian el costo promedio; el resto solo mueve unidades.
+VALUED_KINDS = frozenset(
+    {MovementKind.OPENING, MovementKind.PURCHASE, MovementKind.PURCHASE_ANNUL}
+)
+
+
+def average_cost(stock, cost, quantity, value):
+    """
+    Costo promedio ponderado tras sumar `quantity` unidades por `value`
+    (ambos con signo: negativos al anular o reducir una compra).
+
+    Un costo en cero o desconocido toma el de la compra, y el stock negativo
+    cuenta como cero. Si la operación dejaría el inventario sin unidades o
+    con valor negativo, el costo no cambia.
+    """
+    stock = max(Decimal(stock), ZERO)
+    if not cost:
+        if quantity > 0 and value > 0:
+            return (value / quantity).quantize(CENT, rounding=ROUND_HALF_UP)
+        return cost
+    units = stock + quantity
+    total = stock * cost + value
+    if units <= 0 or total < 0:
+        return cost
+    return (total / units).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def cost_changes(rows, sign=1):
+    """Agrupa filas `(documento, producto, cantidad, valor)` en {producto: (cantidad, valor)}."""
+    changes = defaultdict(lambda: [ZERO, ZERO])
+    for _, pk, quantity, value in rows:
+        changes[pk][0] += sign * Decimal(str(quantity))
+        changes[pk][1] += sign * Decimal(str(value))
+    return {pk: tuple(change) for pk, change in changes.items() if any(change)}
+
+
+def _cost_case(costs):
+    return Case(
+        *[When(pk=pk, then=Value(cost)) for pk, cost in costs.items()],
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+
+
+def update_costs(costs, batch_size=500):
+    """Guarda {producto: costo} con un UPDATE por lote y refresca el catálogo al confirmar."""
+    items = list(costs.items())
+    for start in range(0, len(items), batch_size):
+        batch = dict(items[start:start + batch_size])
+        Product.objects.filter(pk__in=list(batch)).update(cost=_cost_case(batch))
+    if items:
+        transaction.on_commit(catalog_cache.bump)
+    return len(items)
+
+
+def apply_average_cost(changes):
+    """
+    Recalcula el costo promedio de los productos de una compra registrada,
+    editada o anulada. `changes` es {producto: (cantidad, valor)} con el
+    signo del efecto sobre el inventario, y debe aplicarse antes de mover
+    el stock: el promedio pondera con las unidades que había. Las filas se
+    bloquean en orden de `pk`, como en `core.stock`, y los costos nuevos se
+    guardan en un solo UPDATE. Devuelve {producto: costo} de los que cambiaron.
+    """
+    if not changes:
+        return {}
+    with transaction.atomic():
+        costs = {}
+        for pk, stock, cost in (
+            Product.objects.select_for_update()
+            .filter(pk__in=list(changes))
+            .order_by("pk")
+            .values_list("pk", "stock", "cost")
+        ):
+            new_cost = average_cost(stock, cost, *changes[pk])
+            if new_cost != cost:
+                costs[pk] = new_cost
+        update_costs(costs)
+    return costs
+
+
+def replay_average_costs(chunk_size=10000, progress=None):
+    """
+    Recalcula el costo promedio de todos los productos repitiendo el libro
+    de inventario (core.ledger) en orden cronológico.
+
+    El libro se lee en una sola pasada con un cursor por bloques de
+    `chunk_size` filas (solo producto, tipo, cantidad y valor) y el estado
+    de cada producto (unidades y costo) se lleva en memoria, así que el
+    tiempo crece linealmente con los movimientos. Los saldos iniciales, las
+    compras y sus reversos ajustan el promedio; el resto solo mueve
+    unidades. Un stock sin valorar toma el costo de la primera compra. Los
+    productos sin movimientos valorados conservan su costo. `progress(movimientos, segundos)` se llama
+    cada `chunk_size` movimientos. Devuelve (movimientos, productos
+    actualizados).
+    """
+    state = {}
+    count = 0
+    started = time.perf_counter()
+    movements = (
+        InventoryMovement.objects.order_by("moved_at", "id")
+        .values_list("product_id", "kind", "quantity", "value")
+        .iterator(chunk_size=chunk_size)
+    )
+    for pk, kind, quantity, value in movements:
+        entry = state.get(pk)
+        if entry is None:
+            entry = state[pk] = [ZERO, None]
+        if kind in VALUED_KINDS:
+            entry[1] = average_cost(entry[0], entry[1], quantity, value)
+        entry[0] += quantity
+        count += 1
+        if progress and not count % chunk_size:
+            progress(count, time.perf_counter() - started)
+
+    costs = {pk: cost for pk, (_, cost) in state.items() if cost is not None}
+    with transaction.atomic():
+        current = dict(Product.objects.values_list("pk", "cost").iterator())
+        updated = update_costs(
+            {pk: cost for pk, cost in costs.items() if pk in current and current[pk] != cost}
+        )
+    return count, updated
@@ -0,0 +1,109 @@
+import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from commerce.models import DailyProductSales, DailySalesSummary
+from core.constants import InvoicePaymentMethod
+from core.models import Product, Supplier
+from nomina.models import Prestamo
+
+
+def _month_start(day, months_back=0):
+    month = day.month - 1 - months_back
+    return datetime.date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def build_dashboard(today=None):
+    """
+    Calcula los indicadores del tablero con un número fijo de consultas
+    agrupadas sobre los resúmenes diarios (commerce.rollups), nunca una por
+    producto o por factura:
+
+    1. ventas de hoy, la semana y el mes (agregación condicional),
+    2. ventas por mes de los últimos 12 meses (TruncMonth),
+    3. reparto por método de pago del mes,
+    4. productos más vendidos del mes,
+    5. productos con stock bajo,
+    6. saldo pendiente de préstamos,
+    7. cantidad de proveedores.
+    """
+    today = today or timezone.localdate()
+    week_start = today - datetime.timedelta(days=today.weekday())
+    month_start = _month_start(today)
+    top_size = getattr(settings, "DASHBOARD_TOP_PRODUCTS", 10)
+    low_stock = getattr(settings, "DASHBOARD_LOW_STOCK", 10)
+
+    def period(name, condition):
+        return {
+            f"{name}_total": Sum("total", filter=condition, default=0),
+            f"{name}_invoices": Sum("invoices", filter=condition, default=0),
+        }
+
+    summaries = DailySalesSummary.objects.filter(date__lte=today)
+    sales = summaries.filter(date__gte=min(week_start, month_start)).aggregate(
+        **period("today", Q(date=today)),
+        **period("week", Q(date__gte=week_start)),
+        **period("month", Q(date__gte=month_start)),
+    )
+
+    monthly = list(
+        summaries.filter(date__gte=_month_start(today, 11))
+        .annotate(month=TruncMonth("date"))
+        .values("month")
+        .annotate(total=Sum("total"), invoices=Sum("invoices"))
+        .order_by("month")
+    )
+
+    payment_methods = list(
+        summaries.filter(date__gte=month_start)
+        .values("payment_method")
+        .annotate(total=Sum("total"), invoices=Sum("invoices"))
+        .order_by("-total")
+    )
+    for row in payment_methods:
+        row["label"] = InvoicePaymentMethod(row["payment_method"]).label
+
+    top_products = list(
+        DailyProductSales.objects.filter(date__gte=month_start, date__lte=today)
+        .values("product_id", "product__description")
+        .annotate(quantity=Sum("quantity"), total=Sum("subtotal"))
+        .order_by("-total")[:top_size]
+    )
+
+    low_stock_products = list(
+        Product.active_products.filter(stock__lte=low_stock)
+        .order_by("stock", "description")
+        .values("id", "description", "stock")[:top_size]
+    )
+
+    loans = Prestamo.objects.filter(estado="PEND").aggregate(
+        pending=Count("id"), balance=Sum("saldo", default=0)
+    )
+
+    return {
+        "date": today,
+        "sales": sales,
+        "monthly": monthly,
+        "payment_methods": payment_methods,
+        "top_products": top_products,
+        "low_stock": low_stock_products,
+        "loans": loans,
+        "suppliers": Supplier.objects.count(),
+    }
+
+
+def get_dashboard():
+    """Tablero con micro-caché de `DASHBOARD_CACHE_SECONDS` segundos."""
+    timeout = getattr(settings, "DASHBOARD_CACHE_SECONDS", 30)
+    if not timeout:
+        return build_dashboard()
+    key = f"dashboard:{timezone.localdate().isoformat()}"
+    data = cache.get(key)
+    if data is None:
+        data = build_dashboard()
+        cache.set(key, data, timeout)
+    return data
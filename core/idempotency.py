@@ -0,0 +1,81 @@
+import datetime
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import JsonResponse
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+MAX_LENGTH = 64
+
+
+def get_key(request):
+    """Clave enviada en la cabecera `Idempotency-Key` o en el campo `idempotency_key`."""
+    key = (request.headers.get(HEADER) or request.POST.get("idempotency_key") or "").strip()
+    if len(key) > MAX_LENGTH:
+        raise ValueError(f"La clave de idempotencia supera {MAX_LENGTH} caracteres.")
+    return key
+
+
+def expiry():
+    ttl = getattr(settings, "IDEMPOTENCY_KEY_TTL", 24 * 3600)
+    return timezone.now() - datetime.timedelta(seconds=ttl)
+
+
+def lookup(user, scope, key):
+    """Respuesta guardada para la clave (una búsqueda por el índice único) o None."""
+    record = (
+        IdempotencyKey.objects.filter(user=user, scope=scope, key=key)
+        .only("response", "created")
+        .first()
+    )
+    if record is None or record.created < expiry():
+        return None
+    return record.response
+
+
+def run_once(request, scope, handler):
+    """
+    Ejecuta `handler()` una sola vez por clave de idempotencia.
+
+    `handler` corre dentro de una transacción y devuelve (id del documento,
+    datos de la respuesta). La clave se inserta en esa misma transacción
+    antes de crear el documento, así que un duplicado concurrente choca con
+    el índice único, espera al primero y devuelve su respuesta; si el
+    registro falla, la clave se revierte junto con el documento y el
+    cliente puede reintentar. Las repeticiones de peticiones ya confirmadas
+    se responden antes, con `lookup` (ver core.mixins.IdempotentCreateMixin).
+    Sin clave, `handler` se ejecuta normalmente.
+    """
+    key = get_key(request)
+    if not key:
+        with transaction.atomic():
+            _, payload = handler()
+        return JsonResponse(payload)
+
+    user = request.user
+    try:
+        with transaction.atomic():
+            # Una clave vencida que aún no se purgó se puede reutilizar.
+            IdempotencyKey.objects.filter(
+                user=user, scope=scope, key=key, created__lt=expiry()
+            ).delete()
+            record = IdempotencyKey.objects.create(user=user, scope=scope, key=key)
+            document_id, payload = handler()
+            record.document_id = document_id
+            record.response = payload
+            record.save(update_fields=["document_id", "response"])
+    except IntegrityError:
+        replay = lookup(user, scope, key)
+        if replay is None:
+            raise
+        return JsonResponse(replay)
+    return JsonResponse(payload)
+
+
+def purge_expired():
+    """Borra las claves vencidas; devuelve cuántas se eliminaron."""
+    deleted, _ = IdempotencyKey.objects.filter(created__lt=expiry()).delete()
+    return deleted
@@ -0,0 +1,235 @@
+import datetime
+import time
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import (
+    DecimalField, Exists, F, Min, OuterRef, Subquery, Sum, Value,
+)
+from django.utils import timezone
+
+from .constants import MovementKind
+from .models import InventoryMovement, Product, StockSnapshot
+
+BATCH_SIZE = 1000
+VALUE_FIELD = DecimalField(max_digits=16, decimal_places=2)
+
+
+def document_rows(document_id, quantities):
+    """Filas (documento, producto, cantidad) de un documento: acepta un dict o pares."""
+    items = quantities.items() if isinstance(quantities, dict) else quantities
+    return [(document_id, pk, quantity) for pk, quantity in items]
+
+
+def movements(kind, source, rows, sign=1, moved_at=None):
+    """
+    Movimientos sin guardar de las filas `(documento, producto, cantidad)`;
+    las compras agregan un cuarto elemento, el valor al costo. `sign`
+    convierte la cantidad al efecto sobre el stock: -1 para ventas y
+    anulaciones de compra, +1 para compras y devoluciones. Se omiten las
+    filas sin cantidad ni valor.
+    """
+    moved_at = moved_at or timezone.now()
+    built = []
+    for document_id, pk, quantity, *value in rows:
+        value = Decimal(str(value[0])) if value else Decimal("0.00")
+        if quantity or value:
+            built.append(
+                InventoryMovement(
+                    product_id=pk,
+                    kind=kind,
+                    quantity=sign * Decimal(str(quantity)),
+                    value=sign * value,
+                    source=source,
+                    document_id=document_id,
+                    moved_at=moved_at,
+                )
+            )
+    return built
+
+
+def record(kind, source, rows, sign=1, moved_at=None):
+    """
+    Agrega al libro de inventario las filas de `movements` con un
+    `bulk_create`. Debe llamarse en la misma transacción que mueve el stock.
+    """
+    built = movements(kind, source, rows, sign, moved_at)
+    InventoryMovement.objects.bulk_create(built, batch_size=BATCH_SIZE)
+    return len(built)
+
+
+def day_end(day):
+    """Inicio del día siguiente a `day`: los movimientos de `day` son los anteriores."""
+    return timezone.make_aware(
+        datetime.datetime.combine(day + datetime.timedelta(days=1), datetime.time.min)
+    )
+
+
+def stock_at(day, product_ids=None):
+    """
+    Stock por producto al cierre de `day`.
+
+    Parte de la última foto (`StockSnapshot`) de cada producto anterior o
+    igual a `day` y suma solo los movimientos posteriores a esa foto, así el
+    costo depende de los movimientos desde la foto y no de todo el
+    historial. Los productos sin foto suman su historial completo. Es una
+    consulta para las fotos y una agrupada por cada fecha de foto distinta
+    (normalmente una, porque se toman para todos los productos a la vez).
+    """
+    latest = (
+        StockSnapshot.objects.filter(product=OuterRef("product"), date__lte=day)
+        .order_by("-date")
+        .values("date")[:1]
+    )
+    snapshots = StockSnapshot.objects.filter(date=Subquery(latest))
+    movements = InventoryMovement.objects.filter(moved_at__lt=day_end(day))
+    if product_ids is not None:
+        product_ids = list(product_ids)
+        snapshots = snapshots.filter(product_id__in=product_ids)
+        movements = movements.filter(product_id__in=product_ids)
+
+    stock = {}
+    dates = set()
+    for pk, date, value in snapshots.values_list("product_id", "date", "stock"):
+        stock[pk] = value
+        dates.add(date)
+
+    groups = [
+        movements.exclude(
+            Exists(StockSnapshot.objects.filter(product=OuterRef("product"), date__lte=day))
+        )
+    ]
+    for date in dates:
+        groups.append(
+            movements.filter(
+                product_id__in=snapshots.filter(date=date).values("product_id"),
+                moved_at__gte=day_end(date),
+            )
+        )
+    for queryset in groups:
+        for pk, total in (
+            queryset.values_list("product_id").annotate(total=Sum("quantity")).order_by()
+        ):
+            stock[pk] = stock.get(pk, Decimal("0.00")) + total
+
+    for pk in product_ids or ():
+        stock.setdefault(pk, Decimal("0.00"))
+    return stock
+
+
+def take_snapshots(day):
+    """
+    Guarda (o reemplaza) la foto de stock al cierre de `day` de cada producto
+    con movimientos. Pensado para ejecutarse a diario sobre el día anterior
+    (comando `snapshot_stock`); las fotos posteriores a un movimiento con
+    fecha atrasada quedan desactualizadas y deben volver a tomarse.
+    """
+    stock = stock_at(day)
+    StockSnapshot.objects.bulk_create(
+        [StockSnapshot(product_id=pk, date=day, stock=value) for pk, value in stock.items()],
+        batch_size=BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=["product", "date"],
+        update_fields=["stock"],
+    )
+    return len(stock)
+
+
+def backfill(source, documents, detail, parent_field, kind, annul_kind, sign,
+             cost_field=None, chunk_size=1000, progress=None):
+    """
+    Reconstruye en el libro los movimientos de documentos existentes.
+
+    `documents` son las cabeceras (con `issue_date`, `state` y `updated`) y
+    `detail` sus líneas, enlazadas por `parent_field`. Se recorren por
+    bloques de `chunk_size` ids, cada uno con una consulta agrupada del
+    detalle y un `bulk_create` en su propia transacción: el movimiento
+    original con la fecha de emisión y, si el documento está anulado, su
+    reverso con la fecha de la última modificación. Con `cost_field` se
+    guarda además el valor al costo de cada línea. Los documentos que ya
+    tienen movimientos se omiten, así que el comando se puede interrumpir y
+    volver a ejecutar. `progress(documentos, movimientos, segundos)` se
+    llama tras cada bloque. Devuelve (documentos, movimientos).
+    """
+    pending = documents.exclude(
+        Exists(InventoryMovement.objects.filter(source=source, document_id=OuterRef("pk")))
+    ).order_by("pk")
+    last = 0
+    done = written = 0
+    started = time.perf_counter()
+    while True:
+        headers = {
+            pk: (issue_date, state, updated)
+            for pk, issue_date, state, updated in pending.filter(pk__gt=last).values_list(
+                "pk", "issue_date", "state", "updated"
+            )[:chunk_size]
+        }
+        if not headers:
+            break
+        last = max(headers)
+        lines = (
+            detail.filter(**{f"{parent_field}_id__in": list(headers)})
+            .values_list(f"{parent_field}_id", "product_id")
+            .annotate(
+                total=Sum("quantity"),
+                value=Sum(F("quantity") * F(cost_field), output_field=VALUE_FIELD)
+                if cost_field else Value(Decimal("0.00"), output_field=VALUE_FIELD),
+            )
+            .order_by()
+        )
+        movements = []
+        for document_id, pk, quantity, value in lines:
+            issue_date, state, updated = headers[document_id]
+            movements.append(
+                InventoryMovement(
+                    product_id=pk, kind=kind, quantity=sign * quantity, value=sign * value,
+                    source=source, document_id=document_id, moved_at=issue_date,
+                )
+            )
+            if not state:
+                movements.append(
+                    InventoryMovement(
+                        product_id=pk, kind=annul_kind, quantity=-sign * quantity,
+                        value=-sign * value, source=source, document_id=document_id,
+                        moved_at=max(issue_date, updated),
+                    )
+                )
+        with transaction.atomic():
+            InventoryMovement.objects.bulk_create(movements, batch_size=BATCH_SIZE)
+        done += len(headers)
+        written += len(movements)
+        if progress:
+            progress(done, written, time.perf_counter() - started)
+    return done, written
+
+
+def open_balances():
+    """
+    Agrega un saldo inicial por producto para que el libro sume exactamente
+    el `Product.stock` actual. Cubre el stock cargado antes de existir el
+    libro y los documentos ya eliminados; se fecha con el primer movimiento
+    del producto y se valora al costo actual. Las fotos de stock existentes
+    se descartan porque dejan de coincidir con el libro. Devuelve la
+    cantidad de saldos creados.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        ledger = {
+            pk: (total, first)
+            for pk, total, first in InventoryMovement.objects.values_list("product_id")
+            .annotate(total=Sum("quantity"), first=Min("moved_at"))
+            .order_by()
+        }
+        movements = []
+        for pk, stock, cost in Product.objects.values_list("pk", "stock", "cost").iterator():
+            total, first = ledger.get(pk, (Decimal("0.00"), now))
+            if stock != total:
+                movements.append(
+                    InventoryMovement(
+                        product_id=pk, kind=MovementKind.OPENING, quantity=stock - total,
+                        value=(stock - total) * cost, moved_at=first,
+                    )
+                )
+        InventoryMovement.objects.bulk_create(movements, batch_size=BATCH_SIZE)
+        StockSnapshot.objects.all().delete()
+    return len(movements)
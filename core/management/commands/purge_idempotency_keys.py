@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.idempotency import purge_expired
+
+
+class Command(BaseCommand):
+    help = (
+        "Borra las claves de idempotencia con más de IDEMPOTENCY_KEY_TTL segundos. "
+        "Pensado para ejecutarse periódicamente (cron)."
+    )
+
+    def handle(self, *args, **options):
+        deleted = purge_expired()
+        self.stdout.write(self.style.SUCCESS(f"{deleted} claves de idempotencia eliminadas."))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.costing import replay_average_costs
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula el costo promedio ponderado de todos los productos repitiendo en "
+        "orden cronológico el libro de inventario (compras, anulaciones y ventas)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size", type=int, default=10000, help="Movimientos leídos por bloque."
+        )
+
+    def handle(self, *args, **options):
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size debe ser mayor que cero.")
+
+        def progress(movements, seconds):
+            rate = movements / seconds if seconds else 0
+            self.stdout.write(f"{movements} movimientos ({rate:.0f} movimientos/s)")
+
+        movements, products = replay_average_costs(
+            chunk_size=options["chunk_size"], progress=progress
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{movements} movimientos repetidos, {products} costos actualizados."
+            )
+        )
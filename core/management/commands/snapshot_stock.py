@@ -0,0 +1,27 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from core.ledger import take_snapshots
+
+
+class Command(BaseCommand):
+    help = (
+        "Guarda la foto de stock por producto al cierre de un día (por defecto, ayer) "
+        "a partir del libro de inventario. Pensado para ejecutarse a diario (cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--date", help="Día a fotografiar (AAAA-MM-DD).")
+
+    def handle(self, *args, **options):
+        if options["date"]:
+            day = parse_date(options["date"])
+            if day is None:
+                raise CommandError(f"Fecha inválida: {options['date']}")
+        else:
+            day = timezone.localdate() - datetime.timedelta(days=1)
+        products = take_snapshots(day)
+        self.stdout.write(self.style.SUCCESS(f"Foto de stock del {day}: {products} productos."))
@@ -0,0 +1,74 @@
+from django.db import migrations
+
+# Índices de búsqueda para QueryFilterMixin (ver commerce/search.py).
+# PostgreSQL: pg_trgm + GIN sobre UPPER(col), que es lo que genera `icontains`.
+# SQLite: tablas FTS5 de contenido externo mantenidas con triggers.
+TRIGRAM_COLUMNS = {
+    "core_customer": ("first_name", "last_name", "dni"),
+    "core_supplier": ("name", "ruc"),
+    "core_product": ("description",),
+}
+
+FTS_TABLES = {
+    "core_customer": ("core_customer_fts", ("first_name", "last_name", "dni")),
+    "core_supplier": ("core_supplier_fts", ("name", "ruc")),
+    "core_product": ("core_product_fts", ("description",)),
+}
+
+
+def _sqlite_fts_statements(table, fts, columns):
+    cols = ", ".join(columns)
+    new = ", ".join(f"new.{c}" for c in columns)
+    old = ", ".join(f"old.{c}" for c in columns)
+    return [
+        f"CREATE VIRTUAL TABLE {fts} USING fts5({cols}, content='{table}', "
+        f"content_rowid='id', prefix='2 3')",
+        f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END",
+        f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); END",
+        f"CREATE TRIGGER {fts}_au AFTER UPDATE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END",
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+
+
+def create_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for table, columns in TRIGRAM_COLUMNS.items():
+            for column in columns:
+                schema_editor.execute(
+                    f"CREATE INDEX IF NOT EXISTS {table}_{column}_trgm "
+                    f'ON {table} USING gin (UPPER("{column}"::text) gin_trgm_ops)'
+                )
+    elif vendor == "sqlite":
+        for table, (fts, columns) in FTS_TABLES.items():
+            for statement in _sqlite_fts_statements(table, fts, columns):
+                schema_editor.execute(statement)
+
+
+def drop_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        for table, columns in TRIGRAM_COLUMNS.items():
+            for column in columns:
+                schema_editor.execute(f"DROP INDEX IF EXISTS {table}_{column}_trgm")
+    elif vendor == "sqlite":
+        for fts, _ in FTS_TABLES.values():
+            for suffix in ("ai", "ad", "au"):
+                schema_editor.execute(f"DROP TRIGGER IF EXISTS {fts}_{suffix}")
+            schema_editor.execute(f"DROP TABLE IF EXISTS {fts}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0007_alter_brand_supplier"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
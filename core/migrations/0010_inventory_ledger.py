@@ -0,0 +1,47 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:41
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('SI', 'Saldo inicial'), ('VE', 'Venta'), ('AV', 'Anulación de venta'), ('CO', 'Compra'), ('AC', 'Anulación de compra'), ('AJ', 'Ajuste')], max_length=2, verbose_name='Tipo')),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Cantidad')),
+                ('source', models.CharField(blank=True, max_length=20, verbose_name='Origen')),
+                ('document_id', models.PositiveBigIntegerField(blank=True, null=True, verbose_name='Documento')),
+                ('moved_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Fecha')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='movements', to='core.product', verbose_name='Producto')),
+            ],
+            options={
+                'verbose_name': 'Movimiento de Inventario',
+                'verbose_name_plural': 'Movimientos de Inventario',
+                'indexes': [models.Index(fields=['product', 'moved_at'], name='core_invent_product_69fb17_idx'), models.Index(fields=['source', 'document_id'], name='core_invent_source_dd19dc_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Fecha')),
+                ('stock', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Stock')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='core.product', verbose_name='Producto')),
+            ],
+            options={
+                'verbose_name': 'Foto de Stock',
+                'verbose_name_plural': 'Fotos de Stock',
+                'constraints': [models.UniqueConstraint(fields=('product', 'date'), name='unique_stock_snapshot')],
+            },
+        ),
+    ]
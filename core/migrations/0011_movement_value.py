@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:51
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_inventory_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventorymovement',
+            name='value',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=16, verbose_name='Valor'),
+        ),
+        migrations.AddIndex(
+            model_name='inventorymovement',
+            index=models.Index(fields=['moved_at', 'id'], name='core_invent_moved_a_d8e232_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_catalog_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='supplier',
+            index=models.Index(fields=['name', 'id'], name='core_suppli_name_cf19cc_idx'),
+        ),
+    ]
@@ -1,3 +1,10 @@
+from django.contrib.auth.mixins import AccessMixin
+from django.contrib.auth.views import redirect_to_login
+from django.http import JsonResponse
+
+from .idempotency import get_key, lookup, run_once
+
+
 class TitleContextMixin:
     """
     Mixin genérico para añadir títulos a las vistas.
@@ -14,3 +21,49 @@ class TitleContextMixin:
         if self.title2:
             context["title2"] = self.title2
         return context
+
+
+class IdempotentCreateMixin:
+    """
+    Registro idempotente de documentos enviados por AJAX (core.idempotency).
+
+    Si la petición trae una clave ya registrada, `post` devuelve la respuesta
+    guardada con una sola consulta, sin validar el formulario ni tocar el
+    documento. `form_valid` registra el documento con `register_once`.
+    """
+
+    idempotency_scope = None
+
+    def post(self, request, *args, **kwargs):
+        try:
+            key = get_key(request)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+        if key:
+            replay = lookup(request.user, self.idempotency_scope, key)
+            if replay is not None:
+                return JsonResponse(replay)
+        return super().post(request, *args, **kwargs)
+
+    def register_once(self, handler):
+        """`handler()` -> (id del documento, datos de la respuesta)."""
+        return run_once(self.request, self.idempotency_scope, handler)
+
+
+class AsyncLoginRequiredMixin(AccessMixin):
+    """
+    LoginRequiredMixin para vistas con manejadores `async def`: el usuario se
+    obtiene con `request.auser()`, sin consultas síncronas dentro del bucle
+    de eventos. Bajo WSGI también funciona (Django ejecuta la vista con
+    async_to_sync).
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        user = await request.auser()
+        if not user.is_authenticated:
+            if self.raise_exception:
+                return self.handle_no_permission()
+            return redirect_to_login(
+                request.get_full_path(), self.get_login_url(), self.get_redirect_field_name()
+            )
+        return await super().dispatch(request, *args, **kwargs)
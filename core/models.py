@@ -1,9 +1,9 @@
 from django.utils import timezone
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from decimal import Decimal
 from core.utils import phone_validator
-from core.constants import CustomerGender, ProductIva, ProductLine
+from core.constants import CustomerGender, MovementKind, ProductIva, ProductLine
 from django.db.models import F
 
 
@@ -20,6 +20,10 @@ class Supplier(models.Model):
     class Meta:
         verbose_name = "Proveedor"
         verbose_name_plural = "Proveedores"
+        indexes = [
+            # Soporta la paginación por cursor (name, id) del listado
+            models.Index(fields=["name", "id"]),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.ruc}"
@@ -174,14 +178,23 @@ class Product(models.Model):
         )
 
     def reduce_stock(self, quantity):
-        if quantity > self.stock:
-            raise ValueError("No hay suficiente stock disponible.")
-        self.stock -= quantity
-        self.save()
+        # El chequeo y el descuento se hacen en un solo UPDATE condicionado,
+        # así dos cajas no pueden vender las mismas últimas unidades.
+        from core import ledger
+        from core.stock import reserve_stock
+
+        with transaction.atomic():
+            reserve_stock({self.pk: quantity})
+            ledger.record(MovementKind.ADJUSTMENT, "", [(None, self.pk, quantity)], sign=-1)
+        self.refresh_from_db(fields=["stock"])
 
     @staticmethod
-    def update_stock(self, id, quantity):
-        Product.objects.filter(pk=id).update(stock=F("stock") - quantity)
+    def update_stock(id, quantity):
+        from core import ledger
+
+        with transaction.atomic():
+            Product.objects.filter(pk=id).update(stock=F("stock") - quantity)
+            ledger.record(MovementKind.ADJUSTMENT, "", [(None, id, quantity)], sign=-1)
 
 
 class Category(models.Model):
@@ -200,3 +213,107 @@ class Category(models.Model):
 
     def __str__(self):
         return self.description
+
+
+class IdempotencyKey(models.Model):
+    """
+    Clave de idempotencia enviada por el cliente al registrar un documento
+    (core.idempotency): guarda el id del documento creado y la respuesta
+    para devolverla tal cual si la misma petición se repite.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    scope = models.CharField(verbose_name="Ambito", max_length=30)
+    key = models.CharField(verbose_name="Clave", max_length=64)
+    document_id = models.PositiveBigIntegerField(verbose_name="Documento", null=True, blank=True)
+    response = models.JSONField(verbose_name="Respuesta", default=dict)
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = "Clave de Idempotencia"
+        verbose_name_plural = "Claves de Idempotencia"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "scope", "key"], name="unique_idempotency_key"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.scope}:{self.key}"
+
+
+class InventoryMovement(models.Model):
+    """
+    Movimiento de inventario (core.ledger). El libro es de solo inserción:
+    cada venta, compra, anulación o ajuste agrega filas con la cantidad con
+    el signo de su efecto sobre el stock, en la misma transacción que
+    actualiza `Product.stock`. El documento se guarda como id (sin clave
+    foránea) para que el historial sobreviva a su eliminación.
+    """
+
+    product = models.ForeignKey(
+        Product, on_delete=models.PROTECT, related_name="movements", verbose_name="Producto"
+    )
+    kind = models.CharField(verbose_name="Tipo", max_length=2, choices=MovementKind.choices)
+    quantity = models.DecimalField(verbose_name="Cantidad", max_digits=12, decimal_places=2)
+    # Valor al costo de compra (cantidad x costo) en compras y sus reversos;
+    # con él se repite el costo promedio ponderado (core.costing).
+    value = models.DecimalField(
+        verbose_name="Valor", max_digits=16, decimal_places=2, default=Decimal("0.00")
+    )
+    source = models.CharField(verbose_name="Origen", max_length=20, blank=True)
+    document_id = models.PositiveBigIntegerField(verbose_name="Documento", null=True, blank=True)
+    moved_at = models.DateTimeField(verbose_name="Fecha", default=timezone.now)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Movimiento de Inventario"
+        verbose_name_plural = "Movimientos de Inventario"
+        indexes = [
+            # Stock a una fecha: movimientos de un producto desde su última foto
+            models.Index(fields=["product", "moved_at"]),
+            models.Index(fields=["source", "document_id"]),
+            # Recorrido cronológico de todo el libro (costo promedio)
+            models.Index(fields=["moved_at", "id"]),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.quantity} - {self.product_id}"
+
+
+class StockSnapshot(models.Model):
+    """Stock de un producto al cierre de `date`, calculado desde el libro (core.ledger)."""
+
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="snapshots", verbose_name="Producto"
+    )
+    date = models.DateField(verbose_name="Fecha")
+    stock = models.DecimalField(verbose_name="Stock", max_digits=12, decimal_places=2)
+
+    class Meta:
+        verbose_name = "Foto de Stock"
+        verbose_name_plural = "Fotos de Stock"
+        constraints = [
+            models.UniqueConstraint(fields=["product", "date"], name="unique_stock_snapshot"),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} {self.date}: {self.stock}"
+
+
+class CatalogVersion(models.Model):
+    """
+    Versión global del catálogo (core.catalog): una sola fila compartida por
+    todos los procesos, que se incrementa con cada cambio de productos,
+    marcas o categorías.
+    """
+
+    version = models.PositiveBigIntegerField(verbose_name="Version", default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Version del Catalogo"
+        verbose_name_plural = "Versiones del Catalogo"
+
+    def __str__(self):
+        return str(self.version)
@@ -0,0 +1,51 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .autocomplete import customer_index
+from .catalog import catalog_cache
+from .models import Brand, Category, Customer, Product
+
+# Campos que no forman parte de la instantánea del catálogo.
+CATALOG_VOLATILE_FIELDS = {"stock", "updated"}
+
+
+@receiver(post_save, sender=Customer)
+def index_customer(sender, instance, **kwargs):
+    # Solo se mantiene un índice cargado o en carga; en frío se construye completo.
+    if customer_index.is_tracking:
+        transaction.on_commit(
+            lambda: customer_index.update(
+                instance.pk, instance.first_name, instance.last_name, instance.dni,
+                active=instance.state,
+            )
+        )
+
+
+@receiver(post_delete, sender=Customer)
+def unindex_customer(sender, instance, **kwargs):
+    if customer_index.is_tracking:
+        pk = instance.pk
+        transaction.on_commit(lambda: customer_index.remove(pk))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Brand)
+@receiver(post_save, sender=Category)
+def bump_catalog_version(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= CATALOG_VOLATILE_FIELDS:
+        return
+    transaction.on_commit(catalog_cache.bump)
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Brand)
+@receiver(post_delete, sender=Category)
+def bump_catalog_version_on_delete(sender, instance, **kwargs):
+    transaction.on_commit(catalog_cache.bump)
+
+
+@receiver(m2m_changed, sender=Product.categories.through)
+def bump_catalog_version_on_categories(sender, action, **kwargs):
+    if action.startswith("post_"):
+        transaction.on_commit(catalog_cache.bump)
@@ -0,0 +1,98 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Q, Value, When
+
+from core.models import Product
+
+
+def _normalize(quantities):
+    """Agrupa las cantidades por producto: acepta un dict o pares (id, cantidad)."""
+    items = quantities.items() if isinstance(quantities, dict) else quantities
+    grouped = defaultdict(Decimal)
+    for pk, quantity in items:
+        grouped[int(pk)] += Decimal(str(quantity))
+    return dict(grouped)
+
+
+def _delta_case(deltas):
+    return Case(
+        *[When(pk=pk, then=Value(qty)) for pk, qty in deltas.items()],
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+
+
+def reserve_stock(quantities):
+    """
+    Descuenta stock de forma atómica para varios productos a la vez.
+
+    Las filas se bloquean en orden de `pk` para que dos facturas concurrentes
+    con los mismos productos nunca se bloqueen mutuamente (deadlock), y el
+    UPDATE final solo afecta filas con `stock >= cantidad`. Si algún producto
+    no tiene stock suficiente se lanza ValueError y no se descuenta nada.
+    """
+    quantities = _normalize(quantities)
+    if not quantities:
+        return {}
+
+    with transaction.atomic():
+        locked = {
+            row["pk"]: row
+            for row in Product.objects.select_for_update()
+            .filter(pk__in=list(quantities))
+            .order_by("pk")
+            .values("pk", "description", "stock")
+        }
+        missing = set(quantities) - set(locked)
+        if missing:
+            raise ValueError(f"Productos no encontrados: {sorted(missing)}")
+        for pk, quantity in quantities.items():
+            if quantity > locked[pk]["stock"]:
+                raise ValueError(
+                    f"No hay suficiente stock disponible para {locked[pk]['description']}."
+                )
+
+        guard = Q()
+        for pk, quantity in quantities.items():
+            guard |= Q(pk=pk, stock__gte=quantity)
+        updated = Product.objects.filter(guard).update(
+            stock=F("stock") - _delta_case(quantities)
+        )
+        if updated != len(quantities):
+            raise ValueError("No hay suficiente stock disponible.")
+    return quantities
+
+
+def restore_stock(quantities):
+    """
+    Devuelve al inventario las cantidades de una o varias facturas anuladas
+    o eliminadas. Las filas se bloquean en orden de `pk`, igual que en
+    `reserve_stock`, y se actualizan con un solo UPDATE agregado.
+    """
+    quantities = {pk: qty for pk, qty in _normalize(quantities).items() if qty}
+    if not quantities:
+        return 0
+    with transaction.atomic():
+        list(
+            Product.objects.select_for_update()
+            .filter(pk__in=list(quantities))
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+        return adjust_stock(quantities)
+
+
+def adjust_stock(deltas):
+    """
+    Aplica variaciones de stock ya agregadas por producto (positivas para
+    ingresos, negativas para egresos) en un solo UPDATE, sin verificar
+    existencias. Para cargas masivas e importaciones; las ventas usan
+    `reserve_stock`.
+    """
+    deltas = {pk: qty for pk, qty in _normalize(deltas).items() if qty}
+    if not deltas:
+        return 0
+    return Product.objects.filter(pk__in=list(deltas)).update(
+        stock=F("stock") + _delta_case(deltas)
+    )
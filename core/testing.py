@@ -0,0 +1,67 @@
+"""
+Datos y utilidades compartidos por los tests de core, commerce y purchase.
+"""
+import os
+from decimal import Decimal
+from unittest import skipUnless
+
+from django.db import connection
+
+from core.models import Brand, Customer, Product, Supplier
+
+
+def create_supplier(user, name="Proveedor", ruc="0999999999001", **kwargs):
+    kwargs.setdefault("address", "Centro")
+    kwargs.setdefault("phone", "0991234567")
+    return Supplier.objects.create(name=name, ruc=ruc, user=user, **kwargs)
+
+
+def create_brand(user, supplier=None, description="Marca"):
+    return Brand.objects.create(description=description, supplier=supplier or create_supplier(user))
+
+
+def create_customer(dni="0912345678", first_name="Ana", last_name="Perez", **kwargs):
+    kwargs.setdefault("phone", "0991234567")
+    return Customer.objects.create(dni=dni, first_name=first_name, last_name=last_name, **kwargs)
+
+
+def create_product(user, stock=100, brand=None, **kwargs):
+    return Product.objects.create(
+        description=kwargs.pop("description", "Arroz"), stock=stock,
+        brand=brand or create_brand(user), user=user, **kwargs,
+    )
+
+
+def create_catalog(user, size, stock=100, price=Decimal("1.00"), brand=None):
+    """
+    `size` productos "Producto i" creados con `bulk_create` (sin señales).
+    Precio y costo valen `price`; con `price=None` quedan los del modelo.
+    """
+    brand = brand or create_brand(user)
+    prices = {} if price is None else {"price": price, "cost": price}
+    return Product.objects.bulk_create(
+        [
+            Product(description=f"Producto {i}", stock=stock, brand=brand, user=user, **prices)
+            for i in range(size)
+        ]
+    )
+
+
+BENCHMARKS = bool(os.environ.get("TEST_BENCHMARKS"))
+
+# Mediciones que crean demasiados datos para la suite normal.
+benchmark = skipUnless(BENCHMARKS, "solo con TEST_BENCHMARKS=1")
+
+# Comprobaciones que dependen de funciones propias de un motor
+# (FTS5, EXPLAIN QUERY PLAN, pg_trgm...).
+sqlite_only = skipUnless(connection.vendor == "sqlite", "solo en SQLite")
+postgresql_only = skipUnless(connection.vendor == "postgresql", "solo en PostgreSQL")
+
+
+def report(message):
+    """
+    Muestra el resultado de una medición solo si se pide con la variable de
+    entorno `TEST_BENCHMARKS=1`; por defecto la salida de los tests queda limpia.
+    """
+    if BENCHMARKS:
+        print(f"\n{message}")
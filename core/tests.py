@@ -1,3 +1,635 @@
-from django.test import TestCase
+import json
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time as day_time, timedelta
+from decimal import Decimal
+from unittest import skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.asgi import get_asgi_application
+from django.core.cache import cache
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.db import OperationalError, close_old_connections, connection
+from django.template import Context, Template
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from commerce.models import Invoice
+from commerce.services import post_invoice
+from nomina.models import Empleado, Prestamo, TipoPrestamo
+
+from .autocomplete import CustomerPrefixIndex, customer_index
+from .catalog import CatalogCache, catalog_cache
+from .constants import InvoicePaymentMethod, MovementKind
+from .dashboard import build_dashboard
+from . import ledger
+from .costing import average_cost, replay_average_costs
+from .models import (
+    Category, Customer, InventoryMovement, Product, StockSnapshot, Supplier,
+)
+from .stock import reserve_stock
+from .testing import create_customer, create_product, report, sqlite_only
+
+try:
+    import uvicorn
+except ImportError:
+    uvicorn = None
+
+
+class ReserveStockTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("bodega", password="secret")
+        cls.product = create_product(cls.user, stock=5)
+
+    def test_reduce_stock(self):
+        self.product.reduce_stock(3)
+        self.assertEqual(self.product.stock, 2)
+
+    def test_reduce_stock_rejects_overselling(self):
+        with self.assertRaises(ValueError):
+            self.product.reduce_stock(6)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 5)
+
+    def test_partial_failure_rolls_back_every_product(self):
+        other = Product.objects.create(
+            description="Azucar", stock=1, brand=self.product.brand, user=self.user
+        )
+        with self.assertRaises(ValueError):
+            reserve_stock({self.product.pk: 1, other.pk: 2})
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 5)
+
+    def test_update_stock_is_callable(self):
+        Product.update_stock(self.product.pk, Decimal("2"))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 3)
+
+
+class InventoryLedgerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("bodega", password="secret")
+        cls.product = create_product(cls.user, stock=5)
+
+    def day(self, offset):
+        return timezone.localdate() - timedelta(days=offset)
+
+    def record(self, kind, quantity, offset):
+        moved_at = timezone.make_aware(datetime.combine(self.day(offset), day_time(12)))
+        ledger.record(kind, "", [(None, self.product.pk, quantity)], moved_at=moved_at)
+
+    def test_stock_at_adds_movements_since_latest_snapshot(self):
+        self.record(MovementKind.OPENING, 100, offset=9)
+        self.record(MovementKind.SALE, -10, offset=8)
+        self.record(MovementKind.PURCHASE, 5, offset=6)
+        pk = self.product.pk
+        self.assertEqual(
+            [ledger.stock_at(self.day(offset), [pk])[pk] for offset in (10, 9, 7, 6)],
+            [0, 100, 90, 95],
+        )
+
+        self.assertEqual(ledger.take_snapshots(self.day(7)), 1)
+        self.assertEqual(StockSnapshot.objects.get().stock, 90)
+        # Los movimientos anteriores a la foto ya no se leen.
+        InventoryMovement.objects.filter(moved_at__lt=ledger.day_end(self.day(7))).delete()
+        with self.assertNumQueries(3):  # fotos, productos sin foto y movimientos desde la foto
+            self.assertEqual(ledger.stock_at(self.day(6)), {pk: 95})
+        self.assertEqual(ledger.stock_at(self.day(9), [pk]), {pk: 0})
+
+    def test_direct_stock_changes_are_recorded(self):
+        self.product.reduce_stock(3)
+        Product.update_stock(self.product.pk, Decimal("1"))
+        self.assertEqual(
+            list(InventoryMovement.objects.values_list("kind", "quantity").order_by("pk")),
+            [(MovementKind.ADJUSTMENT, -3), (MovementKind.ADJUSTMENT, -1)],
+        )
+
+
+class AverageCostTests(TestCase):
+    def test_average_cost(self):
+        cases = [
+            ((100, Decimal("2.00"), 100, Decimal("400")), Decimal("3.00")),
+            ((0, Decimal("2.00"), 3, Decimal("10")), Decimal("3.33")),
+            ((-5, Decimal("2.00"), 10, Decimal("30")), Decimal("3.00")),  # stock negativo
+            ((10, Decimal("0.00"), 10, Decimal("50")), Decimal("5.00")),  # sin costo
+            ((200, Decimal("3.00"), -100, Decimal("-400")), Decimal("2.00")),  # anulación
+            ((100, Decimal("3.00"), -100, Decimal("-300")), Decimal("3.00")),  # sin unidades
+            ((100, Decimal("3.00"), 0, Decimal("50")), Decimal("3.50")),  # cambio de costo
+        ]
+        for args, expected in cases:
+            with self.subTest(args=args):
+                self.assertEqual(average_cost(*args), expected)
+
+    def test_replay_throughput(self):
+        user = User.objects.create_user("bodega", password="secret")
+        product = create_product(user, cost=Decimal("9.99"))
+        others = Product.objects.bulk_create(
+            [
+                Product(description=f"Producto {i}", brand=product.brand, user=user)
+                for i in range(49)
+            ]
+        )
+        products = [product, *others]
+        start = timezone.now() - timedelta(days=5 * 365)
+        movements = []
+        for i in range(50000):
+            pk = products[i % 50].pk
+            moved_at = start + timedelta(minutes=i)
+            if i // 50 % 5 == 0:  # una ronda de compras cada cinco de ventas
+                quantity = Decimal(10)
+                movements.append(InventoryMovement(
+                    product_id=pk, kind=MovementKind.PURCHASE, quantity=quantity,
+                    value=quantity * (1 + i // 50 % 7), moved_at=moved_at,
+                ))
+            else:
+                movements.append(InventoryMovement(
+                    product_id=pk, kind=MovementKind.SALE, quantity=-2, moved_at=moved_at,
+                ))
+        InventoryMovement.objects.bulk_create(movements, batch_size=5000)
+
+        started = time.perf_counter()
+        count, updated = replay_average_costs(chunk_size=5000)
+        elapsed = time.perf_counter() - started
+        report(
+            f"Costo promedio: {count} movimientos en {elapsed:.2f}s "
+            f"({count / elapsed:.0f} movimientos/s)"
+        )
+        self.assertEqual((count, updated), (50000, 50))
+        product.refresh_from_db()
+        self.assertTrue(Decimal("1") <= product.cost <= Decimal("7"))
+
+
+class ConcurrentReserveStockTests(TransactionTestCase):
+    threads = 4
+    attempts = 15
+
+    def test_hot_sku_is_never_oversold(self):
+        user = User.objects.create_user("bodega", password="secret")
+        stock = 50
+        product = create_product(user, stock=stock)
+        sold = []
+        lock = threading.Lock()
+
+        def sell():
+            try:
+                for _ in range(self.attempts):
+                    while True:
+                        try:
+                            reserve_stock({product.pk: 1})
+                        except ValueError:
+                            break
+                        except OperationalError:
+                            # SQLite responde "database is locked" bajo
+                            # escritura concurrente; se reintenta.
+                            time.sleep(0.001)
+                            continue
+                        with lock:
+                            sold.append(1)
+                        break
+            finally:
+                close_old_connections()
+                connection.close()
+
+        workers = [threading.Thread(target=sell) for _ in range(self.threads)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+
+        product.refresh_from_db()
+        report(
+            f"Reservas sobre un SKU: {len(sold)} en {elapsed:.3f}s "
+            f"({len(sold) / elapsed:.0f} reservas/s, {self.threads} hilos)"
+        )
+        self.assertEqual(len(sold), stock)
+        self.assertEqual(product.stock, 0)
+
+
+class CustomerPrefixIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("cajero", password="secret")
+        cls.ana = create_customer()
+        cls.luis = create_customer("0923456789", "Luis", "Peralta")
+        create_customer("0934567890", "Inactivo", "Perez", state=False)
+
+    def setUp(self):
+        customer_index.load()
+        self.addCleanup(customer_index.__init__)
+
+    def test_prefix_matches_names_and_dni(self):
+        self.assertEqual(
+            customer_index.search("per"),
+            [(self.luis.pk, "PERALTA LUIS"), (self.ana.pk, "PEREZ ANA")],
+        )
+        self.assertEqual(customer_index.search("ana p"), [(self.ana.pk, "PEREZ ANA")])
+        self.assertEqual(customer_index.search("09234"), [(self.luis.pk, "PERALTA LUIS")])
+
+    def test_signals_keep_index_fresh(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ana.last_name = "Zambrano"
+            self.ana.save()
+            self.luis.delete()
+        self.assertEqual(customer_index.search("per"), [])
+        self.assertEqual(customer_index.search("zam"), [(self.ana.pk, "ZAMBRANO ANA")])
+
+    def test_changes_during_background_load_are_replayed(self):
+        customer_index.__init__()
+        # Carga en curso que leyó las filas antes de los cambios.
+        customer_index._loading = True
+        rows = list(
+            Customer.objects.filter(state=True).values_list("pk", "first_name", "last_name", "dni")
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ana.last_name = "Zambrano"
+            self.ana.save()
+            self.luis.delete()
+        self.assertFalse(customer_index.is_ready)
+        customer_index.build(rows)
+        self.assertEqual(customer_index.search("per"), [])
+        self.assertEqual(customer_index.search("zam"), [(self.ana.pk, "ZAMBRANO ANA")])
+
+    def test_search_view(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("core:customer_search"), {"term": "pere"})
+        self.assertEqual(response.json(), {"results": [{"id": self.ana.pk, "text": "PEREZ ANA"}]})
+
+    def test_p99_latency_on_500k_customers(self):
+        index = CustomerPrefixIndex()
+        index.build(
+            (i, f"NOMBRE{i}", f"APELLIDO{i % 9973}", f"{1000000000 + i}")
+            for i in range(500000)
+        )
+        terms = [f"APELLIDO{i * 7 % 9973}" for i in range(500)]
+        terms += [f"NOMBRE{i * 997}" for i in range(250)]
+        terms += [f"10000{i:03d}" for i in range(250)]
+        timings = []
+        for term in terms:
+            start = time.perf_counter()
+            index.search(term)
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        p99 = timings[int(len(timings) * 0.99)]
+        report(f"Autocompletado sobre 500k clientes: p99 {p99 * 1000:.3f}ms")
+        self.assertLess(p99, 0.005)
+
+
+class ProductLookupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("vendedor", password="secret")
+        product = create_product(cls.user, description="Arroz 0")
+        Product.objects.bulk_create(
+            [
+                Product(
+                    description=f"{'Arroz' if i % 2 else 'Azucar'} {i}", price=Decimal("1.50"),
+                    stock=10, brand=product.brand, user=cls.user,
+                )
+                for i in range(1, 2000)
+            ]
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_pages_by_prefix(self):
+        url = reverse("core:product_lookup")
+        first = self.client.get(url, {"term": "arr"}).json()
+        self.assertEqual(len(first["results"]), 20)
+        self.assertTrue(first["pagination"]["more"])
+        self.assertTrue(all(r["text"].startswith("Arroz") for r in first["results"]))
+        self.assertEqual(
+            set(first["results"][0]), {"id", "text", "description", "price", "iva", "stock"}
+        )
+
+        last = self.client.get(url, {"term": "arr", "page": 51}).json()  # 1001 arroces
+        self.assertEqual([r["text"] for r in last["results"]], ["Arroz 999"])
+        self.assertFalse(last["pagination"]["more"])
+
+    def test_excludes_inactive_products(self):
+        Product.objects.filter(description="Arroz 0").update(state=False)
+        response = self.client.get(reverse("core:product_lookup"), {"term": "Arroz 0"})
+        self.assertEqual(response.json()["results"], [])
+
+    def test_invoice_form_does_not_embed_catalog(self):
+        # Antes: el formulario recorría todo el catálogo para armar el <select>.
+        catalog = Template(
+            '{% for p in products %}<option value="{{ p.id }}" data-description="{{ p.description }}" '
+            'data-price="{{ p.price }}" data-iva="{{ p.iva }}" data-stock="{{ p.stock }}">'
+            "{{ p.description }}</option>{% endfor %}"
+        )
+        start = time.perf_counter()
+        before = catalog.render(Context({"products": Product.active_products.all()}))
+        before_elapsed = time.perf_counter() - start
+
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = self.client.get(reverse("commerce:invoice_create"))
+            elapsed = time.perf_counter() - start
+        self.assertNotContains(response, "Azucar 2")
+        self.assertFalse(any("core_product" in q["sql"] for q in queries.captured_queries))
+        report(
+            f"Formulario de factura con {Product.objects.count()} productos: "
+            f"solo el catálogo {len(before)} bytes en {before_elapsed * 1000:.1f}ms; "
+            f"página completa ahora {len(response.content)} bytes en {elapsed * 1000:.1f}ms"
+        )
+
+
+
+class AsyncEndpointTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("vendedor", password="secret")
+        create_product(cls.user, description="Arroz")
+        create_customer()
+
+    def setUp(self):
+        customer_index.load()
+        self.addCleanup(customer_index.__init__)
+
+    async def test_requires_login(self):
+        response = await self.async_client.get(reverse("core:product_lookup"))
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(reverse("core:login"), response["Location"])
+
+    async def test_lookup_and_search_run_async(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse("core:product_lookup"), {"term": "arr"})
+        self.assertEqual([r["text"] for r in response.json()["results"]], ["Arroz"])
+        response = await self.async_client.get(reverse("core:customer_search"), {"term": "per"})
+        self.assertEqual(response.json()["results"][0]["text"], "PEREZ ANA")
+
+
+class QuietWSGIRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+@skipUnless(uvicorn, "uvicorn no está instalado")
+@override_settings(ALLOWED_HOSTS=["127.0.0.1"])
+class AsgiThroughputTests(TransactionTestCase):
+    """Rendimiento con peticiones concurrentes: servidor WSGI con hilos vs uvicorn (ASGI)."""
+
+    concurrency = 16
+    requests = 160
+
+    def setUp(self):
+        self.user = User.objects.create_user("vendedor", password="secret")
+        product = create_product(self.user, description="Arroz 0")
+        Product.objects.bulk_create(
+            [
+                Product(description=f"Arroz {i}", stock=10, brand=product.brand, user=self.user)
+                for i in range(1, 200)
+            ]
+        )
+        client = Client()
+        client.force_login(self.user)
+        self.cookie = f"sessionid={client.cookies['sessionid'].value}"
+
+    def start_wsgi(self):
+        server = ThreadedWSGIServer(("127.0.0.1", 0), QuietWSGIRequestHandler)
+        server.set_app(get_wsgi_application())
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server.server_address[1]
+
+    def start_asgi(self):
+        server = uvicorn.Server(
+            uvicorn.Config(
+                get_asgi_application(), host="127.0.0.1", port=0, lifespan="off",
+                log_level="warning",
+            )
+        )
+        threading.Thread(target=server.run, daemon=True).start()
+        while not server.started:
+            time.sleep(0.01)
+        self.addCleanup(setattr, server, "should_exit", True)
+        return server.servers[0].sockets[0].getsockname()[1]
+
+    def load(self, port):
+        url = f"http://127.0.0.1:{port}{reverse('core:product_lookup')}?term=arr&page="
+
+        def fetch(n):
+            request = urllib.request.Request(url + str(n % 10 + 1), headers={"Cookie": self.cookie})
+            with urllib.request.urlopen(request, timeout=30) as response:
+                return [item["id"] for item in json.loads(response.read())["results"]]
+
+        fetch(0)  # calentamiento
+        start = time.perf_counter()
+        with ThreadPoolExecutor(self.concurrency) as pool:
+            pages = list(pool.map(fetch, range(self.requests)))
+        return pages, self.requests / (time.perf_counter() - start)
+
+    def test_concurrent_lookup_throughput(self):
+        wsgi, wsgi_rate = self.load(self.start_wsgi())
+        asgi, asgi_rate = self.load(self.start_asgi())
+        report(
+            f"Búsqueda de productos, {self.concurrency} clientes concurrentes: "
+            f"WSGI {wsgi_rate:.0f} req/s, ASGI (uvicorn) {asgi_rate:.0f} req/s"
+        )
+        self.assertEqual({len(page) for page in asgi}, {20})
+        self.assertEqual(asgi, wsgi)
+
+
+class SupplierKeysetTests(TestCase):
+    def test_name_id_index_exists(self):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, Supplier._meta.db_table)
+        self.assertIn(
+            ["name", "id"],
+            [c["columns"] for c in constraints.values() if c["index"] and not c["unique"]],
+        )
+
+    @sqlite_only
+    def test_pages_are_read_in_index_order(self):
+        user = User.objects.create_user("compras", password="secret")
+        Supplier.objects.bulk_create(
+            [
+                Supplier(
+                    name=f"Proveedor {i % 7}", ruc=f"{i:013d}", address="Centro",
+                    phone="0991234567", user=user,
+                )
+                for i in range(30)
+            ]
+        )
+        self.client.force_login(user)
+        url = reverse("core:supplier_list")
+        cursor = self.client.get(url).context["next_cursor"]
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(url, {"cursor": cursor})
+        sql = next(
+            q["sql"] for q in ctx.captured_queries
+            if 'FROM "core_supplier"' in q["sql"] and "ORDER BY" in q["sql"]
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            plan = [row[-1] for row in cursor.fetchall()]
+        # Con el índice (name, id) no hace falta ordenar la tabla en cada página.
+        self.assertFalse(any("TEMP B-TREE" in step for step in plan), plan)
+
+
+class CatalogCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("catalogo", password="secret")
+        cls.product = create_product(cls.user, price=Decimal("2.50"))
+        cls.category = Category.objects.create(description="Granos")
+
+    def setUp(self):
+        self.catalog = CatalogCache()
+        self.catalog.clear()
+
+    def test_snapshot_costs_one_version_read(self):
+        snapshot = self.catalog.snapshot()
+        self.assertEqual(snapshot["products"][self.product.pk].price, Decimal("2.50"))
+        self.assertEqual(snapshot["categories"], {self.category.pk: "Granos"})
+        with self.assertNumQueries(100):
+            for _ in range(100):
+                self.catalog.products([self.product.pk])
+        self.assertEqual(self.catalog.stats()["misses"], 1)
+        self.assertEqual(self.catalog.stats()["hits"], 100)
+
+    def test_signals_bump_version(self):
+        self.catalog.snapshot()
+        version = self.catalog.version()
+        self.product.price = Decimal("3.00")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        # La versión vive en la base: la comparten todas las instancias.
+        self.assertGreater(self.catalog.version(), version)
+        self.assertEqual(async_to_sync(self.catalog.aversion)(), self.catalog.version())
+        self.assertEqual(self.catalog.products([self.product.pk])[self.product.pk].price, Decimal("3.00"))
+
+        version = self.catalog.version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.categories.add(self.category)
+        self.assertGreater(self.catalog.version(), version)
+
+    def test_stock_changes_keep_version(self):
+        version = self.catalog.version()
+        self.product.stock = 10
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.product.save(update_fields=["stock"])
+        self.assertEqual(callbacks, [])
+        self.assertEqual(self.catalog.version(), version)
+
+    def test_inactive_products_are_left_out(self):
+        self.product.state = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        self.assertEqual(self.catalog.products([self.product.pk]), {})
+
+    def test_file_based_backend(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        caches = {
+            "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+            "catalog": {
+                "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                "LOCATION": tmp.name,
+            },
+        }
+        with override_settings(CACHES=caches, CATALOG_CACHE_ALIAS="catalog"):
+            first = CatalogCache().products([self.product.pk])
+            other_process = CatalogCache()
+            with self.assertNumQueries(1):  # versión
+                self.assertEqual(other_process.products([self.product.pk]), first)
+            other_process.bump()
+            with self.assertNumQueries(4):  # versión, productos, marcas y categorías
+                other_process.snapshot()
+
+    def test_change_in_one_worker_is_seen_by_others(self):
+        # Dos procesos con su propio caché en memoria local.
+        caches = {
+            "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+            "worker_a": {
+                "BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "a",
+            },
+            "worker_b": {
+                "BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "b",
+            },
+        }
+        with override_settings(CACHES=caches):
+            workers = {alias: CatalogCache() for alias in ("worker_a", "worker_b")}
+            for alias, worker in workers.items():
+                with self.settings(CATALOG_CACHE_ALIAS=alias):
+                    worker.snapshot()
+            with self.settings(CATALOG_CACHE_ALIAS="worker_b"):
+                self.product.price = Decimal("4.00")
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.product.save()
+            with self.settings(CATALOG_CACHE_ALIAS="worker_a"):
+                self.assertEqual(
+                    workers["worker_a"].products([self.product.pk])[self.product.pk].price,
+                    Decimal("4.00"),
+                )
+
+
+class DashboardTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("gerente", password="secret")
+        cls.product = create_product(cls.user, stock=50, price=Decimal("10.00"))
+        cls.scarce = Product.objects.create(
+            description="Sal", stock=3, brand=cls.product.brand, user=cls.user
+        )
+        cls.customer = create_customer("0911111111")
+        tipo = TipoPrestamo.objects.create(descripcion="Emergente", tasa=10)
+        empleado = Empleado.objects.create(nombres="Luis", sueldo=Decimal("500"))
+        Prestamo.objects.create(
+            empleado=empleado, tipo_prestamo=tipo, fecha_prestamo=timezone.localdate(),
+            monto=Decimal("100"), numero_cuotas=2,
+        )
+
+    def setUp(self):
+        cache.clear()
+        catalog_cache.clear()
+        self.client.force_login(self.user)
+
+    def sell(self, product, quantity=1, **kwargs):
+        invoice = Invoice(customer=self.customer, user=self.user, **kwargs)
+        post_invoice(invoice, [{"id": product.pk, "quantify": quantity}])
+        return invoice
+
+    def test_indicators(self):
+        self.sell(self.product, 2)
+        self.sell(self.scarce, payment_method=InvoicePaymentMethod.CARD)
+        data = self.client.get(reverse("core:dashboard_data")).json()
+
+        self.assertEqual(data["sales"]["today_invoices"], 2)
+        self.assertEqual(Decimal(data["sales"]["month_total"]), Decimal("23.00"))
+        self.assertEqual(data["top_products"][0]["product_id"], self.product.pk)
+        self.assertEqual(
+            {p["label"] for p in data["payment_methods"]}, {"Efectivo", "Tarjeta"}
+        )
+        self.assertEqual([p["id"] for p in data["low_stock"]], [self.scarce.pk])
+        self.assertEqual(data["loans"]["pending"], 1)
+        self.assertEqual(Decimal(data["loans"]["balance"]), Decimal("110.00"))
+
+    def test_query_budget(self):
+        with self.assertNumQueries(7):
+            build_dashboard()
+        for day in range(40):
+            self.sell(self.product, issue_date=timezone.now() - timedelta(days=day))
+        with self.assertNumQueries(7):
+            build_dashboard()
+
+    def test_micro_cache(self):
+        url = reverse("core:dashboard_data")
+        self.client.get(url)
+        with self.assertNumQueries(2):  # sesión y usuario
+            self.client.get(url)
+        with self.settings(DASHBOARD_CACHE_SECONDS=0), self.assertNumQueries(9):
+            self.client.get(url)
@@ -6,6 +6,7 @@ app_name = "core"  # define un espacio de nombre para la aplicacion
 urlpatterns = [
     # path('', views.home,name='home'),
     path("", views.HomeTemplateView.as_view(), name="home"),
+    path("dashboard/data/", views.DashboardDataView.as_view(), name="dashboard_data"),
     path("login/", views.CustomLoginView.as_view(), name="login"),
     path("logout/", LogoutView.as_view(next_page="core:login"), name="logout"),
     path("supplier_list/", views.SupplierListView.as_view(), name="supplier_list"),
@@ -39,4 +40,6 @@ urlpatterns = [
     path(
         "search_customers/", views.CustomerSearchView.as_view(), name="customer_search"
     ),
+    path("product_lookup/", views.ProductLookupView.as_view(), name="product_lookup"),
+    path("catalog/stats/", views.CatalogCacheStatsView.as_view(), name="catalog_cache_stats"),
 ]
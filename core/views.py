@@ -8,9 +8,10 @@ from django.views.generic import (
 )
 from django.contrib.auth.views import LoginView
 from django.contrib.auth.mixins import LoginRequiredMixin
-from core.mixins import TitleContextMixin
+from core.mixins import AsyncLoginRequiredMixin, TitleContextMixin
 from core.forms import SupplierForm, BrandForm
-from .models import Customer, Supplier, Brand
+from .catalog import catalog_cache
+from .models import Customer, Supplier, Brand, Product
 from django.contrib import messages
 from django.shortcuts import redirect
 from django.db import models
@@ -25,7 +26,9 @@ from django.views.generic import (
     DetailView,
 )
 from django.views import View
-from commerce.commerce_mixins import QueryFilterMixin
+from commerce.commerce_mixins import KeysetPaginationMixin, QueryFilterMixin
+from .autocomplete import asearch_customers
+from .dashboard import get_dashboard
 
 
 def home(request):
@@ -53,7 +56,16 @@ class HomeTemplateView(LoginRequiredMixin, TitleContextMixin, TemplateView):
         return context
 
 
-class SupplierListView(LoginRequiredMixin, TitleContextMixin, QueryFilterMixin, ListView):
+class DashboardDataView(LoginRequiredMixin, View):
+    """Indicadores del tablero de inicio en JSON (ver core.dashboard)."""
+
+    def get(self, request):
+        return JsonResponse(get_dashboard())
+
+
+class SupplierListView(
+    LoginRequiredMixin, TitleContextMixin, QueryFilterMixin, KeysetPaginationMixin, ListView
+):
     model = Supplier
     template_name = "supplier/list.html"
     context_object_name = "suppliers"
@@ -61,6 +73,7 @@ class SupplierListView(LoginRequiredMixin, TitleContextMixin, QueryFilterMixin,
     title1 = "Autor | TeacherCode"
     title2 = "Listado de Proveedores mixings"
     search_fields = ["name", "ruc"]
+    keyset_ordering = ("name", "id")
 
 
 
@@ -170,19 +183,59 @@ class SupplierDeleteView(LoginRequiredMixin, TitleContextMixin, DeleteView):
         return super().form_valid(form)
 
 
-class CustomerSearchView(LoginRequiredMixin, View):
-    def get(self, request):
+class CustomerSearchView(AsyncLoginRequiredMixin, View):
+    async def get(self, request):
         query = request.GET.get("term", "")
-        customers = Customer.objects.filter(
-            Q(first_name__icontains=query)
-            | Q(last_name__icontains=query)
-            | Q(dni__icontains=query)
-        ).filter(state=True)[
-            :10
-        ]  # Limita a 10 resultados
+        # Índice de prefijos en memoria; en frío responde desde la base de datos
+        customers = await asearch_customers(query, limit=10)  # Limita a 10 resultados
 
         results = []
-        for customer in customers:
-            results.append({"id": customer.pk, "text": customer.get_full_name})
+        for pk, full_name in customers:
+            results.append({"id": pk, "text": full_name})
 
         return JsonResponse({"results": results})
+
+
+class ProductLookupView(AsyncLoginRequiredMixin, View):
+    """
+    Búsqueda paginada de productos activos para los formularios de venta y
+    compra (formato Select2). Solo proyecta los campos que usa el formulario.
+    Parámetros GET: `term` (prefijo de la descripción o código exacto) y `page`.
+    Usa el ORM async: bajo ASGI la espera de la base no ocupa un worker.
+    No incluye el costo de compra; el formulario de compras usa
+    `purchase:product_lookup`, que lo agrega.
+    """
+
+    page_size = 20
+    fields = ("id", "description", "price", "iva", "stock")
+
+    async def get(self, request):
+        term = request.GET.get("term", "").strip()
+        try:
+            page = max(int(request.GET.get("page", 1)), 1)
+        except ValueError:
+            page = 1
+
+        products = Product.active_products.order_by("description", "id")
+        if term.isdigit():
+            products = products.filter(Q(pk=int(term)) | Q(description__istartswith=term))
+        elif term:
+            products = products.filter(description__istartswith=term)
+
+        offset = (page - 1) * self.page_size
+        rows = [
+            row async for row in products.values(*self.fields)[offset:offset + self.page_size + 1]
+        ]
+        more = len(rows) > self.page_size
+
+        results = []
+        for row in rows[: self.page_size]:
+            row["text"] = row["description"]
+            results.append(row)
+
+        return JsonResponse({"results": results, "pagination": {"more": more}})
+
+
+class CatalogCacheStatsView(LoginRequiredMixin, View):
+    def get(self, request):
+        return JsonResponse(catalog_cache.stats())
@@ -1,3 +1,45 @@
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+
+from .models import Empleado, Prestamo, TipoPrestamo
+
+
+class PrestamoDetailModalTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("nomina", password="secret")
+        cls.prestamo = Prestamo.objects.create(
+            empleado=Empleado.objects.create(nombres="Luis", sueldo=Decimal("500")),
+            tipo_prestamo=TipoPrestamo.objects.create(descripcion="Emergente", tasa=10),
+            fecha_prestamo=date(2025, 1, 15), monto=Decimal("1200"), numero_cuotas=12,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_cached_until_installments_change(self):
+        url = reverse("nomina:prestamo_detail", args=[self.prestamo.pk])
+        with self.assertNumQueries(5):  # sesión, usuario, versión, cabecera y cuotas
+            response = self.client.get(url)
+        self.assertContains(response, "$110,00", count=24)
+        with self.assertNumQueries(3):
+            self.client.get(url)
+
+        self.prestamo.detalles.filter(numero_cuota=1).update(saldo_cuota=0)
+        self.assertContains(self.client.get(url), "$0,00")
 
-# Create your tests here.
+    def test_header_and_names_refresh_the_modal(self):
+        url = reverse("nomina:prestamo_detail", args=[self.prestamo.pk])
+        self.assertContains(self.client.get(url), "15/01/2025")
+        Prestamo.objects.filter(pk=self.prestamo.pk).update(fecha_prestamo=date(2025, 2, 1))
+        self.assertContains(self.client.get(url), "01/02/2025")
+        Empleado.objects.filter(pk=self.prestamo.empleado_id).update(nombres="Luis Mora")
+        self.assertContains(self.client.get(url), "Luis Mora")
+        TipoPrestamo.objects.filter(pk=self.prestamo.tipo_prestamo_id).update(descripcion="Quirografario")
+        self.assertContains(self.client.get(url), "Quirografario")
@@ -7,6 +7,7 @@ from .views import (
     PrestamoAnnulView,
     PrestamoDetailView,
     PrestamoPrintView, # Descomenta si usas la vista de impresión
+    PrestamoExportView,
 )
 
 # Definimos el nombre de la aplicación para usarlo en el namespace (ej: reverse_lazy('nomina:prestamo_list'))
@@ -20,6 +21,13 @@ urlpatterns = [
         name='prestamo_list'
     ),
     
+    # Exportación CSV/XLSX del listado (respeta el filtro ?q=)
+    path(
+        'prestamos/exportar/',
+        PrestamoExportView.as_view(),
+        name='prestamo_export'
+    ),
+
     # 2. Creación de Préstamo
     path(
         'prestamos/nuevo/', 
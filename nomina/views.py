@@ -10,21 +10,49 @@ from django.views.generic import (
     View,
     DetailView,
 )
-from django.template.loader import render_to_string # Importación necesaria para PrestamoDetailView
 from .forms import PrestamoForm
-from core.mixins import TitleContextMixin
+from core.mixins import AsyncLoginRequiredMixin, TitleContextMixin
 from .models import Prestamo, PrestamoDetalle # Asegúrate de que los related_name funcionen
-from django.db.models import Sum
+from django.db.models import Count, Max, Sum
+from django.shortcuts import get_object_or_404
+from commerce.commerce_mixins import (
+    CachedFragmentMixin,
+    KeysetPaginationMixin,
+    QueryFilterMixin,
+)
+from commerce.exports import ExportView
 
 
 # --- Vistas del Modelo Prestamo (Maestro) ---
 
-class PrestamoListView(LoginRequiredMixin, TitleContextMixin, ListView): 
+class PrestamoListView(
+    LoginRequiredMixin, TitleContextMixin, QueryFilterMixin, KeysetPaginationMixin, ListView
+):
     model = Prestamo
     template_name = "nomina/list.html"
     context_object_name = "prestamos"
     paginate_by = 10
     title2 = "Listado de Préstamos"
+    search_fields = ["empleado__nombres", "tipo_prestamo__descripcion"]
+    keyset_ordering = ("-id",)
+
+
+class PrestamoExportView(ExportView):
+    model = Prestamo
+    search_fields = PrestamoListView.search_fields
+    filename = "prestamos"
+    export_fields = [
+        ("ID", "id"),
+        ("Empleado", "empleado__nombres"),
+        ("Tipo", "tipo_prestamo__descripcion"),
+        ("Fecha", "fecha_prestamo"),
+        ("Monto", "monto"),
+        ("Interes", "interes"),
+        ("Monto a Pagar", "monto_pagar"),
+        ("Cuotas", "numero_cuotas"),
+        ("Saldo", "saldo"),
+        ("Estado", "estado"),
+    ]
 
 # -------------------------------------------------------------
 # VISTAS DE CREACIÓN Y EDICIÓN (Manejan AJAX y Detalle JSON)
@@ -181,18 +209,42 @@ class PrestamoAnnulView(LoginRequiredMixin, View):
             return JsonResponse({"error": str(e)}, status=400)
 
 
-class PrestamoDetailView(LoginRequiredMixin, DetailView):
+class PrestamoDetailView(AsyncLoginRequiredMixin, CachedFragmentMixin, DetailView):
     model = Prestamo
-    template_name = "nomina/detail_modal.html"
-
-    def get(self, request, *args, **kwargs):
-        prestamo = self.get_object()
-        context = {
-            "prestamo": prestamo,
-            "detalles": prestamo.detalles.all()
-        }
-        html = render_to_string(self.template_name, context)
-        return JsonResponse({"html": html})
+    template_name = "nomina/detail.html"
+    fragment_label = "prestamo"
+
+    def get_fragment_version(self, pk):
+        # Prestamo no tiene `updated`: la versión es una suma de control de lo
+        # que muestra el modal: la cabecera, los nombres del empleado y del
+        # tipo de préstamo y las cuotas (cantidad, valores, saldos, último
+        # vencimiento y último id).
+        return (
+            Prestamo.objects.filter(pk=pk)
+            .annotate(
+                cuotas=Count("detalles"),
+                valor_cuotas=Sum("detalles__valor_cuota"),
+                saldo_cuotas=Sum("detalles__saldo_cuota"),
+                ultimo_vencimiento=Max("detalles__fecha_vencimiento"),
+                ultima_cuota=Max("detalles__id"),
+            )
+            .values_list(
+                "estado", "fecha_prestamo", "saldo", "monto", "monto_pagar",
+                "empleado_id", "empleado__nombres", "tipo_prestamo_id",
+                "tipo_prestamo__descripcion", "cuotas", "valor_cuotas", "saldo_cuotas",
+                "ultimo_vencimiento", "ultima_cuota",
+            )
+            .first()
+        )
+
+    def get_fragment_context(self, pk):
+        prestamo = get_object_or_404(
+            Prestamo.objects.select_related("empleado", "tipo_prestamo").prefetch_related(
+                "detalles"
+            ),
+            pk=pk,
+        )
+        return {"prestamo": prestamo, "detalles": prestamo.detalles.all()}
     
 from django.http import JsonResponse, HttpResponse # Asegúrate de importar HttpResponse
 
@@ -3,6 +3,16 @@ ASGI config for proy_vbc project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Las vistas JSON de solo lectura (búsqueda de clientes, búsqueda de
+productos y modales de detalle) son ``async def`` y usan el ORM async, así
+que bajo ASGI la espera de la base de datos no ocupa un worker. Para
+servir el proyecto con uvicorn (ver requeriments.txt)::
+
+    uvicorn proy_vbc.asgi:application --host 0.0.0.0 --port 8000 --workers 4
+
+Los archivos estáticos se sirven aparte (collectstatic + servidor web), igual
+que con WSGI.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
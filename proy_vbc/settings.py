@@ -130,6 +130,53 @@ STATICFILES_DIRS = (
 )  # carpeta fisica de archivos estaticos
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")  # carpeta fisica de archivos de Imagenes
 MEDIA_URL = "/media/"  # url de imagenes
+
+# Backend de búsqueda de QueryFilterMixin (commerce.search). El automático usa
+# pg_trgm en PostgreSQL y FTS5 en SQLite.
+QUERY_SEARCH_BACKEND = "commerce.search.AutoSearchBackend"
+
+# Índice en memoria del autocompletado de clientes: se reconstruye completo
+# pasado este tiempo (segundos) para recoger cambios de otros procesos.
+CUSTOMER_INDEX_MAX_AGE = 900
+
+# Caché versionado del catálogo activo (core.catalog): alias de CACHES donde
+# se guardan las instantáneas y su vigencia en segundos. La versión vive en la
+# base (CatalogVersion) y se consulta en cada lectura, así que los cambios se
+# ven en todos los procesos aunque el caché sea de memoria local.
+CATALOG_CACHE_ALIAS = "default"
+CATALOG_CACHE_TIMEOUT = 24 * 3600
+
+# Tablero de inicio (core.dashboard): micro-caché en segundos, umbral de
+# stock bajo y cantidad de productos en los listados.
+DASHBOARD_CACHE_SECONDS = 30
+DASHBOARD_LOW_STOCK = 10
+DASHBOARD_TOP_PRODUCTS = 10
+
+# Vigencia (segundos) del HTML cacheado de los modales de detalle
+FRAGMENT_CACHE_TIMEOUT = 3600
+
+# Punto de emisión por defecto de la numeración de facturas (commerce.sequences);
+# cada terminal puede elegir el suyo en el formulario y lo conserva en una cookie.
+INVOICE_ESTABLISHMENT = "001"
+INVOICE_EMISSION_POINT = "001"
+
+# Vigencia (segundos) de las claves de idempotencia de facturas y compras;
+# las vencidas se borran con `manage.py purge_idempotency_keys`.
+IDEMPOTENCY_KEY_TTL = 24 * 3600
+
+# Sugerencias de reposición (purchase.replenishment): ventanas de venta en
+# días con su peso, plazo de entrega y días de cobertura del pedido, y factor
+# z del stock de seguridad (1.65 ≈ 95% de nivel de servicio).
+REPLENISHMENT_WINDOWS = {7: 0.5, 30: 0.3, 90: 0.2}
+REPLENISHMENT_LEAD_TIME_DAYS = 7
+REPLENISHMENT_COVERAGE_DAYS = 14
+REPLENISHMENT_SERVICE_Z = 1.65
+
+# Caché en disco de los PDF de impresión (facturas y compras)
+PDF_CACHE_DIR = os.path.join(BASE_DIR, "cache", "pdf")
+PDF_CACHE_MAX_BYTES = 200 * 1024 * 1024  # 200 MB, desalojo LRU
+PDF_EXPORT_WORKERS = None  # procesos para exportación masiva (None = núcleos)
+PDF_EXPORT_POOL_MIN = 20  # con menos documentos se convierten en serie
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
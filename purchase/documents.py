@@ -0,0 +1,17 @@
+from commerce.documents import DocumentLoader
+from .models import Purchase, PurchaseDetail
+
+
+class PurchaseLoader(DocumentLoader):
+    model = Purchase
+    header_fields = (
+        "id", "num_document", "issue_date", "updated", "subtotal", "iva", "total", "state",
+    )
+    party = "supplier"
+    party_fields = ("id", "name", "ruc", "address", "updated")
+    line_model = PurchaseDetail
+    line_fk = "purchase"
+    line_fields = ("quantity", "cost", "iva", "subtotal")
+
+
+purchase_loader = PurchaseLoader()
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_alter_brand_supplier'),
+        ('purchase', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(fields=['-issue_date', 'id'], name='purchase_pu_issue_d_03c191_idx'),
+        ),
+    ]
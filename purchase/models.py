@@ -35,6 +35,10 @@ class Purchase(models.Model):
         verbose_name = "Compra de Producto"
         verbose_name_plural = "Compras de Productos"
         ordering = ("-issue_date",)
+        indexes = [
+            # Soporta la paginación por cursor (-issue_date, id)
+            models.Index(fields=["-issue_date", "id"]),
+        ]
 
     def __str__(self):
         return f"{self.num_document or 'S/N'} - {self.issue_date:%d-%m-%Y}"
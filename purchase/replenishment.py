@@ -0,0 +1,184 @@
+import datetime
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Case, DecimalField, F, Sum, Value, When
+from django.utils import timezone
+
+from commerce.models import DailyProductSales
+from commerce.pricing import price_basket
+from core.models import Product, Supplier
+
+QUANTITY = DecimalField(max_digits=20, decimal_places=2)
+
+
+def replenishment_settings():
+    """Parámetros del cálculo: ventanas {días: peso}, plazo de entrega, cobertura y factor z."""
+    return {
+        "windows": getattr(settings, "REPLENISHMENT_WINDOWS", {7: 0.5, 30: 0.3, 90: 0.2}),
+        "lead_time": getattr(settings, "REPLENISHMENT_LEAD_TIME_DAYS", 7),
+        "coverage": getattr(settings, "REPLENISHMENT_COVERAGE_DAYS", 14),
+        "service_z": getattr(settings, "REPLENISHMENT_SERVICE_Z", 1.65),
+    }
+
+
+def reorder_quantities(stock, sums, squares, windows, weights, lead_time, coverage, service_z):
+    """
+    Cálculo vectorizado sobre todos los productos a la vez.
+
+    - stock: arreglo (n,) con el stock actual.
+    - sums: matriz (n, k) con las unidades vendidas en cada ventana.
+    - squares: arreglo (n,) con la suma de cuadrados de las ventas diarias
+      en la ventana más larga (para la variabilidad de la demanda).
+    - windows/weights: largo en días y peso de cada ventana.
+
+    La velocidad diaria es el promedio ponderado de las ventanas. El stock
+    de seguridad es z·σ·√plazo, el punto de pedido la demanda del plazo más
+    la seguridad, y se sugiere pedir hasta cubrir plazo + cobertura solo si
+    el stock no supera el punto de pedido. Devuelve (velocidad, punto de
+    pedido, cantidad sugerida) como arreglos (n,).
+    """
+    windows = np.asarray(windows, dtype=float)
+    weights = np.asarray(weights, dtype=float)
+    velocity = sums @ (weights / weights.sum() / windows)
+    longest = windows.argmax()
+    mean = sums[:, longest] / windows[longest]
+    sigma = np.sqrt(np.clip(squares / windows[longest] - mean**2, 0, None))
+    safety = service_z * sigma * np.sqrt(lead_time)
+    reorder_point = velocity * lead_time + safety
+    target = velocity * (lead_time + coverage) + safety
+    quantity = np.where(
+        (velocity > 0) & (stock <= reorder_point), np.ceil(target - stock), 0
+    )
+    return velocity, reorder_point, np.clip(quantity, 0, None)
+
+
+def suggest(day=None, supplier=None, **options):
+    """
+    Sugerencias de reposición agrupadas por proveedor (`Brand.supplier`).
+
+    Son dos consultas sin importar la cantidad de productos: las ventas de
+    la ventana más larga agregadas por producto desde los resúmenes diarios
+    (`DailyProductSales`, alimentados por `InvoiceDetail`), con una suma
+    condicional por ventana, y el stock de los productos activos. El
+    cálculo se hace con NumPy sobre todos los productos a la vez
+    (`reorder_quantities`) y solo los productos con cantidad sugerida se
+    vuelven a leer de la base. `options` reemplaza los valores de
+    `replenishment_settings`.
+
+    Devuelve una lista de dicts `supplier`, `lines` y `total` (al costo),
+    ordenada por proveedor.
+    """
+    params = {**replenishment_settings(), **options}
+    day = day or timezone.localdate()
+    windows = sorted(params["windows"])
+    weights = [params["windows"][w] for w in windows]
+
+    products = Product.active_products.order_by("pk")
+    if supplier is not None:
+        products = products.filter(brand__supplier=supplier)
+    product_ids, stock = _columns(products.values_list("pk", "stock"), 2)
+    if not len(product_ids):
+        return []
+
+    start = day - datetime.timedelta(days=windows[-1] - 1)
+    sales = DailyProductSales.objects.filter(date__range=(start, day))
+    if supplier is not None:
+        sales = sales.filter(product__brand__supplier=supplier)
+    annotations = {
+        f"w{w}": Sum(
+            Case(
+                When(date__gte=day - datetime.timedelta(days=w - 1), then="quantity"),
+                default=Value(0),
+                output_field=QUANTITY,
+            )
+        )
+        for w in windows
+    }
+    annotations["squares"] = Sum(F("quantity") * F("quantity"), output_field=QUANTITY)
+    rows = _columns(
+        sales.values("product_id").annotate(**annotations).order_by()
+        .values_list("product_id", *annotations),
+        len(annotations) + 1,
+    )
+
+    # Alinear las ventas con los productos (ambos ordenados por id).
+    sums = np.zeros((len(product_ids), len(windows)))
+    squares = np.zeros(len(product_ids))
+    position = np.searchsorted(product_ids, rows[0])
+    found = (position < len(product_ids)) & (
+        product_ids[np.minimum(position, len(product_ids) - 1)] == rows[0]
+    )
+    sums[position[found]] = np.column_stack(rows[1:-1])[found]
+    squares[position[found]] = rows[-1][found]
+
+    velocity, reorder_point, quantity = reorder_quantities(
+        stock, sums, squares, windows, weights,
+        params["lead_time"], params["coverage"], params["service_z"],
+    )
+    selected = np.flatnonzero(quantity > 0)
+    if not len(selected):
+        return []
+    return _group_by_supplier(
+        {
+            int(product_ids[i]): {
+                "velocity": round(float(velocity[i]), 2),
+                "reorder_point": round(float(reorder_point[i]), 2),
+                "quantity": int(quantity[i]),
+            }
+            for i in selected
+        }
+    )
+
+
+def _columns(queryset, width):
+    """Lee las filas de `queryset` como `width` arreglos NumPy de flotantes."""
+    data = np.array(list(queryset), dtype=float).reshape(-1, width)
+    return data.T
+
+
+def _group_by_supplier(suggestions):
+    details = (
+        Product.objects.filter(pk__in=list(suggestions))
+        .values_list("pk", "description", "stock", "cost", "iva", "brand__supplier_id")
+        .order_by("brand__supplier_id", "description")
+    )
+    groups = {}
+    for pk, description, stock, cost, iva, supplier_id in details:
+        group = groups.setdefault(supplier_id, {"lines": [], "total": Decimal("0.00")})
+        line = {
+            "product": pk, "description": description, "stock": stock, "cost": cost,
+            "iva": iva, **suggestions[pk],
+        }
+        group["lines"].append(line)
+        group["total"] += cost * line["quantity"]
+    suppliers = Supplier.objects.in_bulk(list(groups))
+    return [
+        {"supplier": suppliers[supplier_id], **group}
+        for supplier_id, group in sorted(groups.items(), key=lambda g: suppliers[g[0]].name)
+    ]
+
+
+def purchase_draft(supplier, day=None):
+    """
+    Detalle sugerido para un proveedor, en el formato con que el formulario
+    de compra (`detail_purchase`) carga líneas: costo actual del producto,
+    IVA y subtotal calculados con `price_basket`.
+    """
+    groups = suggest(day=day, supplier=supplier)
+    if not groups:
+        return []
+    lines = groups[0]["lines"]
+    totals = price_basket((l["product"], l["cost"], l["quantity"], l["iva"]) for l in lines)
+    return [
+        {
+            "product": line["product"],
+            "product__description": line["description"],
+            "quantity": float(priced["quantity"]),
+            "price": float(priced["price"]),
+            "iva": float(priced["iva"]),
+            "sub": float(priced["subtotal"]),
+        }
+        for line, priced in zip(lines, totals["lines"])
+    ]
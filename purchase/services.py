@@ -0,0 +1,209 @@
+from django.db import transaction
+from django.db.models import DecimalField, F, Sum
+from django.utils import timezone
+
+from commerce.line_diff import apply_line_diff, diff_lines
+from commerce.pdf_cache import pdf_cache
+from commerce.pricing import apply_totals, price_basket, to_money
+from core import ledger
+from core.constants import MovementKind
+from core.costing import apply_average_cost, cost_changes
+from core.models import Product
+from core.stock import adjust_stock, reserve_stock, restore_stock
+from .models import Purchase, PurchaseDetail
+
+
+PURCHASE_LINE_FIELDS = ("quantity", "cost", "subtotal", "iva")
+
+
+def price_purchase_detail(detail_data):
+    """
+    Recalcula en el servidor el detalle enviado por el formulario de compra.
+    El costo lo ingresa el usuario; la tasa de IVA sale del producto.
+    Devuelve los productos (por id) y los totales de `price_basket`.
+    """
+    products = Product.objects.in_bulk([int(item["id"]) for item in detail_data])
+    missing = {int(item["id"]) for item in detail_data} - set(products)
+    if missing:
+        raise ValueError(f"Productos no encontrados: {sorted(missing)}")
+    totals = price_basket(
+        (int(item["id"]), item["price"], item["quantify"], products[int(item["id"])].iva)
+        for item in detail_data
+    )
+    return products, totals
+
+
+def update_purchase(purchase, detail_data):
+    """
+    Guarda los cambios de una compra y de su detalle.
+
+    Las líneas se concilian por producto con `commerce.line_diff`: solo se
+    insertan, actualizan o borran las filas que cambiaron, y el stock se
+    ajusta con un único UPDATE por la diferencia neta de cada producto, en
+    lugar de revertir y volver a sumar todo el detalle. El costo promedio
+    de los productos se corrige con la diferencia de unidades y de valor al
+    costo entre el detalle anterior y el nuevo. Si la edición retira más
+    unidades de las que quedan en stock se lanza ValueError y no se guarda
+    nada. El número de consultas no depende de la cantidad de líneas.
+    """
+    if not detail_data:
+        raise ValueError("La compra debe tener al menos un producto.")
+    _, totals = price_purchase_detail(detail_data)
+
+    with transaction.atomic():
+        active = (
+            Purchase.objects.select_for_update()
+            .values_list("state", flat=True)
+            .get(pk=purchase.pk)
+        )
+        stored = list(
+            PurchaseDetail.objects.filter(purchase_id=purchase.pk).only(
+                "id", "product_id", *PURCHASE_LINE_FIELDS
+            )
+        )
+        # (compra, producto, cantidad, valor): el detalle nuevo suma y el
+        # anterior resta; se calcula antes de que `diff_lines` lo modifique.
+        rows = purchase_rows(purchase, totals) + [
+            (purchase.pk, line.product_id, -line.quantity, -to_money(line.quantity * line.cost))
+            for line in stored
+        ]
+        diff = diff_lines(
+            stored,
+            [
+                {
+                    "product_id": line["product"],
+                    "quantity": line["quantity"],
+                    "cost": line["price"],
+                    "subtotal": line["subtotal"],
+                    "iva": line["iva"],
+                }
+                for line in totals["lines"]
+            ],
+            PURCHASE_LINE_FIELDS,
+            sign=1,
+        )
+        apply_totals(purchase, totals)
+        purchase.save()
+        apply_line_diff(PurchaseDetail, "purchase", purchase, diff, PURCHASE_LINE_FIELDS)
+        # Una compra anulada ya devolvió su stock: solo se corrige el detalle.
+        if active:
+            changes = cost_changes(rows)
+            apply_average_cost(changes)
+            # Bajar una cantidad retira unidades que pueden ya haberse
+            # vendido: se usa la reserva verificada, como en `revert_stock`.
+            reserve_stock({pk: -delta for pk, delta in diff.stock.items() if delta < 0})
+            restore_stock({pk: delta for pk, delta in diff.stock.items() if delta > 0})
+            ledger.record(
+                MovementKind.PURCHASE,
+                "purchase",
+                [(purchase.pk, pk, quantity, value) for pk, (quantity, value) in changes.items()],
+            )
+    return diff
+
+
+def purchase_rows(purchase, totals):
+    """(compra, producto, cantidad, valor al costo) de las líneas calculadas por `price_basket`."""
+    return [
+        (purchase.pk, line["product"], line["quantity"], line["base"])
+        for line in totals["lines"]
+    ]
+
+
+def purchased_lines(purchase_ids):
+    """
+    (compra, producto, cantidad, valor al costo) de las compras dadas, en
+    una consulta agrupada.
+    """
+    return list(
+        PurchaseDetail.objects.filter(purchase_id__in=purchase_ids)
+        .values_list("purchase_id", "product_id")
+        .annotate(
+            total=Sum("quantity"),
+            value=Sum(
+                F("quantity") * F("cost"),
+                output_field=DecimalField(max_digits=16, decimal_places=2),
+            ),
+        )
+        .order_by()
+    )
+
+
+def receive_stock(purchase, totals):
+    """
+    Ingresa al inventario las líneas de una compra nueva: recalcula el costo
+    promedio de sus productos, suma el stock y lo registra en el libro.
+    """
+    rows = purchase_rows(purchase, totals)
+    apply_average_cost(cost_changes(rows))
+    adjust_stock((pk, quantity) for _, pk, quantity, _ in rows)
+    ledger.record(MovementKind.PURCHASE, "purchase", rows)
+
+
+def revert_stock(purchase_ids):
+    """
+    Retira del inventario lo que ingresaron las compras dadas con un solo
+    UPDATE agregado por producto y registra los movimientos en el libro de
+    inventario (`core.ledger`). Usa la reserva verificada de
+    `core.stock.reserve_stock`: las filas se bloquean en orden de `pk` y, si
+    algún producto quedaría en negativo (la mercadería ya se vendió), se
+    lanza ValueError y no se toca nada. El costo promedio se recalcula
+    quitando las unidades y el valor de esas compras.
+    """
+    lines = purchased_lines(purchase_ids)
+    apply_average_cost(cost_changes(lines, sign=-1))
+    quantities = reserve_stock((pk, quantity) for _, pk, quantity, _ in lines)
+    ledger.record(MovementKind.PURCHASE_ANNUL, "purchase", lines, sign=-1)
+    return quantities
+
+
+def annul_purchase(purchase):
+    """
+    Anula una compra activa y retira su stock. La compra queda bloqueada
+    mientras tanto, así que devuelve False si ya estaba anulada y la
+    operación no se repite.
+    """
+    with transaction.atomic():
+        purchase = Purchase.objects.select_for_update().get(pk=purchase.pk)
+        if not purchase.state:
+            return False
+        revert_stock([purchase.pk])
+        purchase.state = False
+        purchase.save(update_fields=["state", "updated"])
+    return True
+
+
+def annul_purchases(pks):
+    """
+    Anula en bloque las compras activas de `pks` con un número fijo de
+    consultas: bloqueo de las cabeceras, una consulta agrupada y la reserva
+    verificada de stock, y un UPDATE de estado. Si el stock de algún
+    producto no alcanza se lanza ValueError y no se anula ninguna. Las
+    compras ya anuladas o inexistentes se omiten. Devuelve los ids anulados.
+    """
+    with transaction.atomic():
+        ids = list(
+            Purchase.objects.select_for_update()
+            .filter(pk__in=pks, state=True)
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+        if not ids:
+            return []
+        revert_stock(ids)
+        Purchase.objects.filter(pk__in=ids).update(state=False, updated=timezone.now())
+        # El UPDATE en bloque no emite post_save: se limpian los PDF a mano.
+        transaction.on_commit(lambda: [pdf_cache.invalidate("purchase", pk) for pk in ids])
+    return ids
+
+
+def delete_purchase(purchase):
+    """
+    Elimina la compra y su detalle; si estaba activa retira su stock (si ya
+    estaba anulada, eso ocurrió al anularla).
+    """
+    with transaction.atomic():
+        purchase = Purchase.objects.select_for_update().get(pk=purchase.pk)
+        if purchase.state:
+            revert_stock([purchase.pk])
+        PurchaseDetail.objects.filter(purchase_id=purchase.pk).delete()
+        purchase.delete()
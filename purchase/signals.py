@@ -0,0 +1,10 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from commerce.pdf_cache import pdf_cache
+from .models import Purchase
+
+
+@receiver([post_save, post_delete], sender=Purchase)
+def invalidate_purchase_pdf(sender, instance, **kwargs):
+    pdf_cache.invalidate("purchase", instance.pk)
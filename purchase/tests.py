@@ -1,3 +1,398 @@
+import json
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils import timezone
+import numpy as np
+
+from commerce.models import DailyProductSales
+from commerce.tests import ledger_free
+from core.catalog import catalog_cache
+from core.constants import MovementKind
+from core.models import InventoryMovement, Product
+from core.testing import create_brand, create_catalog, create_supplier, report
+from .documents import purchase_loader
+from .replenishment import reorder_quantities, suggest
+from .models import Purchase, PurchaseDetail
+from core import ledger
+from core.costing import replay_average_costs
+from .services import annul_purchase, annul_purchases, delete_purchase, update_purchase
+
+
+class PurchaseTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("bodega", password="secret")
+        cls.supplier = create_supplier(cls.user)
+        cls.products = create_catalog(
+            cls.user, 40, price=None, brand=create_brand(cls.user, cls.supplier)
+        )
+
+    def create_purchase(self, lines):
+        purchase = Purchase.objects.create(supplier=self.supplier, user=self.user)
+        PurchaseDetail.objects.bulk_create(
+            [
+                PurchaseDetail(
+                    purchase=purchase, product=product, quantity=1, cost=Decimal("1.00"),
+                    subtotal=Decimal("1.00"), iva=0,
+                )
+                for product in self.products[:lines]
+            ]
+        )
+        return purchase
+
+
+class PurchaseDetailModalTests(PurchaseTestCase):
+    def setUp(self):
+        cache.clear()
+        catalog_cache.clear()
+        self.client.force_login(self.user)
+
+    def test_query_count_is_bounded_and_cached(self):
+        counts = {}
+        for lines in (1, 40):
+            url = reverse("purchase:purchase_detail", args=[self.create_purchase(lines).pk])
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+            self.assertContains(response, f"Producto {lines - 1}")
+            counts[lines] = len(ctx.captured_queries)
+            with self.assertNumQueries(4):  # sesión, usuario, documento y catálogo
+                self.client.get(url)
+        self.assertEqual(counts[1], counts[40], counts)
+
+    def test_supplier_rename_refreshes_the_modal(self):
+        url = reverse("purchase:purchase_detail", args=[self.create_purchase(1).pk])
+        self.assertContains(self.client.get(url), "Proveedor")
+        self.supplier.name = "Distribuidora Nueva"
+        self.supplier.save()
+        self.assertContains(self.client.get(url), "Distribuidora Nueva")
+
+
+class PurchaseProductLookupTests(PurchaseTestCase):
+    def test_only_the_purchase_lookup_returns_cost(self):
+        self.client.force_login(self.user)
+        params = {"term": "Producto 1"}
+        sale = self.client.get(reverse("core:product_lookup"), params).json()["results"][0]
+        purchase = self.client.get(reverse("purchase:product_lookup"), params).json()["results"][0]
+        self.assertNotIn("cost", sale)
+        self.assertEqual(purchase, {**sale, "cost": "0.00"})
+
+
+class PurchaseLoaderTests(PurchaseTestCase):
+    def test_fixed_queries_per_document(self):
+        for lines in (1, 40):
+            with self.subTest(lines=lines):
+                purchase = self.create_purchase(lines)
+                with self.assertNumQueries(2):
+                    document = purchase_loader.get(purchase.pk)
+                self.assertEqual(document.supplier.name, "Proveedor")
+                with self.assertNumQueries(0):
+                    html = render_to_string("purchase/print.html", {"purchase": document})
+                self.assertIn(f"Producto {lines - 1}", html)
+
+
+class IdempotentPurchaseTests(PurchaseTestCase):
+    def test_replayed_submission_registers_one_purchase(self):
+        self.client.force_login(self.user)
+        data = {
+            "supplier": self.supplier.pk,
+            "num_document": "001-001-1",
+            "issue_date": "2024-03-05",
+            "subtotal": "0",
+            "iva": "0",
+            "total": "0",
+            "detail": json.dumps(
+                [{"id": self.products[0].pk, "price": "2.00", "quantify": 5}]
+            ),
+        }
+        url = reverse("purchase:purchase_create")
+        responses = [
+            self.client.post(url, data, HTTP_IDEMPOTENCY_KEY="compra-1").json()
+            for _ in range(3)
+        ]
+        purchase = Purchase.objects.get()
+        self.assertEqual([r["id"] for r in responses], [purchase.pk] * 3)
+        self.products[0].refresh_from_db()
+        self.assertEqual(self.products[0].stock, 105)
+
+
+class PurchaseUpdateTests(PurchaseTestCase):
+    def detail(self, products, quantity=1):
+        return [{"id": p.pk, "price": "1.00", "quantify": quantity} for p in products]
+
+    def test_adjusts_stock_by_difference(self):
+        purchase = self.create_purchase(3)
+        data = self.detail(self.products[:1], 4) + self.detail(self.products[2:4])
+        update_purchase(purchase, data)
+
+        stock = dict(
+            Product.objects.filter(pk__in=[p.pk for p in self.products[:4]])
+            .values_list("pk", "stock")
+        )
+        # create_purchase no movió el stock: solo cuenta la diferencia.
+        self.assertEqual(
+            [stock[p.pk] for p in self.products[:4]], [103, 99, 100, 101]
+        )
+        self.assertEqual(purchase.detail.count(), 3)
+        purchase.refresh_from_db()
+        self.assertEqual(purchase.subtotal, Decimal("6.00"))
+
+    def test_lowering_sold_units_is_rejected(self):
+        purchase = Purchase.objects.create(supplier=self.supplier, user=self.user)
+        update_purchase(purchase, self.detail(self.products[:1], 10))
+        Product.objects.filter(pk=self.products[0].pk).update(stock=5)  # el resto se vendió
+
+        with self.assertRaisesMessage(ValueError, "No hay suficiente stock"):
+            update_purchase(purchase, self.detail(self.products[:1], 2))
+        self.products[0].refresh_from_db()
+        self.assertEqual((self.products[0].stock, purchase.detail.get().quantity), (5, 10))
+
+        self.client.force_login(self.user)
+        response = self.client.post(
+            reverse("purchase:purchase_update", args=[purchase.pk]),
+            {
+                "supplier": self.supplier.pk,
+                "num_document": "001-001-3",
+                "issue_date": "2024-03-05",
+                "subtotal": "0",
+                "iva": "0",
+                "total": "0",
+                "detail": json.dumps(self.detail(self.products[:1], 2)),
+            },
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_editing_one_line_has_flat_query_count(self):
+        counts = {}
+        for lines in (1, 40):
+            purchase = self.create_purchase(lines)
+            data = self.detail(self.products[:lines])
+            update_purchase(purchase, data)  # IVA del producto recalculado en el servidor
+            data[-1]["price"] = "2.50"
+            with CaptureQueriesContext(connection) as ctx:
+                diff = update_purchase(purchase, data)
+            counts[lines] = len(ctx.captured_queries)
+            self.assertEqual((len(diff.updated), diff.stock), (1, {}))
+        self.assertEqual(counts[1], counts[40])
+
+    def test_update_view(self):
+        self.client.force_login(self.user)
+        purchase = self.create_purchase(2)
+        response = self.client.post(
+            reverse("purchase:purchase_update", args=[purchase.pk]),
+            {
+                "supplier": self.supplier.pk,
+                "num_document": "001-001-2",
+                "issue_date": "2024-03-05",
+                "subtotal": "0",
+                "iva": "0",
+                "total": "0",
+                "detail": json.dumps(self.detail(self.products[:1], 3)),
+            },
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(purchase.detail.get().quantity, 3)
+        self.assertEqual(
+            sorted(InventoryMovement.objects.values_list("quantity", flat=True)), [-1, 2]
+        )
+        self.products[1].refresh_from_db()
+        self.assertEqual(self.products[1].stock, 99)
+
+
+class PurchaseStockReversalTests(PurchaseTestCase):
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def stock(self, products):
+        stock = dict(
+            Product.objects.filter(pk__in=[p.pk for p in products]).values_list("pk", "stock")
+        )
+        return [stock[p.pk] for p in products]
+
+    def test_annul_reverts_stock_once(self):
+        purchase = self.create_purchase(3)
+        with self.assertNumQueries(13):  # bloqueo, cantidades, costo, stock, libro, estado...
+            self.assertTrue(annul_purchase(purchase))
+        self.assertFalse(annul_purchase(purchase))
+        response = self.client.post(reverse("purchase:purchase_annul", args=[purchase.pk]))
+        self.assertEqual(response.json()["msg"], "La compra ya está anulada.")
+        self.assertEqual(self.stock(self.products[:3]), [99, 99, 99])
+
+        delete_purchase(purchase)  # ya anulada: el stock no se retira otra vez
+        self.assertEqual(self.stock(self.products[:1]), [99])
+        self.assertEqual(
+            list(InventoryMovement.objects.values_list("kind", "quantity").distinct()),
+            [(MovementKind.PURCHASE_ANNUL, -1)],
+        )
+        self.assertFalse(Purchase.objects.filter(pk=purchase.pk).exists())
+
+    def test_negative_stock_is_rejected(self):
+        purchase = self.create_purchase(2)
+        Product.objects.filter(pk=self.products[1].pk).update(stock=0)
+        response = self.client.post(reverse("purchase:purchase_delete", args=[purchase.pk]))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Producto 1", response.json()["error"])
+        self.assertEqual(self.stock(self.products[:2]), [100, 0])
+        purchase.refresh_from_db()
+        self.assertTrue(purchase.state)
+
+    def test_bulk_annul_has_bounded_queries(self):
+        counts = {}
+        for size in (2, 30):
+            ids = [self.create_purchase(40).pk for _ in range(size)]
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(annul_purchases(ids), ids)
+            counts[size] = ledger_free(ctx)
+        self.assertEqual(counts[2], counts[30])
+        self.assertEqual(set(self.stock(self.products)), {Decimal("68.00")})
+
+    def test_bulk_annul_view_is_all_or_nothing(self):
+        first, second = self.create_purchase(1), self.create_purchase(2)
+        annul_purchase(first)
+        url = reverse("purchase:purchase_bulk_annul")
+        response = self.client.post(url, {"ids": [first.pk, second.pk, 999999]})
+        data = response.json()
+        self.assertEqual(data["annulled"], [second.pk])
+        self.assertEqual(data["skipped"], sorted([first.pk, 999999]))
+
+        third, fourth = self.create_purchase(1), self.create_purchase(3)
+        Product.objects.filter(pk=self.products[2].pk).update(stock=0)
+        response = self.client.post(url, {"ids": [third.pk, fourth.pk]})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Purchase.objects.filter(state=True).count(), 2)
+        self.assertEqual(self.stock(self.products[:2]), [98, 99])
+
+
+class AverageCostTests(PurchaseTestCase):
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.product = self.products[0]
+        Product.objects.filter(pk=self.product.pk).update(cost=Decimal("2.00"))
+        # Stock inicial de 100 unidades a 2.00 registrado en el libro.
+        ledger.record(
+            MovementKind.OPENING, "", [(None, self.product.pk, 100, Decimal("200.00"))],
+            moved_at=timezone.now() - timedelta(days=1),
+        )
+
+    def cost(self):
+        self.product.refresh_from_db()
+        return self.product.cost
+
+    def test_post_edit_and_annul_update_cost(self):
+        data = {
+            "supplier": self.supplier.pk,
+            "issue_date": "2024-03-05",
+            "subtotal": "0",
+            "iva": "0",
+            "total": "0",
+            "detail": json.dumps([{"id": self.product.pk, "price": "4.00", "quantify": 100}]),
+        }
+        self.client.post(reverse("purchase:purchase_create"), data)
+        purchase = Purchase.objects.get()
+        costs = [self.cost()]
+        update_purchase(purchase, [{"id": self.product.pk, "price": "4.00", "quantify": 50}])
+        costs.append(self.cost())
+        annul_purchase(purchase)
+        costs.append(self.cost())
+        self.assertEqual(costs, [Decimal("3.00"), Decimal("2.67"), Decimal("2.01")])
+
+        # Repetir el libro llega al mismo costo que el cálculo incremental.
+        Product.objects.filter(pk=self.product.pk).update(cost=Decimal("9.99"))
+        replay_average_costs()
+        self.assertEqual(self.cost(), Decimal("2.01"))
+
+    def test_bulk_annul_reverses_several_purchases(self):
+        for price in ("4.00", "6.00"):
+            purchase = Purchase.objects.create(supplier=self.supplier, user=self.user)
+            update_purchase(purchase, [{"id": self.product.pk, "price": price, "quantify": 100}])
+        self.assertEqual(self.cost(), Decimal("4.00"))
+        annul_purchases(list(Purchase.objects.values_list("pk", flat=True)))
+        self.assertEqual(self.cost(), Decimal("2.00"))
+
+
+class ReplenishmentTests(PurchaseTestCase):
+    def setUp(self):
+        self.day = timezone.localdate()
+        self.client.force_login(self.user)
+        self.other = create_supplier(self.user, "Otro Proveedor", "0999999999002")
+        brand = create_brand(self.user, self.other, "Otra marca")
+        Product.objects.filter(pk=self.products[3].pk).update(brand=brand)
+        Product.objects.filter(pk__in=[self.products[0].pk, self.products[3].pk]).update(
+            cost=Decimal("2.00")
+        )
+        # 20 unidades diarias durante 90 días: velocidad 20, sin variación.
+        self.sales([self.products[0], self.products[3]], 20, 90)
+        # 1 unidad diaria: el stock de 100 cubre el plazo de entrega.
+        self.sales([self.products[1]], 1, 90)
+
+    def sales(self, products, quantity, days):
+        DailyProductSales.objects.bulk_create(
+            [
+                DailyProductSales(
+                    date=self.day - timedelta(days=offset), product=product, line="RS",
+                    quantity=quantity,
+                )
+                for product in products
+                for offset in range(days)
+            ]
+        )
+
+    def test_suggest_groups_by_supplier(self):
+        groups = suggest(day=self.day)
+        self.assertEqual([g["supplier"] for g in groups], [self.other, self.supplier])
+        line = groups[1]["lines"][0]
+        # Punto de pedido 20 x 7 = 140; se pide hasta 20 x (7 + 14) = 420.
+        self.assertEqual(
+            (line["product"], line["velocity"], line["reorder_point"], line["quantity"]),
+            (self.products[0].pk, 20.0, 140.0, 320),
+        )
+        self.assertEqual(groups[1]["total"], Decimal("640.00"))
+        self.assertEqual(len(groups[0]["lines"]), 1)
+
+    def test_suggest_filters_supplier_and_windows(self):
+        groups = suggest(day=self.day, supplier=self.supplier)
+        self.assertEqual([l["product"] for l in groups[0]["lines"]], [self.products[0].pk])
+        # Sin ventas en la última semana la velocidad ponderada baja.
+        groups = suggest(day=self.day + timedelta(days=60), supplier=self.supplier)
+        self.assertEqual(groups, [])
+
+    def test_create_view_prefills_draft(self):
+        response = self.client.get(
+            reverse("purchase:purchase_create"), {"draft": self.supplier.pk}
+        )
+        self.assertEqual(response.context["form"].initial["supplier"], self.supplier.pk)
+        draft = json.loads(response.context["detail_purchase"])
+        self.assertEqual(
+            [(line["product"], line["quantity"], line["price"]) for line in draft],
+            [(self.products[0].pk, 320.0, 2.0)],
+        )
+
+    def test_replenishment_view_renders(self):
+        response = self.client.get(reverse("purchase:purchase_replenishment"))
+        self.assertContains(response, "Otro Proveedor")
+        self.assertContains(response, f"?draft={self.supplier.pk}")
 
-# Create your tests here.
+    def test_reorder_quantities_vectorized_benchmark(self):
+        rng = np.random.default_rng(0)
+        n = 50000
+        windows = [7, 30, 90]
+        daily = rng.poisson(rng.uniform(0, 5, size=(n, 1)), size=(n, 90)).astype(float)
+        sums = np.column_stack([daily[:, -w:].sum(axis=1) for w in windows])
+        squares = (daily**2).sum(axis=1)
+        stock = rng.integers(0, 200, size=n).astype(float)
+        started = time.perf_counter()
+        velocity, reorder_point, quantity = reorder_quantities(
+            stock, sums, squares, windows, [0.5, 0.3, 0.2], 7, 14, 1.65
+        )
+        elapsed = time.perf_counter() - started
+        report(f"reorder_quantities: {n} productos en {elapsed * 1000:.1f} ms")
+        self.assertTrue((quantity[stock > reorder_point] == 0).all())
+        self.assertTrue((stock + quantity >= reorder_point).all())
@@ -5,12 +5,27 @@ app_name = "purchase"
 
 urlpatterns = [
     path("list/", views.PurchaseListView.as_view(), name="purchase_list"),
+    path("export/", views.PurchaseExportView.as_view(), name="purchase_export"),
     path("create/", views.PurchaseCreateView.as_view(), name="purchase_create"),
+    path(
+        "product_lookup/", views.PurchaseProductLookupView.as_view(), name="product_lookup"
+    ),
+    path(
+        "replenishment/", views.ReplenishmentView.as_view(), name="purchase_replenishment"
+    ),
     path(
         "update/<int:pk>/", views.PurchaseUpdateView.as_view(), name="purchase_update"
     ),
     path(
         "delete/<int:pk>/", views.PurchaseDeleteView.as_view(), name="purchase_delete"
     ),
+    path("annul/<int:pk>/", views.PurchaseAnnulView.as_view(), name="purchase_annul"),
+    path(
+        "annul/bulk/", views.PurchaseBulkAnnulView.as_view(), name="purchase_bulk_annul"
+    ),
+    path("detail/<int:pk>/", views.PurchaseDetailView.as_view(), name="purchase_detail"),
     path("print/<int:pk>/", views.PurchasePrintView.as_view(), name="purchase_print"),
+    path(
+        "print/batch/", views.PurchaseBatchPrintView.as_view(), name="purchase_batch_print"
+    ),
 ]
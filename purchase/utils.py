@@ -1,14 +1,3 @@
-from io import BytesIO
-from django.http import HttpResponse
-from django.template.loader import get_template
-from xhtml2pdf import pisa
-
-
-def render_to_pdf(template_src, context_dict={}):
-    template = get_template(template_src)
-    html = template.render(context_dict)
-    result = BytesIO()
-    pdf = pisa.pisaDocument(BytesIO(html.encode("UTF-8")), result)
-    if not pdf.err:
-        return HttpResponse(result.getvalue(), content_type="application/pdf")
-    return None
+# La generación de PDF es la misma que en ventas; se reutiliza para que el
+# caché de impresión (commerce.pdf_cache) cubra ambos documentos.
+from commerce.utils import render_to_pdf, render_to_pdf_bytes  # noqa: F401
@@ -1,77 +1,170 @@
 from django.contrib.auth.mixins import LoginRequiredMixin
-from core.mixins import TitleContextMixin
-from django.views.generic import ListView, CreateView, UpdateView, DetailView, View
+from core.mixins import AsyncLoginRequiredMixin, IdempotentCreateMixin, TitleContextMixin
+from django.views.generic import ListView, CreateView, UpdateView, DetailView, TemplateView, View
 from django.urls import reverse_lazy
 from django.contrib import messages
 from django.http import JsonResponse, HttpResponse
-from django.db import transaction
-from django.db.models import Q
 from django.template.loader import render_to_string
+from django.db.models import Q
 from decimal import Decimal
 import json
 
-from core.models import Product, Supplier
+from core.catalog import catalog_cache
+from core.models import Supplier
+from core.views import ProductLookupView
 from .models import Purchase, PurchaseDetail
+from .documents import purchase_loader
 from .forms import PurchaseForm
-from .utils import render_to_pdf
-from commerce.commerce_mixins import QueryFilterMixin
+from .replenishment import purchase_draft, replenishment_settings, suggest
+from .services import (
+    annul_purchase,
+    annul_purchases,
+    delete_purchase,
+    price_purchase_detail,
+    receive_stock,
+    update_purchase,
+)
+from commerce.commerce_mixins import (
+    CachedFragmentMixin,
+    KeysetPaginationMixin,
+    QueryFilterMixin,
+)
+from commerce.batch_print import BatchPrintView
+from commerce.documents import aload_document_or_404, load_document_or_404
+from commerce.exports import ExportView
+from commerce.pdf_cache import cached_pdf_response
+from commerce.pricing import apply_totals
 
 
 # ===================== LISTADO =====================
-class PurchaseListView(LoginRequiredMixin, TitleContextMixin, QueryFilterMixin, ListView):
+class PurchaseListView(
+    LoginRequiredMixin, TitleContextMixin, QueryFilterMixin, KeysetPaginationMixin, ListView
+):
     model = Purchase
     template_name = "purchase/list.html"
     context_object_name = "purchases"
     paginate_by = 10
     title2 = "Listado de Compras"
     search_fields = ["supplier__name", "num_document"]
+    keyset_ordering = ("-issue_date", "id")
 
 
 
+class PurchaseExportView(ExportView):
+    model = Purchase
+    search_fields = PurchaseListView.search_fields
+    filename = "compras"
+    export_fields = [
+        ("ID", "id"),
+        ("NumDocumento", "num_document"),
+        ("Fecha Emision", "issue_date"),
+        ("Proveedor", "supplier__name"),
+        ("RUC", "supplier__ruc"),
+        ("Subtotal", "subtotal"),
+        ("Iva", "iva"),
+        ("Total", "total"),
+        ("Activo", "state"),
+    ]
+    loader = purchase_loader
+    detail_export_fields = [
+        ("Compra", "id"),
+        ("NumDocumento", "num_document"),
+        ("Fecha Emision", "issue_date"),
+        ("Proveedor", "supplier.name"),
+        ("RUC", "supplier.ruc"),
+        ("Codigo", "line.product_id"),
+        ("Producto", "line.description"),
+        ("Cantidad", "line.quantity"),
+        ("Costo", "line.cost"),
+        ("Iva", "line.iva"),
+        ("Subtotal", "line.subtotal"),
+    ]
+
+
 # ===================== CREAR COMPRA =====================
-class PurchaseCreateView(LoginRequiredMixin, TitleContextMixin, CreateView):
+class PurchaseCreateView(
+    LoginRequiredMixin, IdempotentCreateMixin, TitleContextMixin, CreateView
+):
     model = Purchase
     form_class = PurchaseForm
     template_name = "purchase/form.html"
     success_url = reverse_lazy("purchase:purchase_list")
     title2 = "Registrar Nueva Compra"
+    idempotency_scope = "purchase"
+
+    def get_draft_supplier(self):
+        """Proveedor de `?draft=<id>`: precarga la compra sugerida por reposición."""
+        draft = self.request.GET.get("draft")
+        if draft and draft.isdigit():
+            return Supplier.objects.filter(pk=draft).first()
+        return None
+
+    def get_initial(self):
+        initial = super().get_initial()
+        supplier = self.get_draft_supplier()
+        if supplier:
+            initial["supplier"] = supplier.pk
+        return initial
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context["products"] = Product.active_products.all()
+        supplier = self.get_draft_supplier()
+        if supplier:
+            context["detail_purchase"] = json.dumps(purchase_draft(supplier))
         return context
 
     def form_valid(self, form):
-        try:
-            with transaction.atomic():
-                purchase = form.save(commit=False)
-                purchase.user = self.request.user
-                purchase.save()
-
-                detail_data = json.loads(self.request.POST.get("detail", "[]"))
+        def register():
+            detail_data = json.loads(self.request.POST.get("detail", "[]"))
+            products, totals = price_purchase_detail(detail_data)
 
-                for item in detail_data:
-                    product = Product.objects.get(pk=item["id"])
+            purchase = form.save(commit=False)
+            purchase.user = self.request.user
+            apply_totals(purchase, totals)
+            purchase.save()
 
-                    PurchaseDetail.objects.create(
+            PurchaseDetail.objects.bulk_create(
+                [
+                    PurchaseDetail(
                         purchase=purchase,
-                        product=product,
-                        quantity=item["quantify"],
-                        cost=item["price"],
-                        subtotal=item["sub"],
-                        iva=item["iva"]
+                        product=products[line["product"]],
+                        quantity=line["quantity"],
+                        cost=line["price"],
+                        subtotal=line["subtotal"],
+                        iva=line["iva"],
                     )
+                    for line in totals["lines"]
+                ]
+            )
+            # Aumentar stock (un UPDATE agregado) y registrar el ingreso
+            receive_stock(purchase, totals)
+
+            return purchase.pk, {
+                "msg": "Compra registrada con éxito.",
+                "url": str(self.success_url),
+                "id": purchase.pk,
+            }
 
-                    # Aumentar stock
-                    product.stock += Decimal(item["quantify"])
-                    product.save()
-
-                return JsonResponse({"msg": "Compra registrada con éxito.", "url": self.success_url})
-
+        try:
+            return self.register_once(register)
         except Exception as e:
             return JsonResponse({"error": str(e)}, status=400)
 
 
+# ===================== REPOSICIÓN =====================
+class ReplenishmentView(LoginRequiredMixin, TitleContextMixin, TemplateView):
+    """Sugerencias de compra por proveedor según la velocidad de venta (purchase.replenishment)."""
+
+    template_name = "purchase/replenishment.html"
+    title2 = "Sugerencias de Reposición"
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["groups"] = suggest()
+        context["params"] = replenishment_settings()
+        return context
+
+
 # ===================== EDITAR COMPRA =====================
 class PurchaseUpdateView(LoginRequiredMixin, TitleContextMixin, UpdateView):
     model = Purchase
@@ -82,7 +175,6 @@ class PurchaseUpdateView(LoginRequiredMixin, TitleContextMixin, UpdateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context["products"] = Product.active_products.all()
 
         details = PurchaseDetail.objects.filter(purchase=self.object)
 
@@ -102,34 +194,9 @@ class PurchaseUpdateView(LoginRequiredMixin, TitleContextMixin, UpdateView):
 
     def form_valid(self, form):
         try:
-            with transaction.atomic():
-                purchase = form.save()
-
-                # Devolver stock anterior
-                old_details = PurchaseDetail.objects.filter(purchase=purchase)
-                for d in old_details:
-                    d.product.stock -= d.quantity
-                    d.product.save()
-                old_details.delete()
-
-                # Agregar nuevos detalles
-                detail_data = json.loads(self.request.POST.get("detail", "[]"))
-                for item in detail_data:
-                    product = Product.objects.get(pk=item["id"])
-
-                    PurchaseDetail.objects.create(
-                        purchase=purchase,
-                        product=product,
-                        quantity=item["quantify"],
-                        cost=item["price"],
-                        subtotal=item["sub"],
-                        iva=item["iva"],
-                    )
-
-                    product.stock += Decimal(item["quantify"])
-                    product.save()
-
-                return JsonResponse({"msg": "Compra actualizada con éxito.", "url": self.success_url})
+            detail_data = json.loads(self.request.POST.get("detail", "[]"))
+            update_purchase(form.save(commit=False), detail_data)
+            return JsonResponse({"msg": "Compra actualizada con éxito.", "url": str(self.success_url)})
         except Exception as e:
             return JsonResponse({"error": str(e)}, status=400)
 
@@ -138,65 +205,106 @@ class PurchaseUpdateView(LoginRequiredMixin, TitleContextMixin, UpdateView):
 class PurchaseDeleteView(LoginRequiredMixin, View):
     def post(self, request, pk, *args, **kwargs):
         try:
-            purchase = Purchase.objects.get(pk=pk)
-
-            details = PurchaseDetail.objects.filter(purchase=purchase)
-            for d in details:
-                d.product.stock -= d.quantity
-                d.product.save()
-
-            details.delete()
-            purchase.delete()
-
+            delete_purchase(Purchase.objects.get(pk=pk))
             return JsonResponse({"msg": "Compra eliminada correctamente."})
-
         except Purchase.DoesNotExist:
             return JsonResponse({"error": "Compra no encontrada."}, status=404)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
 
 
 # ===================== ANULAR COMPRA =====================
 class PurchaseAnnulView(LoginRequiredMixin, View):
     def post(self, request, pk, *args, **kwargs):
         try:
-            purchase = Purchase.objects.get(pk=pk)
-
-            if not purchase.state:
+            if not annul_purchase(Purchase.objects.get(pk=pk)):
                 return JsonResponse({"msg": "La compra ya está anulada."}, status=400)
+            return JsonResponse({"msg": "Compra anulada correctamente."})
+        except Purchase.DoesNotExist:
+            return JsonResponse({"error": "Compra no encontrada."}, status=404)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
 
-            purchase.state = False
-            purchase.save()
 
-            # Revertir stock
-            details = PurchaseDetail.objects.filter(purchase=purchase)
-            for d in details:
-                d.product.stock -= d.quantity
-                d.product.save()
+class PurchaseBulkAnnulView(LoginRequiredMixin, View):
+    """Anula varias compras en una sola petición (`ids` repetido en el POST)."""
 
-            return JsonResponse({"msg": "Compra anulada correctamente."})
-        except Exception as e:
+    max_purchases = 500
+
+    def post(self, request, *args, **kwargs):
+        try:
+            pks = {int(pk) for pk in request.POST.getlist("ids")}
+        except ValueError:
+            return JsonResponse({"error": "Identificadores de compra inválidos."}, status=400)
+        if not pks:
+            return JsonResponse({"error": "No se seleccionaron compras."}, status=400)
+        if len(pks) > self.max_purchases:
+            return JsonResponse(
+                {"error": f"Se pueden anular hasta {self.max_purchases} compras a la vez."},
+                status=400,
+            )
+        try:
+            annulled = annul_purchases(pks)
+        except ValueError as e:
             return JsonResponse({"error": str(e)}, status=400)
+        return JsonResponse(
+            {
+                "msg": f"{len(annulled)} compras anuladas.",
+                "annulled": annulled,
+                "skipped": sorted(pks - set(annulled)),
+            }
+        )
 
 
 # ===================== DETALLE =====================
-class PurchaseDetailView(LoginRequiredMixin, DetailView):
+class PurchaseDetailView(AsyncLoginRequiredMixin, CachedFragmentMixin, DetailView):
     model = Purchase
     template_name = "purchase/detail_modal.html"
+    fragment_label = "purchase"
 
-    def get(self, request, *args, **kwargs):
-        purchase = self.get_object()
-        details = PurchaseDetail.objects.filter(purchase=purchase)
+    async def aget_fragment_version(self, pk):
+        # El nombre del proveedor y el catálogo también se muestran.
+        updated = await (
+            Purchase.objects.filter(pk=pk).order_by()
+            .values_list("updated", "supplier__updated").afirst()
+        )
+        return updated and (*updated, await catalog_cache.aversion())
 
-        html = render_to_string(self.template_name, {
-            "purchase": purchase,
-            "details": details
-        })
-
-        return JsonResponse({"html": html})
+    async def arender_fragment(self, pk):
+        purchase = await aload_document_or_404(purchase_loader, pk)
+        return render_to_string(self.template_name, {"purchase": purchase})
 
 
 # ===================== IMPRIMIR =====================
 class PurchasePrintView(LoginRequiredMixin, View):
     def get(self, request, pk, *args, **kwargs):
-        purchase = Purchase.objects.get(pk=pk)
-        pdf = render_to_pdf("purchase/print.html", {"purchase": purchase})
-        return pdf
+        purchase = load_document_or_404(purchase_loader, pk)
+        return cached_pdf_response(
+            request, purchase, "purchase", "purchase/print.html", {"purchase": purchase},
+            purchase_loader.party,
+        )
+
+
+class PurchaseBatchPrintView(BatchPrintView):
+    """Exporta las compras de un rango de fechas y/o de un proveedor (`supplier`)."""
+
+    model = Purchase
+    loader = purchase_loader
+    label = "purchase"
+    template_name = "purchase/print.html"
+    context_name = "purchase"
+    party = "supplier"
+    filter_params = BatchPrintView.filter_params + ("supplier",)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        supplier = self.id_param("supplier")
+        if supplier:
+            queryset = queryset.filter(supplier_id=supplier)
+        return queryset
+
+
+class PurchaseProductLookupView(ProductLookupView):
+    """`core:product_lookup` con el costo, que el formulario de compra precarga."""
+
+    fields = ProductLookupView.fields + ("cost",)
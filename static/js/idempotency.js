@@ -0,0 +1,8 @@
+// static/js/idempotency.js
+// Clave de idempotencia para los registros por AJAX (cabecera Idempotency-Key).
+// crypto.randomUUID solo existe en contextos seguros (HTTPS o localhost).
+function newIdempotencyKey() {
+  if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+  const random = () => Math.random().toString(16).slice(2, 10);
+  return `${Date.now().toString(16)}-${random()}-${random()}`;
+}
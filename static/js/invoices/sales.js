@@ -6,6 +6,8 @@ class SaleManager {
     // --- Referencias DOM ---
     this.d = document;
     this.detailSale = [];
+    // Una clave por venta: los reintentos del mismo envío no duplican la factura
+    this.idempotencyKey = newIdempotencyKey();
 
     this.$customer = this.d.getElementById("id_customer");
     this.$payment = this.d.getElementById("id_payment_method");
@@ -151,6 +153,7 @@ class SaleManager {
         headers: {
           'X-Requested-With': 'XMLHttpRequest',
           'X-CSRFToken': csrf,
+          'Idempotency-Key': this.idempotencyKey,
         },
         body: formData
       });
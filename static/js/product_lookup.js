@@ -0,0 +1,46 @@
+// Selector de productos con búsqueda paginada (core:product_lookup; en compras
+// purchase:product_lookup, que además trae el costo).
+// Reemplaza el <select> con todos los productos del catálogo: las opciones se
+// piden al servidor por páginas mientras se escribe o se desplaza la lista.
+// Al elegir un producto se copian sus datos (precio, costo, IVA, stock) al
+// dataset de la opción y se dispara un evento `change` nativo, así sales.js y
+// purchase.js siguen leyendo `option.dataset` como antes.
+$(function () {
+  const $product = $('#product');
+  if (!$product.length) return;
+
+  $product.select2({
+    placeholder: "Busque un producto por descripción o código",
+    allowClear: true,
+    width: '100%',
+    ajax: {
+      url: $product.data('url'),
+      dataType: 'json',
+      delay: 250,
+      data: function (params) {
+        return {
+          term: params.term || '',
+          page: params.page || 1
+        };
+      },
+      cache: true
+    }
+  });
+
+  $product.on('select2:select', function (e) {
+    const data = e.params.data;
+    const option = this.selectedOptions[0];
+    if (option && data) {
+      option.dataset.description = data.description;
+      option.dataset.price = data.price;
+      option.dataset.cost = data.cost;
+      option.dataset.iva = data.iva;
+      option.dataset.stock = data.stock;
+    }
+    this.dispatchEvent(new Event('change'));
+  });
+
+  $product.on('select2:clear', function () {
+    this.dispatchEvent(new Event('change'));
+  });
+});
@@ -5,6 +5,8 @@ class PurchaseManager {
     constructor() {
         this.d = document;
         this.detailPurchase = [];
+        // Una clave por compra: los reintentos del mismo envío no la duplican
+        this.idempotencyKey = newIdempotencyKey();
 
         // --- DOM ---
         this.$supplier = this.d.getElementById("id_supplier");
@@ -181,7 +183,8 @@ class PurchaseManager {
                 method: "POST",
                 headers: {
                     "X-Requested-With": "XMLHttpRequest",
-                    "X-CSRFToken": csrf
+                    "X-CSRFToken": csrf,
+                    "Idempotency-Key": this.idempotencyKey
                 },
                 body: formData
             });